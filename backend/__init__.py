@@ -1,4 +1,4 @@
-from flask import Flask, send_from_directory, jsonify
+from flask import Flask
 import os
 from .config import Config
 from .extensions import db, migrate, bcrypt, cors, jwt 
@@ -31,6 +31,21 @@ def create_app(config_class=Config):
 # ----------------------------------------------------
     jwt.init_app(app) 
 
+    from . import permissions, passwords, cashflow, audit, images, storage, files, json_provider, compression, sync
+    # jsonify/get_json com orjson (datas em isoformat, Decimal como str)
+    json_provider.init_app(app)
+    # gzip/brotli nas respostas JSON/texto acima de COMPRESS_MIN_SIZE
+    compression.init_app(app)
+    permissions.init_app(app)
+    passwords.init_app(app)
+    cashflow.init_app(app)
+    audit.init_app(app)
+    images.init_app(app)
+    storage.init_app(app)
+    sync.init_app(app)
+    # Rotas /api/uploads/... (fotos e documentos)
+    files.init_app(app)
+
     # Cria pastas de uploads
     try:
         os.makedirs(os.path.join(app.instance_path, 'uploads/profile_pics'), exist_ok=True)
@@ -71,42 +86,11 @@ def create_app(config_class=Config):
     from .routes.marketplace import marketplace_bp
     app.register_blueprint(marketplace_bp, url_prefix='/api')
 
+    from .routes.sync import sync_bp
+    app.register_blueprint(sync_bp, url_prefix='/api')
+
     @app.route('/')
     def index():
         return "Servidor Backend Gestão de Obras no ar!"
 
-    # --- Rotas para servir ficheiros ---
-
-    @app.route('/api/uploads/profile_pics/<path:filename>')
-    def serve_profile_pic(filename):
-        upload_dir = os.path.join(app.instance_path, 'uploads/profile_pics')
-        try:
-            return send_from_directory(upload_dir, filename, as_attachment=False)
-        except FileNotFoundError:
-             return jsonify({"error": "Ficheiro não encontrado"}), 404
-
-    @app.route('/api/uploads/checklist_pics/<path:filename>')
-    def serve_checklist_pic(filename):
-        upload_dir = os.path.join(app.instance_path, 'uploads/checklist_pics') 
-        try:
-            return send_from_directory(upload_dir, filename, as_attachment=False)
-        except FileNotFoundError:
-             return jsonify({"error": "Ficheiro não encontrado"}), 404
-
-    @app.route('/api/uploads/documentos_obra/<path:filename>')
-    def serve_documento_obra(filename):
-        upload_dir = os.path.join(app.instance_path, 'uploads/documentos_obra') 
-        try:
-            return send_from_directory(upload_dir, filename, as_attachment=False)
-        except FileNotFoundError:
-             return jsonify({"error": "Ficheiro não encontrado"}), 404
-
-    @app.route('/api/uploads/marketplace/<path:filename>')
-    def serve_marketplace_pic(filename):
-        upload_dir = os.path.join(app.instance_path, 'uploads/marketplace')
-        try:
-            return send_from_directory(upload_dir, filename, as_attachment=False)
-        except FileNotFoundError:
-             return jsonify({"error": "Ficheiro não encontrado"}), 404
-
     return app
\ No newline at end of file
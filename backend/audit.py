@@ -0,0 +1,334 @@
+from .models import AuditLog, User
+from .extensions import db
+from .pagination import keyset_after_desc
+from .cache import bump_data_version, get_data_version
+from sqlalchemy import event, insert, select, delete, inspect, MetaData, Table, Column, Index
+from sqlalchemy.orm import Session
+from datetime import datetime
+import atexit
+import click
+import os
+import queue
+import re
+import threading
+import time
+
+# --- Auditoria ---
+# log_audit() é o único ponto de entrada para gravar AuditLog.
+# - Modo síncrono: a linha entra na transação da rota (usado para ações financeiras,
+#   em que o log precisa ser tão durável quanto o lançamento).
+# - Modo assíncrono: a linha fica pendente na sessão e, só depois do commit da rota,
+#   vai para uma fila limitada; uma thread grava em lote com um único INSERT multi-linha.
+#   Se a rota fizer rollback, as linhas pendentes são descartadas.
+
+SYNC_RESOURCE_TYPES = {'FinanceiroTransacoes'}
+_PENDING_KEY = 'audit_pending'
+
+
+class AuditWriter:
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.batch_size = 200
+        self.flush_interval = 1.0
+        self.queue = queue.Queue(maxsize=10000)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._metrics = {
+            'enfileirados': 0,
+            'gravados': 0,
+            'lotes': 0,
+            'descartados': 0,
+            'falhas': 0,
+            'sincronos_por_fila_cheia': 0,
+            'ultimo_lote_ms': None,
+        }
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('AUDIT_ASYNC', True)
+        self.batch_size = app.config.get('AUDIT_BATCH_SIZE', 200)
+        self.flush_interval = app.config.get('AUDIT_FLUSH_INTERVAL', 1.0)
+        maxsize = app.config.get('AUDIT_QUEUE_SIZE', 10000)
+        if maxsize != self.queue.maxsize and self.queue.empty():
+            self.queue = queue.Queue(maxsize=maxsize)
+
+    def _incr(self, name, n=1):
+        with self._lock:
+            self._metrics[name] += n
+
+    def quase_cheia(self):
+        return self.queue.maxsize > 0 and self.queue.qsize() >= self.queue.maxsize * 0.9
+
+    def _ensure_thread(self):
+        # Após um fork (ex: gunicorn) a thread do processo pai não existe no filho
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def enqueue(self, rows):
+        self._ensure_thread()
+        for row in rows:
+            try:
+                self.queue.put_nowait(row)
+                self._incr('enfileirados')
+            except queue.Full:
+                self._incr('descartados')
+                print(f"ERRO CRÍTICO: fila de auditoria cheia, log descartado: {row.get('action_type')} {row.get('resource_type')} {row.get('resource_id')}")
+
+    def _run(self):
+        while True:
+            try:
+                first = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+            for _ in batch:
+                self.queue.task_done()
+
+    def _inserir(self, rows):
+        with self.app.app_context():
+            try:
+                db.session.execute(insert(AuditLog), rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.remove()
+
+    def _write(self, batch):
+        inicio = time.perf_counter()
+        try:
+            self._inserir(batch)
+            self._incr('gravados', len(batch))
+        except Exception as e:
+            # O lote falhou inteiro: grava linha a linha para perder só as linhas ruins
+            # (uma falha transitória do lote também é coberta por esta nova tentativa)
+            print(f"Aviso: lote de {len(batch)} logs de auditoria falhou ({e}); gravando linha a linha.")
+            for row in batch:
+                try:
+                    self._inserir([row])
+                    self._incr('gravados')
+                except Exception as e:
+                    self._incr('falhas')
+                    print(f"ERRO CRÍTICO ao gravar log de auditoria {row.get('action_type')} {row.get('resource_type')} {row.get('resource_id')}: {e}")
+        self._incr('lotes')
+        with self._lock:
+            self._metrics['ultimo_lote_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+
+    def flush(self, timeout=None):
+        """Espera a fila esvaziar (usado no encerramento do processo)."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        limite = time.monotonic() + timeout if timeout else None
+        while self.queue.unfinished_tasks:
+            if limite and time.monotonic() > limite:
+                return
+            time.sleep(0.01)
+
+    def metrics(self):
+        with self._lock:
+            data = dict(self._metrics)
+        data['fila_atual'] = self.queue.qsize()
+        data['fila_maxima'] = self.queue.maxsize
+        data['modo_assincrono'] = self.enabled
+        return data
+
+
+audit_writer = AuditWriter()
+
+
+def init_app(app):
+    audit_writer.init_app(app)
+
+    @app.cli.command('archive-audit')
+    @click.option('--meses', default=12, show_default=True, help='Mantém na tabela principal os últimos N meses.')
+    def archive_audit_command(meses):
+        """Move logs de auditoria antigos para tabelas mensais audit_logs_AAAAMM."""
+        movidos = arquivar_auditoria(meses)
+        if not movidos:
+            click.echo("Nenhum log de auditoria para arquivar.")
+        for tabela, total in movidos.items():
+            click.echo(f"{tabela}: {total} logs arquivados.")
+
+
+atexit.register(lambda: audit_writer.flush(timeout=5))
+
+
+def log_audit(user_id, action_type, resource_type, resource_id, details=None, sync=None):
+    """
+    Registra uma entrada no log de auditoria.
+    sync=None decide pelo tipo de recurso (financeiro é síncrono); o commit é feito pela rota.
+    """
+    try:
+        row = {
+            'user_id': int(user_id) if user_id is not None else None,
+            'action_type': action_type,
+            'resource_type': resource_type,
+            'resource_id': resource_id,
+            'details': details,
+            'timestamp': datetime.now(),
+        }
+        if sync is None:
+            sync = resource_type in SYNC_RESOURCE_TYPES
+        if sync or not audit_writer.enabled:
+            db.session.add(AuditLog(**row))
+            return
+        if audit_writer.quase_cheia():
+            # Backpressure: com a fila quase cheia o log volta para a transação da rota
+            audit_writer._incr('sincronos_por_fila_cheia')
+            db.session.add(AuditLog(**row))
+            return
+        db.session.info.setdefault(_PENDING_KEY, []).append(row)
+    except Exception as e:
+        print(f"ERRO CRÍTICO ao tentar criar log de auditoria: {e}")
+
+
+@event.listens_for(Session, 'after_commit')
+def _enqueue_pending_audit(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        audit_writer.enqueue(pending)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_audit(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+# --- Histórico e arquivamento ---
+# Logs mais antigos que N meses saem de audit_logs para tabelas mensais
+# (audit_logs_AAAAMM) com as mesmas colunas e o mesmo índice por recurso.
+# consultar_historico() lê a tabela principal e, se a página não encher,
+# continua nas tabelas de arquivo, da mais recente para a mais antiga.
+
+ARCHIVE_TABLE_RE = re.compile(r'^audit_logs_(\d{4})(\d{2})$')
+ARCHIVE_VERSION_KEY = 'audit_arquivo'
+_archive_metadata = MetaData()
+# (versão, tabelas): a lista do catálogo só é relida quando o arquivamento muda a versão
+_tabelas_cache = (None, None)
+_tabelas_lock = threading.Lock()
+
+
+def _tabela_arquivo(nome):
+    if nome in _archive_metadata.tables:
+        return _archive_metadata.tables[nome]
+    colunas = [Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable)
+               for c in AuditLog.__table__.columns]
+    tabela = Table(nome, _archive_metadata, *colunas)
+    Index(f'ix_{nome}_resource_timestamp',
+          tabela.c.resource_type, tabela.c.resource_id, tabela.c.timestamp.desc(), tabela.c.id.desc())
+    return tabela
+
+
+def tabelas_arquivo():
+    """
+    Tabelas de arquivo existentes, da mais recente para a mais antiga: [(inicio_do_mes, Table)].
+    Em cache por processo; arquivar_auditoria() incrementa a versão ARCHIVE_VERSION_KEY,
+    e cada chamada só lê essa versão (uma linha) em vez do catálogo do banco.
+    """
+    global _tabelas_cache
+    versao = get_data_version(ARCHIVE_VERSION_KEY)
+    with _tabelas_lock:
+        if _tabelas_cache[0] == versao:
+            return _tabelas_cache[1]
+    tabelas = []
+    for nome in inspect(db.engine).get_table_names():
+        match = ARCHIVE_TABLE_RE.match(nome)
+        if match:
+            inicio = datetime(int(match.group(1)), int(match.group(2)), 1)
+            tabelas.append((inicio, _tabela_arquivo(nome)))
+    tabelas = sorted(tabelas, key=lambda t: t[0], reverse=True)
+    with _tabelas_lock:
+        _tabelas_cache = (versao, tabelas)
+    return tabelas
+
+
+def _proximo_mes(inicio):
+    return datetime(inicio.year + inicio.month // 12, inicio.month % 12 + 1, 1)
+
+
+def _select_historico(tabela, resource_type, resource_id, cursor_values):
+    query = select(
+        tabela.c.id, tabela.c.timestamp, tabela.c.action_type, tabela.c.details,
+        User.nome.label('user_nome')
+    ).outerjoin(User, User.id == tabela.c.user_id).where(
+        tabela.c.resource_type == resource_type,
+        tabela.c.resource_id == resource_id
+    ).order_by(tabela.c.timestamp.desc(), tabela.c.id.desc())
+    if cursor_values is not None:
+        query = query.where(keyset_after_desc((tabela.c.timestamp, tabela.c.id), cursor_values))
+    return query
+
+
+def consultar_historico(resource_type, resource_id, limit=None, cursor_values=None):
+    """
+    Histórico de um recurso ordenado por (timestamp, id) DESC, com o nome do usuário.
+    Com `limit`, retorna (linhas, has_more); sem ele, todas as linhas e has_more=False.
+    """
+    faltam = limit + 1 if limit else None
+    linhas = []
+    fontes = [(None, AuditLog.__table__)] + tabelas_arquivo()
+    for inicio, tabela in fontes:
+        if inicio is not None and cursor_values is not None and inicio > cursor_values[0]:
+            continue
+        query = _select_historico(tabela, resource_type, resource_id, cursor_values)
+        if faltam is not None:
+            query = query.limit(faltam - len(linhas))
+        linhas.extend(db.session.execute(query).all())
+        if faltam is not None and len(linhas) >= faltam:
+            break
+    if limit:
+        return linhas[:limit], len(linhas) > limit
+    return linhas, False
+
+
+def arquivar_auditoria(meses):
+    """
+    Move para audit_logs_AAAAMM os logs anteriores ao início do mês de N meses atrás.
+    Cada mês é copiado e removido numa transação própria. Retorna {tabela: quantidade}.
+    """
+    hoje = datetime.now()
+    total_meses = hoje.year * 12 + (hoje.month - 1) - meses
+    corte = datetime(total_meses // 12, total_meses % 12 + 1, 1)
+    tabela_principal = AuditLog.__table__
+    movidos = {}
+
+    while True:
+        # Próximo mês com logs a arquivar (meses vazios não geram tabela)
+        mais_antigo = db.session.query(db.func.min(AuditLog.timestamp)).filter(AuditLog.timestamp < corte).scalar()
+        if mais_antigo is None:
+            break
+        inicio = datetime(mais_antigo.year, mais_antigo.month, 1)
+        filtro = (tabela_principal.c.timestamp >= inicio, tabela_principal.c.timestamp < _proximo_mes(inicio))
+        tabela = _tabela_arquivo(f'audit_logs_{inicio:%Y%m}')
+        try:
+            tabela.create(db.session.connection(), checkfirst=True)
+            copiados = db.session.execute(
+                insert(tabela).from_select(
+                    [c.name for c in tabela_principal.columns],
+                    select(*tabela_principal.columns).where(*filtro)
+                )
+            ).rowcount
+            db.session.execute(delete(tabela_principal).where(*filtro))
+            # Os outros processos relêem a lista de tabelas de arquivo
+            bump_data_version(ARCHIVE_VERSION_KEY)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        movidos[tabela.name] = movidos.get(tabela.name, 0) + copiados
+    return movidos
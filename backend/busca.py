@@ -0,0 +1,57 @@
+from decimal import Decimal, InvalidOperation
+import re
+import unicodedata
+
+# --- Normalização para busca ---
+# Funções puras usadas nas colunas derivadas (ex: Imovel.texto_busca) e nos
+# filtros das rotas, para que o valor gravado e o valor buscado passem pela
+# mesma transformação nos dois bancos (SQLite e PostgreSQL).
+
+NUMERO_RE = re.compile(r'\d+(?:[.,]\d+)*')
+CEP_DIGITOS = 8
+# Imovel.metragem_m2 é Numeric(10, 2): a partir de 10^8 estoura a coluna no PostgreSQL
+METRAGEM_MAXIMA = Decimal('100000000')
+
+
+def normalizar_texto(*partes):
+    """Minúsculas e sem acentos, com espaços simples: 'Apartamento  Área' -> 'apartamento area'."""
+    texto = ' '.join(p for p in partes if p)
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.split())
+
+
+def so_digitos(valor, maximo=None):
+    digitos = re.sub(r'\D', '', valor or '')
+    return digitos[:maximo] if maximo else digitos
+
+
+def metragem_em_m2(valor):
+    """
+    Extrai a área de textos livres como '120m²', '85,5 m2' ou '1.200 m²'.
+    Vírgula é o separador decimal; ponto seguido de três dígitos é milhar.
+    Retorna Decimal ou None (também para áreas que não cabem na coluna).
+    """
+    if valor is None:
+        return None
+    match = NUMERO_RE.search(str(valor))
+    if not match:
+        return None
+    numero = match.group(0)
+    if ',' in numero:
+        numero = numero.replace('.', '').replace(',', '.')
+    elif re.fullmatch(r'\d{1,3}(?:\.\d{3})+', numero):
+        numero = numero.replace('.', '')
+    try:
+        metragem = Decimal(numero).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+    return metragem if metragem < METRAGEM_MAXIMA else None
+
+
+def faixa_de_prefixo(prefixo, tamanho):
+    """
+    (menor, maior) para buscar por prefixo numa coluna só de dígitos com BETWEEN,
+    que usa o índice comum nos dois bancos (LIKE 'x%' depende de collation).
+    """
+    return prefixo, prefixo + '9' * (tamanho - len(prefixo))
@@ -0,0 +1,163 @@
+from .models import DataVersion
+from .extensions import db
+from flask import current_app, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from collections import OrderedDict
+from functools import wraps
+import hashlib
+import threading
+
+# --- Versão dos dados (invalidação dirigida por escrita) ---
+# As rotas que alteram obras, financeiro e inventário marcam o contador na sessão;
+# depois do commit ele é incrementado numa transação curta própria. Assim a linha
+# de data_versions não fica travada durante a transação da rota (todas as escritas
+# fariam fila nela). Como o contador fica no banco, a invalidação vale para todos os
+# workers; o valor calculado fica em cache local de cada processo.
+
+KPIS_VERSION_KEY = 'kpis'
+_PENDENTES_KEY = 'data_versions_pendentes'
+
+
+def bump_data_version(key=KPIS_VERSION_KEY):
+    """Incrementa a versão depois do commit da rota; um rollback descarta o incremento."""
+    db.session.info.setdefault(_PENDENTES_KEY, set()).add(key)
+
+
+def _upsert_versao(dialect):
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Versão dos dados não suportada no banco '{dialect}'.")
+    stmt = insert(DataVersion)
+    # Chave nova entra com 1; existente soma 1 (sem a corrida de UPDATE + INSERT)
+    return stmt.on_conflict_do_update(
+        index_elements=['key'], set_={'version': DataVersion.version + 1}
+    )
+
+
+@event.listens_for(Session, 'after_commit')
+def _incrementar_versoes_pendentes(session):
+    chaves = session.info.pop(_PENDENTES_KEY, None)
+    if not chaves:
+        return
+    try:
+        with session.get_bind().begin() as conn:
+            conn.execute(_upsert_versao(conn.dialect.name), [{'key': k, 'version': 1} for k in sorted(chaves)])
+    except Exception as e:
+        # Os dados já foram gravados: no pior caso o cache vale até a próxima escrita
+        print(f"Erro ao incrementar a versão dos dados {sorted(chaves)}: {e}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_versoes_pendentes(session):
+    session.info.pop(_PENDENTES_KEY, None)
+
+
+def get_data_version(key=KPIS_VERSION_KEY):
+    version = db.session.query(DataVersion.version).filter(DataVersion.key == key).scalar()
+    return version or 0
+
+
+class VersionedCache:
+    """Cache local (por processo) de valores calculados, válidos enquanto a versão não mudar."""
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, version, value):
+        with self._lock:
+            self._data[key] = (version, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+report_cache = VersionedCache()
+
+
+def cached_by_version(cache_key, compute, version_key=KPIS_VERSION_KEY):
+    """Retorna o valor em cache para a versão atual dos dados ou calcula e guarda."""
+    version = get_data_version(version_key)
+    value = report_cache.get(cache_key, version)
+    if value is None:
+        value = compute()
+        report_cache.set(cache_key, version, value)
+    return value
+
+
+# --- GET condicional (ETag fraco / 304) ---
+# O ETag vem de uma versão barata dos dados (contagem, maior id e maior
+# atualizado_em da obra, ou o contador global acima), calculada antes da view:
+# se o cliente já tem essa versão, responde 304 sem montar o corpo.
+
+
+def versao_da_obra(modelo, obra_id):
+    """(contagem, maior id, maior atualizado_em) das linhas da obra; sem atualizado_em usa o contador global."""
+    colunas = [func.count(modelo.id), func.max(modelo.id)]
+    if hasattr(modelo, 'atualizado_em'):
+        colunas.append(func.max(modelo.atualizado_em))
+    versao = tuple(db.session.query(*colunas).filter(modelo.obra_id == obra_id).one())
+    if not hasattr(modelo, 'atualizado_em'):
+        versao += (get_data_version(),)
+    return versao
+
+
+def versao_global():
+    """Para relatórios globais de obras/financeiro/inventário (mesmo contador do cache de KPIs)."""
+    return (get_data_version(),)
+
+
+def _etag(versao):
+    try:
+        usuario = get_jwt_identity()
+    except Exception:
+        usuario = None
+    chave = repr((request.path, sorted(request.args.items(multi=True)), usuario, versao))
+    return hashlib.sha1(chave.encode('utf-8')).hexdigest()[:20]
+
+
+def etag_por_versao(versao):
+    """
+    Decorator de rotas GET (abaixo dos decorators de permissão): versao(**kwargs da rota)
+    devolve a versão dos dados exibidos; If-None-Match com o mesmo ETag recebe 304.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return fn(*args, **kwargs)
+            try:
+                tag = _etag(versao(**kwargs))
+            except Exception as e:
+                print(f"Erro ao calcular a versão para ETag de {request.path}: {e}")
+                return fn(*args, **kwargs)
+            if request.if_none_match.contains_weak(tag):
+                resposta = current_app.response_class(status=304)
+            else:
+                resposta = make_response(fn(*args, **kwargs))
+                if resposta.status_code != 200:
+                    return resposta
+            resposta.set_etag(tag, weak=True)
+            # Autenticado: só o navegador guarda, e sempre revalida
+            resposta.headers['Cache-Control'] = 'private, no-cache'
+            return resposta
+        return wrapper
+    return decorator
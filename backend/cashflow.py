@@ -0,0 +1,117 @@
+from .models import CashflowRollup, FinanceiroTransacoes
+from .extensions import db
+from collections import defaultdict
+from decimal import Decimal
+import click
+
+# --- Rollup do Fluxo de Caixa ---
+# Cada transação ativa contribui para uma linha (obra, período, tipo) por tipo de período.
+# As chaves são calculadas em Python para serem iguais no SQLite e no PostgreSQL.
+PERIOD_FORMATS = {
+    'mensal': '%Y-%m',
+    'semanal': '%Y-%W',
+}
+
+
+def period_key(period_kind, when):
+    return when.strftime(PERIOD_FORMATS[period_kind])
+
+
+def _upsert_statement():
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Rollup do fluxo de caixa não suportado no banco '{dialect}'.")
+    return insert(CashflowRollup)
+
+
+def aplicar_no_rollup(deltas):
+    """
+    Soma os deltas ao rollup na transação atual (o commit fica com a rota).
+    `deltas` é um dict {(obra_id, tipo, criado_em_datetime): (valor, quantidade)} ou
+    o resultado de agrupar_transacoes(); valores/quantidades negativos removem.
+    """
+    agregados = defaultdict(lambda: [Decimal('0.00'), 0])
+    for (obra_id, tipo, criado_em), (valor, quantidade) in deltas.items():
+        for kind in PERIOD_FORMATS:
+            chave = (obra_id, kind, period_key(kind, criado_em), tipo)
+            agregados[chave][0] += valor
+            agregados[chave][1] += quantidade
+    if not agregados:
+        return
+
+    stmt = _upsert_statement()
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['obra_id', 'period_kind', 'period_key', 'tipo'],
+        set_={
+            'total': CashflowRollup.total + stmt.excluded.total,
+            'count': CashflowRollup.count + stmt.excluded.count,
+        }
+    )
+    db.session.execute(stmt, [
+        {'obra_id': obra_id, 'period_kind': kind, 'period_key': key, 'tipo': tipo,
+         'total': total, 'count': quantidade}
+        for (obra_id, kind, key, tipo), (total, quantidade) in agregados.items()
+    ])
+
+
+def registrar_transacao(obra_id, tipo, valor, criado_em, sinal=1):
+    """Adiciona (sinal=1) ou remove (sinal=-1) uma transação do rollup."""
+    aplicar_no_rollup({(obra_id, tipo, criado_em): (valor * sinal, sinal)})
+
+
+def agrupar_transacoes(linhas, deltas=None):
+    """
+    Agrupa dicts de transação (obra_id, tipo, valor, criado_em) por dia, no formato
+    esperado por aplicar_no_rollup. Pode acumular sobre um `deltas` existente.
+    """
+    if deltas is None:
+        deltas = defaultdict(lambda: (Decimal('0.00'), 0))
+    for linha in linhas:
+        dia = linha['criado_em'].replace(hour=0, minute=0, second=0, microsecond=0)
+        chave = (linha['obra_id'], linha['tipo'], dia)
+        valor, quantidade = deltas[chave]
+        deltas[chave] = (valor + linha['valor'], quantidade + 1)
+    return deltas
+
+
+def rebuild_cashflow_rollup(batch_size=5000):
+    """
+    Recalcula o rollup inteiro a partir das transações ativas.
+    As transações são lidas em streaming; a memória cresce com o número de
+    (obra, tipo, dia), não com o número de transações.
+    """
+    query = db.session.query(
+        FinanceiroTransacoes.obra_id,
+        FinanceiroTransacoes.tipo,
+        FinanceiroTransacoes.valor,
+        FinanceiroTransacoes.criado_em
+    ).filter(
+        FinanceiroTransacoes.status == 'ativo',
+        FinanceiroTransacoes.criado_em != None
+    ).execution_options(yield_per=batch_size)
+
+    total = 0
+    deltas = None
+    for obra_id, tipo, valor, criado_em in query:
+        deltas = agrupar_transacoes(
+            [{'obra_id': obra_id, 'tipo': tipo, 'valor': valor, 'criado_em': criado_em}], deltas
+        )
+        total += 1
+
+    CashflowRollup.query.delete()
+    if deltas:
+        aplicar_no_rollup(deltas)
+    db.session.commit()
+    return total
+
+
+def init_app(app):
+    @app.cli.command('rebuild-cashflow')
+    def rebuild_cashflow_command():
+        """Recalcula a tabela cashflow_rollup a partir das transações ativas."""
+        total = rebuild_cashflow_rollup()
+        click.echo(f"Rollup do fluxo de caixa recalculado a partir de {total} transações.")
@@ -0,0 +1,54 @@
+from flask import current_app, request
+import gzip
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional: sem ele só gzip
+    brotli = None
+
+# --- Compressão das respostas ---
+# JSON e texto acima de COMPRESS_MIN_SIZE saem com gzip (ou brotli, se instalado e
+# aceito pelo cliente). Respostas em streaming e arquivos (send_file) passam direto:
+# os arquivos já são comprimidos ou ficam com o servidor web.
+
+COMPRESSIVEIS = ('application/json', 'application/x-ndjson', 'text/csv', 'text/plain', 'text/html')
+
+
+def _codificacao(response, config):
+    if not config['COMPRESS_ENABLED'] or request.method == 'HEAD':
+        return None
+    if response.status_code != 200 or response.direct_passthrough or response.is_streamed:
+        return None
+    if 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIVEIS:
+        return None
+    if response.content_length is not None and response.content_length < config['COMPRESS_MIN_SIZE']:
+        return None
+    opcoes = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(opcoes)
+
+
+def comprimir_resposta(response):
+    config = current_app.config
+    codificacao = _codificacao(response, config)
+    if codificacao is None:
+        return response
+    corpo = response.get_data()
+    if len(corpo) < config['COMPRESS_MIN_SIZE']:
+        return response
+    if codificacao == 'br':
+        comprimido = brotli.compress(corpo, quality=config['COMPRESS_BR_QUALITY'])
+    else:
+        comprimido = gzip.compress(corpo, compresslevel=config['COMPRESS_LEVEL'], mtime=0)
+
+    response.set_data(comprimido)
+    response.headers['Content-Encoding'] = codificacao
+    response.vary.add('Accept-Encoding')
+    # Outra representação do mesmo recurso: um ETag forte deixa de valer byte a byte
+    etag, fraco = response.get_etag()
+    if etag and not fraco:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    app.after_request(comprimir_resposta)
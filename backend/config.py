@@ -16,4 +16,53 @@ class Config:
         SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'instance', 'app.db')
     # ------------------------------------
 
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Cache em memória de identidade (user_id -> cargo) usado pelos decorators
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', 60))
+    IDENTITY_CACHE_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE', 1024))
+    # Limite de obra_ids embutidos no token de um Prestador (acima disso, consulta o banco)
+    JWT_MAX_OBRAS_CLAIM = int(os.environ.get('JWT_MAX_OBRAS_CLAIM', 200))
+
+    # Custo do bcrypt e pool de verificação de senha no login. O pool fica desligado
+    # por padrão: com workers sync (o padrão do gunicorn) ele só acrescenta uma troca de
+    # thread e pode responder 503. Ligue apenas com workers em threads (--threads / gthread).
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    BCRYPT_VERIFY_POOL = os.environ.get('BCRYPT_VERIFY_POOL', 'false').lower() in ('1', 'true', 'yes')
+    BCRYPT_VERIFY_WORKERS = int(os.environ.get('BCRYPT_VERIFY_WORKERS', 4))
+    BCRYPT_VERIFY_MAX_PENDING = int(os.environ.get('BCRYPT_VERIFY_MAX_PENDING', 64))
+    BCRYPT_VERIFY_TIMEOUT = float(os.environ.get('BCRYPT_VERIFY_TIMEOUT', 10))
+
+    # Auditoria assíncrona em lote (ações financeiras são sempre gravadas na transação da rota)
+    AUDIT_ASYNC = os.environ.get('AUDIT_ASYNC', 'true').lower() in ('1', 'true', 'yes')
+    AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 200))
+    AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1.0))
+    AUDIT_QUEUE_SIZE = int(os.environ.get('AUDIT_QUEUE_SIZE', 10000))
+
+    # Versões reduzidas das fotos (requer Pillow; sem ele as URLs apontam para o original)
+    IMAGE_RENDITIONS_ENABLED = os.environ.get('IMAGE_RENDITIONS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    IMAGE_RENDITION_FORMAT = os.environ.get('IMAGE_RENDITION_FORMAT', 'WEBP')
+    IMAGE_RENDITION_QUALITY = int(os.environ.get('IMAGE_RENDITION_QUALITY', 80))
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+
+    # Upload retomável de documentos (tamanho máximo do arquivo e de cada parte, em bytes)
+    DOCUMENT_MAX_SIZE = int(os.environ.get('DOCUMENT_MAX_SIZE', 2 * 1024 ** 3))
+    DOCUMENT_UPLOAD_CHUNK_MAX = int(os.environ.get('DOCUMENT_UPLOAD_CHUNK_MAX', 32 * 1024 ** 2))
+
+    # Entrega dos uploads: 'python', 'x-accel-redirect' (nginx) ou 'x-sendfile' (Apache/lighttpd)
+    FILE_SERVING_MODE = os.environ.get('FILE_SERVING_MODE', 'python')
+    # Location interna do nginx que aponta para instance/uploads/ (modo x-accel-redirect)
+    FILE_X_ACCEL_PREFIX = os.environ.get('FILE_X_ACCEL_PREFIX', '/_uploads')
+
+    # Serialização JSON das respostas: 'auto' (orjson se instalado), 'orjson' ou 'stdlib'
+    JSON_ENGINE = os.environ.get('JSON_ENGINE', 'auto')
+
+    # Compressão das respostas JSON/texto (gzip; brotli se o pacote estiver instalado)
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    COMPRESS_BR_QUALITY = int(os.environ.get('COMPRESS_BR_QUALITY', 4))
+
+    # Sincronização offline (/api/sync): margem de reenvio e retenção dos registros de remoção
+    SYNC_MARGEM_SEGUNDOS = int(os.environ.get('SYNC_MARGEM_SEGUNDOS', 5))
+    SYNC_REMOCOES_DIAS = int(os.environ.get('SYNC_REMOCOES_DIAS', 90))
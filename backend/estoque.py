@@ -0,0 +1,126 @@
+from .models import InventarioItens, InventarioMovimento, Obras
+from .extensions import db
+from sqlalchemy import select, update, func
+from sqlalchemy.orm.attributes import set_committed_value
+import uuid
+
+# --- Movimentações de inventário ---
+# O saldo de cada item continua em InventarioItens.quantidade, e toda alteração passa
+# por aqui: um único UPDATE condicional por item (o saldo nunca fica negativo) que já
+# devolve o novo saldo, mais uma linha em inventario_movimentos. As consultas de
+# estoque leem o saldo direto; o livro explica cada alteração sem ser somado.
+# O commit fica com a rota, como no restante do projeto.
+
+
+class SaldoInsuficienteError(ValueError):
+    pass
+
+
+def _registrar(item, delta, saldo, tipo, user_id, transferencia_id=None, observacao=None):
+    movimento = InventarioMovimento(
+        obra_id=item.obra_id,
+        item_id=item.id,
+        item_nome=item.nome,
+        tipo=tipo,
+        quantidade=delta,
+        saldo_apos=saldo,
+        custo_unitario=item.custo_unitario,
+        transferencia_id=transferencia_id,
+        observacao=observacao,
+        user_id=int(user_id) if user_id is not None else None
+    )
+    db.session.add(movimento)
+    return movimento
+
+
+def registrar_saldo_inicial(item, user_id, tipo='entrada', observacao=None):
+    """Movimento de um item recém-criado (o saldo já foi gravado no INSERT; requer item.id)."""
+    return _registrar(item, item.quantidade or 0, item.quantidade or 0, tipo, user_id, observacao=observacao)
+
+
+def movimentar(item, delta, tipo, user_id, transferencia_id=None, observacao=None):
+    """
+    Soma `delta` (com sinal) ao saldo do item e registra o movimento.
+    Levanta SaldoInsuficienteError se o saldo ficaria negativo.
+    """
+    tabela = InventarioItens.__table__
+    saldo_atual = func.coalesce(tabela.c.quantidade, 0)
+    stmt = update(tabela).where(tabela.c.id == item.id)
+    if delta < 0:
+        stmt = stmt.where(saldo_atual >= -delta)
+    saldo = db.session.execute(
+        stmt.values(quantidade=saldo_atual + delta).returning(tabela.c.quantidade)
+    ).scalar()
+    if saldo is None:
+        raise SaldoInsuficienteError(f"Saldo insuficiente de '{item.nome}' para retirar {-delta}.")
+    set_committed_value(item, 'quantidade', saldo)
+    return _registrar(item, delta, saldo, tipo, user_id, transferencia_id, observacao)
+
+
+def definir_saldo(item, nova_quantidade, tipo, user_id, observacao=None, tentativas=5):
+    """
+    Grava `nova_quantidade` como saldo e registra a diferença para o saldo anterior.
+    A diferença sai do valor atual da linha (travada com FOR UPDATE onde o banco
+    suporta), e o UPDATE só vale se o saldo ainda for o lido; se outra transação
+    alterou o item no meio, lê de novo. Retorna o movimento, ou None se não mudou.
+    """
+    tabela = InventarioItens.__table__
+    saldo_atual = func.coalesce(tabela.c.quantidade, 0)
+    for _ in range(tentativas):
+        anterior = db.session.execute(
+            select(saldo_atual).where(tabela.c.id == item.id).with_for_update()
+        ).scalar()
+        if anterior is None:
+            raise LookupError(f"Item de inventário {item.id} não encontrado.")
+        if anterior == nova_quantidade:
+            set_committed_value(item, 'quantidade', anterior)
+            return None
+        gravado = db.session.execute(
+            update(tabela)
+            .where(tabela.c.id == item.id, saldo_atual == anterior)
+            .values(quantidade=nova_quantidade)
+            .returning(tabela.c.id)
+        ).scalar()
+        if gravado is not None:
+            set_committed_value(item, 'quantidade', nova_quantidade)
+            return _registrar(item, nova_quantidade - anterior, nova_quantidade, tipo, user_id, observacao=observacao)
+    raise RuntimeError(f"Saldo de '{item.nome}' alterado concorrentemente; tente novamente.")
+
+
+def obra_estoque_central():
+    return Obras.query.filter_by(is_stock_default=True).first()
+
+
+def transferir(item_origem, obra_destino_id, quantidade, user_id, observacao=None):
+    """
+    Move `quantidade` do item para o item de mesmo nome e tipo na obra de destino,
+    criando-o se ainda não existir. Retorna (item_destino, transferencia_id).
+    A linha da obra de destino fica travada (FOR UPDATE) antes da busca, para que duas
+    transferências simultâneas do mesmo item não criem dois itens no destino; não há
+    índice único em (obra_id, nome, tipo) porque o cadastro manual admite repetidos.
+    No SQLite, que ignora FOR UPDATE, a escrita da origem já serializa as transações.
+    """
+    transferencia_id = uuid.uuid4().hex
+    db.session.execute(select(Obras.id).where(Obras.id == obra_destino_id).with_for_update())
+    movimentar(item_origem, -quantidade, 'transferencia_saida', user_id, transferencia_id, observacao)
+
+    destino = InventarioItens.query.filter_by(
+        obra_id=obra_destino_id, nome=item_origem.nome, tipo=item_origem.tipo
+    ).order_by(InventarioItens.id).first()
+    if destino is not None:
+        movimentar(destino, quantidade, 'transferencia_entrada', user_id, transferencia_id, observacao)
+        return destino, transferencia_id
+
+    destino = InventarioItens(
+        obra_id=obra_destino_id,
+        tipo=item_origem.tipo,
+        nome=item_origem.nome,
+        descricao=item_origem.descricao,
+        quantidade=quantidade,
+        custo_unitario=item_origem.custo_unitario,
+        status_movimentacao='Em Estoque'
+    )
+    db.session.add(destino)
+    db.session.flush()
+    _registrar(destino, quantidade, quantidade, 'transferencia_entrada', user_id, transferencia_id, observacao)
+    return destino, transferencia_id
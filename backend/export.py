@@ -0,0 +1,129 @@
+from .models import Documentos, ChecklistItem, ChecklistAnexo
+from .extensions import db
+from .storage import pasta_blobs, CHUNK_SIZE
+from flask import current_app
+import hashlib
+import json
+import os
+import time
+import zipfile
+
+# --- Exportação da obra em ZIP (entrega da obra) ---
+# montar_manifesto() lista, em ordem estável, os documentos e as fotos do checklist;
+# gerar_zip() monta o ZIP em streaming: cada bloco lido do disco é entregue ao cliente
+# assim que passa pelo ZipFile, então a memória não cresce com o tamanho da obra
+# (entradas grandes usam ZIP64). Formatos já comprimidos vão sem compressão (STORED).
+# Retomada: a primeira entrada do ZIP é indice.json, com o id do manifesto e as
+# entradas numeradas. Se o download cair, o cliente pede
+# ?manifesto=<id>&a_partir_de=<n> e recebe um ZIP só com as entradas n em diante.
+
+CHECKLIST_UPLOAD_FOLDER = 'uploads/checklist_pics'
+EXTENSOES_SEM_COMPRESSAO = {
+    'jpg', 'jpeg', 'png', 'gif', 'webp', 'pdf', 'zip', 'docx', 'xlsx', 'dwg'
+}
+INDICE_NOME = 'indice.json'
+
+
+def _entradas_da_obra(obra_id):
+    """(nome no ZIP, caminho em disco), documentos primeiro e depois as fotos, por id."""
+    documentos = db.session.query(Documentos.id, Documentos.filename, Documentos.filepath).filter(
+        Documentos.obra_id == obra_id
+    ).order_by(Documentos.id)
+    for doc_id, filename, filepath in documentos:
+        yield f'documentos/{doc_id}_{filename}', os.path.join(pasta_blobs(), filepath)
+
+    pasta_checklist = os.path.join(current_app.instance_path, CHECKLIST_UPLOAD_FOLDER)
+    anexos = db.session.query(ChecklistAnexo.checklist_item_id, ChecklistAnexo.filename).join(
+        ChecklistItem, ChecklistItem.id == ChecklistAnexo.checklist_item_id
+    ).filter(ChecklistItem.obra_id == obra_id).order_by(ChecklistAnexo.id)
+    for item_id, filename in anexos:
+        yield f'checklist/{item_id}/{filename}', os.path.join(pasta_checklist, filename)
+
+
+def montar_manifesto(obra_id):
+    """
+    Retorna (manifesto, caminhos). O manifesto é o conteúdo de indice.json; `caminhos`
+    tem o arquivo em disco de cada entrada, na mesma ordem. Arquivos que não estão
+    mais no disco vão para 'ausentes' e não entram no ZIP.
+    """
+    entradas, caminhos, ausentes = [], [], []
+    for nome, caminho in _entradas_da_obra(obra_id):
+        try:
+            stat = os.stat(caminho)
+        except FileNotFoundError:
+            ausentes.append(nome)
+            continue
+        entradas.append({'indice': len(entradas), 'nome': nome, 'tamanho': stat.st_size})
+        caminhos.append((caminho, stat.st_mtime))
+
+    # O id muda se qualquer entrada mudar; a retomada só vale para o mesmo manifesto
+    assinatura = json.dumps([(e['nome'], e['tamanho']) for e in entradas]).encode()
+    manifesto = {
+        'obra_id': obra_id,
+        'manifesto': hashlib.sha256(assinatura).hexdigest()[:16],
+        'gerado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'total_arquivos': len(entradas),
+        'total_bytes': sum(e['tamanho'] for e in entradas),
+        'entradas': entradas,
+        'ausentes': ausentes,
+    }
+    return manifesto, caminhos
+
+
+class _SaidaStream:
+    """Destino só de escrita do ZipFile; guarda os bytes até o gerador entregá-los."""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def esvaziar(self):
+        dados = b''.join(self.partes)
+        self.partes.clear()
+        return dados
+
+
+def _zip_info(nome, mtime=None):
+    info = zipfile.ZipInfo(nome, date_time=time.localtime(mtime)[:6] if mtime else time.localtime()[:6])
+    if info.date_time[0] < 1980:
+        info.date_time = (1980, 1, 1, 0, 0, 0)
+    extensao = nome.rsplit('.', 1)[-1].lower() if '.' in nome else ''
+    info.compress_type = zipfile.ZIP_STORED if extensao in EXTENSOES_SEM_COMPRESSAO else zipfile.ZIP_DEFLATED
+    return info
+
+
+def gerar_zip(manifesto, caminhos, a_partir_de=0):
+    """Gerador com os bytes do ZIP: indice.json e as entradas a partir de `a_partir_de`."""
+    # Partes vazias ficam de fora: num corpo chunked elas encerrariam a resposta
+    for parte in _partes_do_zip(manifesto, caminhos, a_partir_de):
+        if parte:
+            yield parte
+
+
+def _partes_do_zip(manifesto, caminhos, a_partir_de):
+    saida = _SaidaStream()
+    with zipfile.ZipFile(saida, 'w', allowZip64=True) as zf:
+        zf.writestr(_zip_info(INDICE_NOME), json.dumps(manifesto, ensure_ascii=False, indent=2))
+        yield saida.esvaziar()
+        for entrada, (caminho, mtime) in zip(manifesto['entradas'][a_partir_de:], caminhos[a_partir_de:]):
+            info = _zip_info(entrada['nome'], mtime)
+            # Com o tamanho conhecido o ZipFile decide sozinho quando usar ZIP64
+            info.file_size = entrada['tamanho']
+            try:
+                origem = open(caminho, 'rb')
+            except FileNotFoundError:
+                print(f"Aviso: {entrada['nome']} foi removido durante a exportação da obra {manifesto['obra_id']}.")
+                continue
+            with origem, zf.open(info, 'w') as destino:
+                for bloco in iter(lambda: origem.read(CHUNK_SIZE), b''):
+                    destino.write(bloco)
+                    yield saida.esvaziar()
+            yield saida.esvaziar()
+    # Diretório central, gravado no close() do ZipFile
+    yield saida.esvaziar()
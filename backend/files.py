@@ -0,0 +1,108 @@
+from flask import current_app, request, send_file, jsonify
+from werkzeug.security import safe_join
+from urllib.parse import quote
+from .storage import SHA256_RE
+import mimetypes
+import os
+
+# --- Entrega dos arquivos enviados (fotos e documentos) ---
+# Todas as rotas /api/uploads/... passam por servir_arquivo():
+# - ETag forte: o próprio SHA-256 nos documentos por hash; nos demais arquivos,
+#   "<mtime>-<tamanho>" em hexadecimal (o mesmo formato que o nginx gera).
+# - Cache-Control: nomes por hash (<sha256>/<nome>) nunca mudam de conteúdo e
+#   recebem max-age de um ano + immutable; os demais são revalidados (no-cache),
+#   o que com If-None-Match custa só um 304.
+# - FILE_SERVING_MODE:
+#     'python'           -> o Flask envia o arquivo (com Range/206 e 304);
+#     'x-accel-redirect' -> o nginx envia a partir de FILE_X_ACCEL_PREFIX, ex.:
+#                             location /_uploads/ { internal; alias /app/instance/uploads/; }
+#     'x-sendfile'       -> Apache/lighttpd com X-Sendfile.
+#   Nos modos de offload o Python só responde o 304; o Range fica com o servidor web.
+
+PASTAS_SERVIDAS = {
+    'profile_pics': 'serve_profile_pic',
+    'checklist_pics': 'serve_checklist_pic',
+    'documentos_obra': 'serve_documento_obra',
+    'marketplace': 'serve_marketplace_pic',
+}
+MAX_AGE_IMUTAVEL = 365 * 24 * 3600
+MODOS = ('python', 'x-accel-redirect', 'x-sendfile')
+
+
+def _nao_encontrado():
+    return jsonify({"error": "Ficheiro não encontrado"}), 404
+
+
+def resolver_arquivo(pasta, filename):
+    """
+    Traduz a URL em (caminho, relativo, nome_para_download, etag_do_conteudo).
+    Arquivos ocultos (temporários e uploads parciais começam com '.') não são servidos.
+    """
+    partes = filename.split('/')
+    if any(not parte or parte.startswith('.') for parte in partes):
+        return None
+    etag = None
+    download_name = partes[-1]
+    # Documentos por hash: <sha256>/<nome original>; o arquivo é o blob
+    if pasta == 'documentos_obra' and len(partes) == 2 and SHA256_RE.match(partes[0]):
+        etag = partes[0]
+        filename = partes[0]
+    base = os.path.join(current_app.instance_path, 'uploads', pasta)
+    caminho = safe_join(base, filename)
+    if caminho is None or not os.path.isfile(caminho):
+        return None
+    return caminho, f'{pasta}/{filename}', download_name, etag
+
+
+def servir_arquivo(pasta, filename):
+    resolvido = resolver_arquivo(pasta, filename)
+    if resolvido is None:
+        return _nao_encontrado()
+    caminho, relativo, download_name, etag_conteudo = resolvido
+
+    imutavel = etag_conteudo is not None
+    if etag_conteudo is None:
+        stat = os.stat(caminho)
+        etag = f'{int(stat.st_mtime):x}-{stat.st_size:x}'
+    else:
+        etag = etag_conteudo
+    modo = current_app.config.get('FILE_SERVING_MODE', 'python')
+    offload = modo != 'python'
+
+    rv = send_file(
+        caminho,
+        mimetype=mimetypes.guess_type(download_name)[0] or 'application/octet-stream',
+        download_name=download_name,
+        etag=etag,
+        max_age=MAX_AGE_IMUTAVEL if imutavel else None,
+        conditional=not offload,
+    )
+    if imutavel:
+        rv.cache_control.immutable = True
+    if not offload:
+        return rv
+
+    # Offload: o 304 sai daqui mesmo; o resto (inclusive Range) é com o servidor web
+    if request.if_none_match.contains(etag):
+        rv.status_code = 304
+        rv.headers.pop('X-Sendfile', None)
+        rv.content_length = None
+        return rv
+    if modo == 'x-accel-redirect':
+        rv.headers.pop('X-Sendfile', None)
+        prefixo = current_app.config.get('FILE_X_ACCEL_PREFIX', '/_uploads').rstrip('/')
+        rv.headers['X-Accel-Redirect'] = f'{prefixo}/{quote(relativo)}'
+    return rv
+
+
+def init_app(app):
+    modo = app.config.get('FILE_SERVING_MODE', 'python')
+    if modo not in MODOS:
+        raise ValueError(f"FILE_SERVING_MODE inválido: '{modo}' (use {', '.join(MODOS)}).")
+    # O send_file do Flask só monta o X-Sendfile (sem abrir o arquivo) com esta opção
+    app.config['USE_X_SENDFILE'] = modo != 'python'
+
+    for pasta, endpoint in PASTAS_SERVIDAS.items():
+        def view(filename, pasta=pasta):
+            return servir_arquivo(pasta, filename)
+        app.add_url_rule(f'/api/uploads/{pasta}/<path:filename>', endpoint, view)
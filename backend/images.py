@@ -0,0 +1,213 @@
+from flask import current_app
+from .extensions import db
+from concurrent.futures import ProcessPoolExecutor
+import click
+import multiprocessing
+import os
+import threading
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow é opcional: sem ele as URLs apontam para o original
+    Image = None
+
+# --- Versões reduzidas das fotos (thumb/medium) ---
+# Depois do upload, um pool de processos gera as versões em
+# uploads/<pasta>/renditions/<nome>_<tamanho>.<ext>, já rotacionadas e sem EXIF.
+# Quando a geração termina, o formato gerado é gravado na coluna de marca da linha
+# da foto (ex: User.foto_renditions); enquanto ela for NULL, rendition_urls()
+# devolve a URL do original, sem consultar o sistema de arquivos.
+
+RENDITIONS = {
+    'thumb': 320,
+    'medium': 1280,
+}
+RENDITIONS_DIR = 'renditions'
+PHOTO_FOLDERS = ('uploads/profile_pics', 'uploads/checklist_pics', 'uploads/marketplace')
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+# pasta -> [(coluna com o nome do arquivo, coluna de marca)], preenchido por models.py
+_colunas_de_marca = {}
+
+
+def registrar_fotos(folder, coluna_arquivo, coluna_marca):
+    """Declara onde ficam as fotos de `folder` e em que coluna marcar as versões prontas."""
+    _colunas_de_marca.setdefault(folder, []).append((coluna_arquivo, coluna_marca))
+
+
+def marcar_renditions(folder, filename, formato):
+    """
+    Grava `formato` na coluna de marca das linhas que apontam para o arquivo (o commit
+    fica com quem chama). Passa pelo ORM para disparar os eventos de atualização (ex: o
+    item do checklist conta como alterado para o ETag e a sincronização).
+    """
+    for coluna_arquivo, coluna_marca in _colunas_de_marca.get(folder, ()):
+        modelo = coluna_arquivo.class_
+        for linha in db.session.query(modelo).filter(coluna_arquivo == filename):
+            if getattr(linha, coluna_marca.key) != formato:
+                setattr(linha, coluna_marca.key, formato)
+
+
+def pipeline_ativo():
+    return Image is not None and current_app.config.get('IMAGE_RENDITIONS_ENABLED', True)
+
+
+def _formato():
+    formato = current_app.config.get('IMAGE_RENDITION_FORMAT', 'WEBP').upper()
+    if formato == 'WEBP' and Image is not None and not features.check('webp'):
+        formato = 'JPEG'
+    return formato
+
+
+def _extensao(formato):
+    return 'webp' if formato == 'WEBP' else 'jpg'
+
+
+def _nome_rendition(filename, tamanho, formato):
+    stem = filename.rsplit('.', 1)[0]
+    return f"{stem}_{tamanho}.{_extensao(formato)}"
+
+
+def gerar_renditions(origem, destino_dir, nomes, formato, qualidade):
+    """
+    Executado no pool de processos. `nomes` é {tamanho: nome_do_arquivo}.
+    Grava em arquivo temporário e renomeia, para nunca servir uma imagem pela metade.
+    """
+    with Image.open(origem) as img:
+        img = ImageOps.exif_transpose(img)
+        if formato == 'JPEG' and img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        elif img.mode not in ('RGB', 'RGBA', 'L'):
+            img = img.convert('RGBA')
+        os.makedirs(destino_dir, exist_ok=True)
+        for tamanho, nome in nomes.items():
+            lado = RENDITIONS[tamanho]
+            copia = img.copy()
+            copia.thumbnail((lado, lado))
+            destino = os.path.join(destino_dir, nome)
+            temporario = destino + '.tmp'
+            # Sem exif=...: o arquivo gerado não carrega metadados (GPS, câmera)
+            copia.save(temporario, format=formato, quality=qualidade, optimize=True)
+            os.replace(temporario, destino)
+    return list(nomes.values())
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    # Um pool por processo (após fork do gunicorn o pool do pai não serve)
+    if _executor is not None and _executor_pid == os.getpid():
+        return _executor
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ProcessPoolExecutor(
+                max_workers=current_app.config.get('IMAGE_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            _executor_pid = os.getpid()
+    return _executor
+
+
+def _argumentos(folder, filename):
+    formato = _formato()
+    pasta = os.path.join(current_app.instance_path, folder)
+    nomes = {tamanho: _nome_rendition(filename, tamanho, formato) for tamanho in RENDITIONS}
+    return (
+        os.path.join(pasta, filename),
+        os.path.join(pasta, RENDITIONS_DIR),
+        nomes,
+        formato,
+        current_app.config.get('IMAGE_RENDITION_QUALITY', 80),
+    )
+
+
+def agendar_renditions(folder, filename):
+    """Envia a geração das versões para o pool; não bloqueia a requisição."""
+    if not filename or not pipeline_ativo():
+        return
+    app = current_app._get_current_object()
+    argumentos = _argumentos(folder, filename)
+    try:
+        future = _get_executor().submit(gerar_renditions, *argumentos)
+    except Exception as e:
+        print(f"Aviso: não foi possível agendar as versões reduzidas de {filename}: {e}")
+        return
+
+    def _ao_terminar(f):
+        if f.exception() is not None:
+            print(f"Aviso: falha ao gerar versões reduzidas de {filename}: {f.exception()}")
+            return
+        try:
+            with app.app_context():
+                marcar_renditions(folder, filename, argumentos[3])
+                db.session.commit()
+        except Exception as e:
+            print(f"Aviso: versões reduzidas de {filename} geradas, mas não marcadas como prontas: {e}")
+
+    future.add_done_callback(_ao_terminar)
+
+
+def rendition_urls(folder, filename, formato=None):
+    """
+    {'original', 'thumb', 'medium'}. `formato` é o valor da coluna de marca da foto:
+    sem ele (versões ainda não geradas) ou com o pipeline desligado, tudo aponta para o original.
+    """
+    if not filename:
+        return None
+    base = f'/api/{folder}'
+    original = f'{base}/{filename}'
+    if not formato or not pipeline_ativo():
+        return {'original': original, **{tamanho: original for tamanho in RENDITIONS}}
+    urls = {'original': original}
+    for tamanho in RENDITIONS:
+        urls[tamanho] = f'{base}/{RENDITIONS_DIR}/{_nome_rendition(filename, tamanho, formato)}'
+    return urls
+
+
+def remover_renditions(folder, filename):
+    if not filename:
+        return
+    pasta = os.path.join(current_app.instance_path, folder, RENDITIONS_DIR)
+    for formato in ('WEBP', 'JPEG'):
+        for tamanho in RENDITIONS:
+            nome = _nome_rendition(filename, tamanho, formato)
+            try:
+                os.remove(os.path.join(pasta, nome))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"Aviso: não foi possível remover a versão reduzida {nome}: {e}")
+
+
+def init_app(app):
+    @app.cli.command('generate-renditions')
+    @click.option('--force', is_flag=True, help='Regera mesmo as versões que já existem.')
+    def generate_renditions_command(force):
+        """Gera as versões reduzidas das fotos já enviadas (perfil, checklist, marketplace)."""
+        if Image is None:
+            click.echo("Pillow não está instalado; nada a fazer.")
+            return
+        formato = _formato()
+        geradas = 0
+        for folder in PHOTO_FOLDERS:
+            pasta = os.path.join(app.instance_path, folder)
+            if not os.path.isdir(pasta):
+                continue
+            for filename in sorted(os.listdir(pasta)):
+                if not os.path.isfile(os.path.join(pasta, filename)):
+                    continue
+                destino = os.path.join(pasta, RENDITIONS_DIR)
+                if force or not all(
+                    os.path.exists(os.path.join(destino, _nome_rendition(filename, t, formato))) for t in RENDITIONS
+                ):
+                    try:
+                        gerar_renditions(*_argumentos(folder, filename))
+                        geradas += 1
+                    except Exception as e:
+                        click.echo(f"Falha em {folder}/{filename}: {e}")
+                        continue
+                # Marca também as que já existiam (ex: geradas antes da coluna de marca)
+                marcar_renditions(folder, filename, formato)
+            db.session.commit()
+        click.echo(f"Versões reduzidas geradas para {geradas} fotos.")
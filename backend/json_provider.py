@@ -0,0 +1,70 @@
+from flask.json.provider import DefaultJSONProvider
+from datetime import date, datetime
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional: sem ele fica o json da biblioteca padrão
+    orjson = None
+
+# --- Provider JSON da aplicação (jsonify, request.get_json) ---
+# datetime/date saem em isoformat() e Decimal como str, o mesmo formato que os
+# to_dict() já produzem; assim rotas podem devolver os valores crus (ex: Rows de
+# serializers.Projecao) sem converter campo a campo.
+# JSON_ENGINE: 'auto' (orjson se instalado), 'orjson' ou 'stdlib'.
+
+
+def _default(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return str(obj)
+    return DefaultJSONProvider.default(obj)
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    default = staticmethod(_default)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Serializa com orjson direto para bytes (sem passar por str na resposta).
+    Mantém sort_keys e a indentação em modo debug, como o provider padrão.
+    Chamadas com opções do json padrão (indent=..., cls=...) usam o provider padrão.
+    """
+    default = staticmethod(_default)
+
+    def _opcoes(self):
+        opcoes = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            opcoes |= orjson.OPT_SORT_KEYS
+        if self.compact is False or (self.compact is None and self._app.debug):
+            opcoes |= orjson.OPT_INDENT_2
+        return opcoes
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_default, option=self._opcoes()).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        corpo = orjson.dumps(obj, default=_default, option=self._opcoes() | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(corpo, mimetype=self.mimetype)
+
+
+def init_app(app):
+    motor = app.config.get('JSON_ENGINE', 'auto')
+    if motor not in ('auto', 'orjson', 'stdlib'):
+        raise ValueError(f"JSON_ENGINE inválido: '{motor}' (use auto, orjson ou stdlib).")
+    if motor == 'orjson' and orjson is None:
+        raise RuntimeError("JSON_ENGINE=orjson, mas o pacote orjson não está instalado.")
+    if orjson is not None and motor != 'stdlib':
+        app.json = OrjsonProvider(app)
+    else:
+        app.json = StdlibJSONProvider(app)
@@ -1,4 +1,7 @@
 from .extensions import db, bcrypt
+from .images import rendition_urls, registrar_fotos
+from .busca import normalizar_texto, so_digitos, metragem_em_m2, CEP_DIGITOS
+from sqlalchemy import event, update, delete
 from datetime import datetime, date # Importa date
 
 class User(db.Model):
@@ -12,8 +15,12 @@ class User(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     telefone = db.Column(db.String(20), nullable=True)
     foto_path = db.Column(db.String(255), nullable=True) 
+    # Formato das versões reduzidas já geradas (NULL enquanto não existem); ver images.py
+    foto_renditions = db.Column(db.String(10), nullable=True)
     role_id = db.Column(db.Integer, db.ForeignKey('roles.id'), nullable=False, default=3) 
     must_change_password = db.Column(db.Boolean, default=False)
+    # Incrementado quando cargo/vínculos mudam, invalidando as claims dos tokens já emitidos
+    token_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
 
@@ -43,6 +50,7 @@ class User(db.Model):
             'telefone': self.telefone,
             'role': self.role.name if self.role else None,
             'foto_path': foto_url, 
+            'foto_urls': rendition_urls('uploads/profile_pics', self.foto_path, self.foto_renditions),
             'must_change_password': self.must_change_password
         }
         if include_details:
@@ -66,6 +74,13 @@ class Role(db.Model):
 
 class Obras(db.Model):
     __tablename__ = 'obras'
+    # Índices da listagem paginada (ORDER BY criado_em DESC, id DESC + filtros)
+    __table_args__ = (
+        db.Index('ix_obras_criado_em_id', 'criado_em', 'id'),
+        db.Index('ix_obras_status_criado_em_id', 'status', 'criado_em', 'id'),
+        db.Index('ix_obras_is_stock_default_criado_em_id', 'is_stock_default', 'criado_em', 'id'),
+        db.Index('ix_obras_nome', 'nome', postgresql_ops={'nome': 'varchar_pattern_ops'}),
+    )
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(200), nullable=False)
     endereco = db.Column(db.String(255), nullable=True)
@@ -74,7 +89,7 @@ class Obras(db.Model):
     orcamento_atual = db.Column(db.Numeric(10, 2), nullable=True, default=0.0)
     status = db.Column(db.String(50), default='Em Andamento')
     criado_por = db.Column(db.Integer, db.ForeignKey('users.id'))
-    criado_em = db.Column(db.DateTime, default=datetime.now)
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.now)
     atualizado_em = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
     
     # --- ESTE É O CAMPO QUE FALTAVA ---
@@ -87,6 +102,7 @@ class Obras(db.Model):
     inventario = db.relationship('InventarioItens', back_populates='obra', cascade="all, delete-orphan")
     checklist_itens = db.relationship('ChecklistItem', back_populates='obra', cascade="all, delete-orphan")
     documentos = db.relationship('Documentos', back_populates='obra', cascade="all, delete-orphan")
+    movimentos_inventario = db.relationship('InventarioMovimento', back_populates='obra', cascade="all, delete-orphan")
 
 
     def to_dict(self):
@@ -106,6 +122,11 @@ class Obras(db.Model):
 
 class ObraFuncionarios(db.Model):
     __tablename__ = 'obra_funcionarios'
+    __table_args__ = (
+        db.Index('ix_obra_funcionarios_obra_id', 'obra_id'),
+        db.Index('ix_obra_funcionarios_user_id_obra_id', 'user_id', 'obra_id'),
+        db.Index('ix_obra_funcionarios_obra_id_ultima_atualizacao', 'obra_id', 'ultima_atualizacao'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     obra_id = db.Column(db.Integer, db.ForeignKey('obras.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
@@ -168,6 +189,12 @@ class ObraFuncionarios(db.Model):
 
 class FinanceiroTransacoes(db.Model):
     __tablename__ = 'financeiro_transacoes'
+    __table_args__ = (
+        db.Index('ix_financeiro_transacoes_obra_id_status_criado_em', 'obra_id', 'status', 'criado_em'),
+        db.Index('ix_financeiro_transacoes_obra_id_atualizado_em', 'obra_id', 'atualizado_em'),
+        db.Index('ix_financeiro_transacoes_status_tipo', 'status', 'tipo'),
+        db.Index('ix_financeiro_transacoes_criado_em', 'criado_em'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     obra_id = db.Column(db.Integer, db.ForeignKey('obras.id'), nullable=False)
     tipo = db.Column(db.String(20), nullable=False) # 'entrada', 'saida'
@@ -201,8 +228,30 @@ class FinanceiroTransacoes(db.Model):
         }
 
 
+class CashflowRollup(db.Model):
+    """Totais de transações ativas por obra/período/tipo, mantidos junto com cada lançamento."""
+    __tablename__ = 'cashflow_rollup'
+    id = db.Column(db.Integer, primary_key=True)
+    obra_id = db.Column(db.Integer, db.ForeignKey('obras.id', ondelete='CASCADE'), nullable=False)
+    period_kind = db.Column(db.String(10), nullable=False) # 'mensal', 'semanal'
+    period_key = db.Column(db.String(10), nullable=False) # '2025-11', '2025-45'
+    tipo = db.Column(db.String(20), nullable=False) # 'entrada', 'saida'
+    total = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('obra_id', 'period_kind', 'period_key', 'tipo', name='uq_cashflow_rollup_chave'),
+        db.Index('ix_cashflow_rollup_kind_key', 'period_kind', 'period_key'),
+    )
+
+
 class InventarioItens(db.Model):
     __tablename__ = 'inventario_itens'
+    __table_args__ = (
+        db.Index('ix_inventario_itens_obra_id_nome', 'obra_id', 'nome'),
+        db.Index('ix_inventario_itens_nome_obra_id', 'nome', 'obra_id'),
+        db.Index('ix_inventario_itens_obra_id_atualizado_em', 'obra_id', 'atualizado_em'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     obra_id = db.Column(db.Integer, db.ForeignKey('obras.id'), nullable=False)
     tipo = db.Column(db.String(50)) 
@@ -212,6 +261,7 @@ class InventarioItens(db.Model):
     custo_unitario = db.Column(db.Numeric(10, 2), nullable=True)
     status_movimentacao = db.Column(db.String(50), default='Em Estoque') 
     criado_em = db.Column(db.DateTime, default=datetime.now)
+    atualizado_em = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
 
     obra = db.relationship('Obras', back_populates='inventario')
 
@@ -226,6 +276,52 @@ class InventarioItens(db.Model):
             'custo_unitario': str(self.custo_unitario) if self.custo_unitario is not None else "0.00",
             'status_movimentacao': self.status_movimentacao,
             'criado_em': self.criado_em.isoformat() if self.criado_em else None,
+            'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None,
+        }
+
+class InventarioMovimento(db.Model):
+    """
+    Livro de movimentações do inventário (só recebe INSERT). O saldo atual continua
+    em InventarioItens.quantidade; cada alteração de saldo grava aqui o delta e o saldo
+    resultante. As duas pernas de uma transferência têm o mesmo transferencia_id.
+    """
+    __tablename__ = 'inventario_movimentos'
+    __table_args__ = (
+        db.Index('ix_inventario_movimentos_item_id_id', 'item_id', 'id'),
+        db.Index('ix_inventario_movimentos_obra_id_id', 'obra_id', 'id'),
+        db.Index('ix_inventario_movimentos_transferencia_id', 'transferencia_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    obra_id = db.Column(db.Integer, db.ForeignKey('obras.id'), nullable=False)
+    # SET NULL: o histórico continua existindo depois que o item é removido
+    item_id = db.Column(db.Integer, db.ForeignKey('inventario_itens.id', ondelete='SET NULL'), nullable=True)
+    item_nome = db.Column(db.String(150), nullable=False)
+    # 'saldo_inicial', 'entrada', 'saida', 'ajuste', 'transferencia_saida', 'transferencia_entrada', 'remocao'
+    tipo = db.Column(db.String(30), nullable=False)
+    quantidade = db.Column(db.Integer, nullable=False)  # delta com sinal
+    saldo_apos = db.Column(db.Integer, nullable=False)
+    custo_unitario = db.Column(db.Numeric(10, 2), nullable=True)
+    transferencia_id = db.Column(db.String(32), nullable=True)
+    observacao = db.Column(db.String(255), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    criado_em = db.Column(db.DateTime, default=datetime.now)
+
+    obra = db.relationship('Obras', back_populates='movimentos_inventario')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'obra_id': self.obra_id,
+            'item_id': self.item_id,
+            'item_nome': self.item_nome,
+            'tipo': self.tipo,
+            'quantidade': self.quantidade,
+            'saldo_apos': self.saldo_apos,
+            'custo_unitario': str(self.custo_unitario) if self.custo_unitario is not None else None,
+            'transferencia_id': self.transferencia_id,
+            'observacao': self.observacao,
+            'user_id': self.user_id,
+            'criado_em': self.criado_em.isoformat() if self.criado_em else None,
         }
 
 class PontoRegistros(db.Model):
@@ -236,8 +332,45 @@ class PontoRegistros(db.Model):
     evento = db.Column(db.String(50), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.now)
 
+class DocumentoBlob(db.Model):
+    """Arquivo de documento guardado pelo SHA-256 do conteúdo; ref_count = quantos Documentos o usam."""
+    __tablename__ = 'documento_blobs'
+    sha256 = db.Column(db.String(64), primary_key=True)
+    tamanho = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    criado_em = db.Column(db.DateTime, default=datetime.now)
+
+class UploadSessao(db.Model):
+    """Upload de documento em partes (retomável); os bytes ficam num arquivo de staging até a conclusão."""
+    __tablename__ = 'upload_sessoes'
+    id = db.Column(db.String(32), primary_key=True)
+    obra_id = db.Column(db.Integer, db.ForeignKey('obras.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    tipo = db.Column(db.String(50))
+    visibilidade = db.Column(db.String(50), default='todos')
+    tamanho_total = db.Column(db.BigInteger, nullable=False)
+    sha256_esperado = db.Column(db.String(64), nullable=True)
+    offset = db.Column(db.BigInteger, nullable=False, default=0)
+    criado_em = db.Column(db.DateTime, default=datetime.now)
+    atualizado_em = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'obra_id': self.obra_id,
+            'filename': self.filename,
+            'tamanho_total': self.tamanho_total,
+            'offset': self.offset,
+            'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None,
+        }
+
 class Documentos(db.Model):
     __tablename__ = 'documentos'
+    __table_args__ = (
+        db.Index('ix_documentos_obra_id_uploaded_at', 'obra_id', 'uploaded_at'),
+        db.Index('ix_documentos_obra_id_atualizado_em', 'obra_id', 'atualizado_em'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     obra_id = db.Column(db.Integer, db.ForeignKey('obras.id'), nullable=True) 
     filename = db.Column(db.String(255), nullable=False) 
@@ -246,24 +379,45 @@ class Documentos(db.Model):
     visibilidade = db.Column(db.String(50), default='todos') 
     uploaded_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     uploaded_at = db.Column(db.DateTime, default=datetime.now)
+    atualizado_em = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    # Documentos antigos (antes da deduplicação) têm blob_sha256 nulo e filepath = <uuid>.<ext>
+    blob_sha256 = db.Column(db.String(64), db.ForeignKey('documento_blobs.sha256'), nullable=True)
 
     obra = db.relationship('Obras', back_populates='documentos')
     uploader = db.relationship('User', foreign_keys=[uploaded_by], back_populates='documentos_enviados')
 
+    @staticmethod
+    def montar_url(blob_sha256, filename, filepath):
+        if blob_sha256:
+            # O nome original no fim da URL dá o Content-Type e o nome do download
+            return f'/api/uploads/documentos_obra/{blob_sha256}/{filename}'
+        return f'/api/uploads/documentos_obra/{filepath}'
+
+    def url(self):
+        return Documentos.montar_url(self.blob_sha256, self.filename, self.filepath)
+
     def to_dict(self):
         return {
             'id': self.id,
             'obra_id': self.obra_id,
             'filename': self.filename, 
-            'filepath_url': f'/api/uploads/documentos_obra/{self.filepath}', 
+            'filepath_url': self.url(),
+            'sha256': self.blob_sha256,
             'tipo': self.tipo,
             'visibilidade': self.visibilidade,
             'uploaded_by_nome': self.uploader.nome if self.uploader else "Sistema",
             'uploaded_at': self.uploaded_at.isoformat() if self.uploaded_at else None,
+            'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None,
         }
 
 class ChecklistItem(db.Model):
     __tablename__ = 'checklist_items'
+    __table_args__ = (
+        db.Index('ix_checklist_items_obra_id_status_data_cadastro', 'obra_id', 'status', 'data_cadastro'),
+        db.Index('ix_checklist_items_responsavel_status_prazo', 'responsavel_user_id', 'status', 'prazo'),
+        db.Index('ix_checklist_items_status_prazo', 'status', 'prazo'),
+        db.Index('ix_checklist_items_obra_id_atualizado_em', 'obra_id', 'atualizado_em'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     obra_id = db.Column(db.Integer, db.ForeignKey('obras.id'), nullable=False)
     titulo = db.Column(db.String(200), nullable=False)
@@ -273,18 +427,24 @@ class ChecklistItem(db.Model):
     data_cadastro = db.Column(db.DateTime, default=datetime.now)
     data_conclusao = db.Column(db.DateTime, nullable=True)
     prazo = db.Column(db.Date, nullable=True) 
+    # Também muda quando um anexo entra ou sai (ver _tocar_item_do_anexo)
+    atualizado_em = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
 
     responsavel = db.relationship('User', foreign_keys=[responsavel_user_id], back_populates='tarefas_atribuidas')
     obra = db.relationship('Obras', back_populates='checklist_itens')
     anexos = db.relationship('ChecklistAnexo', back_populates='checklist_item', cascade="all, delete-orphan")
 
-    def calculate_status_display(self):
-        if self.status == 'feito':
+    @staticmethod
+    def status_display_de(status, prazo):
+        if status == 'feito':
             return 'Concluído'
-        if self.prazo and self.prazo < date.today():
+        if prazo and prazo < date.today():
             return 'Atrasado'
         return 'Em dia' 
 
+    def calculate_status_display(self):
+        return ChecklistItem.status_display_de(self.status, self.prazo)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -298,15 +458,20 @@ class ChecklistItem(db.Model):
             'data_cadastro': self.data_cadastro.isoformat() if self.data_cadastro else None,
             'data_conclusao': self.data_conclusao.isoformat() if self.data_conclusao else None,
             'prazo': self.prazo.isoformat() if self.prazo else None, 
+            'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None,
             'anexos': [anexo.to_dict() for anexo in self.anexos] 
         }
 
 class ChecklistAnexo(db.Model):
     __tablename__ = 'checklist_anexos'
+    __table_args__ = (
+        db.Index('ix_checklist_anexos_checklist_item_id', 'checklist_item_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     checklist_item_id = db.Column(db.Integer, db.ForeignKey('checklist_items.id'), nullable=False)
     filename = db.Column(db.String(255), nullable=False) 
     uploaded_at = db.Column(db.DateTime, default=datetime.now)
+    renditions = db.Column(db.String(10), nullable=True)
     
     # --- ESTA É A LINHA CORRIGIDA ---
     checklist_item = db.relationship('ChecklistItem', back_populates='anexos')
@@ -316,12 +481,16 @@ class ChecklistAnexo(db.Model):
             'id': self.id,
             'filename': self.filename,
             'url': f'/api/uploads/checklist_pics/{self.filename}', 
+            'urls': rendition_urls('uploads/checklist_pics', self.filename, self.renditions),
             'uploaded_at': self.uploaded_at.isoformat()
         }
 
 
 class AuditLog(db.Model):
     __tablename__ = 'audit_logs'
+    __table_args__ = (
+        db.Index('ix_audit_logs_user_id', 'user_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     action_type = db.Column(db.String(50), nullable=False)
@@ -332,10 +501,91 @@ class AuditLog(db.Model):
     
     user = db.relationship('User', foreign_keys=[user_id], back_populates='logs_de_auditoria')
 
+# Histórico por recurso (rotas de audit_logs), do mais recente para o mais antigo
+db.Index(
+    'ix_audit_logs_resource_timestamp',
+    AuditLog.resource_type, AuditLog.resource_id, AuditLog.timestamp.desc(), AuditLog.id.desc()
+)
+
+class SyncRemocao(db.Model):
+    """
+    Remoções (tombstones) das linhas sincronizadas pelo /api/sync, gravadas pelos
+    eventos after_delete abaixo. Sem FK para obras: a linha sobrevive à remoção.
+    """
+    __tablename__ = 'sync_remocoes'
+    __table_args__ = (
+        db.Index('ix_sync_remocoes_obra_id_removido_em', 'obra_id', 'removido_em'),
+        db.Index('ix_sync_remocoes_removido_em', 'removido_em'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    recurso = db.Column(db.String(30), nullable=False)
+    registro_id = db.Column(db.Integer, nullable=False)
+    obra_id = db.Column(db.Integer, nullable=False)
+    removido_em = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    def to_dict(self):
+        return {
+            'recurso': self.recurso,
+            'id': self.registro_id,
+            'obra_id': self.obra_id,
+            'removido_em': self.removido_em.isoformat() if self.removido_em else None,
+        }
+
+# Nome de cada recurso na resposta do /api/sync (Obras à parte: o escopo é a própria obra)
+RECURSOS_SYNC = {
+    ObraFuncionarios: 'funcionarios',
+    FinanceiroTransacoes: 'financeiro',
+    InventarioItens: 'inventario',
+    ChecklistItem: 'checklist',
+    Documentos: 'documentos',
+}
+
+def _registrar_remocao(mapper, connection, target):
+    if target.obra_id is None:
+        return
+    connection.execute(SyncRemocao.__table__.insert().values(
+        recurso=RECURSOS_SYNC[mapper.class_],
+        registro_id=target.id,
+        obra_id=target.obra_id,
+        removido_em=datetime.now()
+    ))
+
+for _modelo in RECURSOS_SYNC:
+    event.listen(_modelo, 'after_delete', _registrar_remocao)
+
+@event.listens_for(Obras, 'after_delete')
+def _descartar_remocoes_da_obra(mapper, connection, target):
+    # A obra removida sai de obras_visiveis no /api/sync e o cliente descarta tudo dela
+    tabela = SyncRemocao.__table__
+    connection.execute(delete(tabela).where(tabela.c.obra_id == target.id))
+
+@event.listens_for(ChecklistAnexo, 'after_insert')
+@event.listens_for(ChecklistAnexo, 'after_update')
+@event.listens_for(ChecklistAnexo, 'after_delete')
+def _tocar_item_do_anexo(mapper, connection, target):
+    # Os anexos fazem parte do to_dict() do item: o item conta como alterado
+    tabela = ChecklistItem.__table__
+    connection.execute(
+        update(tabela).where(tabela.c.id == target.checklist_item_id).values(atualizado_em=datetime.now())
+    )
+
+class DataVersion(db.Model):
+    """Contador de versão dos dados, incrementado pelas escritas; invalida caches de relatórios."""
+    __tablename__ = 'data_versions'
+    key = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
 # --- NOVOS MODELOS PARA O MARKETPLACE ---
 
 class Imovel(db.Model):
     __tablename__ = 'imoveis'
+    __table_args__ = (
+        db.Index('ix_imoveis_criado_em', 'criado_em'),
+        db.Index('ix_imoveis_status_criado_em', 'status', 'criado_em'),
+        db.Index('ix_imoveis_bairro_criado_em', 'bairro', 'criado_em'),
+        db.Index('ix_imoveis_cep_digitos', 'cep_digitos'),
+        db.Index('ix_imoveis_metragem_m2', 'metragem_m2'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     titulo = db.Column(db.String(200), nullable=False)
     endereco = db.Column(db.String(255), nullable=False)
@@ -351,11 +601,17 @@ class Imovel(db.Model):
     
     # Foto de capa (Pré-visualização)
     foto_capa = db.Column(db.String(255), nullable=True)
+    foto_capa_renditions = db.Column(db.String(10), nullable=True)
     
     criado_por = db.Column(db.Integer, db.ForeignKey('users.id'))
-    criado_em = db.Column(db.DateTime, default=datetime.now)
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.now)
     atualizado_em = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
 
+    # Colunas derivadas para a busca (preenchidas em _atualizar_campos_de_busca)
+    metragem_m2 = db.Column(db.Numeric(10, 2), nullable=True)
+    cep_digitos = db.Column(db.String(8), nullable=True)
+    texto_busca = db.Column(db.Text, nullable=True)
+
     # Relacionamento com a galeria de fotos
     fotos = db.relationship('ImovelFotos', back_populates='imovel', cascade="all, delete-orphan")
     criador = db.relationship('User')
@@ -374,21 +630,40 @@ class Imovel(db.Model):
             'observacoes': self.observacoes,
             'status': self.status,
             'foto_capa_url': f'/api/uploads/marketplace/{self.foto_capa}' if self.foto_capa else None,
+            'foto_capa_urls': rendition_urls('uploads/marketplace', self.foto_capa, self.foto_capa_renditions),
             'criado_por_nome': self.criador.nome if self.criador else "Sistema",
             'fotos': [f.to_dict() for f in self.fotos]
         }
 
+@event.listens_for(Imovel, 'before_insert')
+@event.listens_for(Imovel, 'before_update')
+def _atualizar_campos_de_busca(mapper, connection, target):
+    target.metragem_m2 = metragem_em_m2(target.metragem)
+    target.cep_digitos = so_digitos(target.cep, CEP_DIGITOS) or None
+    target.texto_busca = normalizar_texto(target.titulo, target.endereco, target.observacoes)
+
 class ImovelFotos(db.Model):
     __tablename__ = 'imovel_fotos'
+    __table_args__ = (
+        db.Index('ix_imovel_fotos_imovel_id', 'imovel_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     imovel_id = db.Column(db.Integer, db.ForeignKey('imoveis.id'), nullable=False)
     filename = db.Column(db.String(255), nullable=False)
     uploaded_at = db.Column(db.DateTime, default=datetime.now)
+    renditions = db.Column(db.String(10), nullable=True)
 
     imovel = db.relationship('Imovel', back_populates='fotos')
 
     def to_dict(self):
         return {
             'id': self.id,
-            'url': f'/api/uploads/marketplace/{self.filename}'
-        }
\ No newline at end of file
+            'url': f'/api/uploads/marketplace/{self.filename}',
+            'urls': rendition_urls('uploads/marketplace', self.filename, self.renditions)
+        }
+
+# Colunas em que images.py marca as versões reduzidas prontas de cada pasta de fotos
+registrar_fotos('uploads/profile_pics', User.foto_path, User.foto_renditions)
+registrar_fotos('uploads/checklist_pics', ChecklistAnexo.filename, ChecklistAnexo.renditions)
+registrar_fotos('uploads/marketplace', Imovel.foto_capa, Imovel.foto_capa_renditions)
+registrar_fotos('uploads/marketplace', ImovelFotos.filename, ImovelFotos.renditions)
@@ -0,0 +1,83 @@
+from flask import request
+from sqlalchemy import and_, or_
+from datetime import datetime
+import base64
+import json
+
+# --- Paginação por cursor (keyset) ---
+# O cursor é opaco para o cliente: JSON dos valores da última linha, em base64 url-safe.
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class CursorInvalidoError(ValueError):
+    pass
+
+
+def encode_cursor(*values):
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, *types):
+    """Decodifica o cursor convertendo cada valor para o tipo informado (datetime, int, str...)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        return tuple(
+            datetime.fromisoformat(v) if t is datetime else t(v)
+            for v, t in zip(values, types)
+        )
+    except (ValueError, TypeError):
+        raise CursorInvalidoError("Cursor inválido.")
+
+
+def parse_limit(default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    try:
+        limit = int(request.args.get('limit', default))
+    except (ValueError, TypeError):
+        limit = default
+    return max(1, min(limit, maximum))
+
+
+def keyset_after_desc(columns, values):
+    """
+    Condição "linha vem depois do cursor" para ORDER BY col1 DESC, col2 DESC, ...
+    Expandida em OR/AND para funcionar igual no SQLite e no PostgreSQL.
+    """
+    condicoes = []
+    for i, (col, val) in enumerate(zip(columns, values)):
+        anteriores = [c == v for c, v in zip(columns[:i], values[:i])]
+        condicoes.append(and_(*anteriores, col < val))
+    return or_(*condicoes)
+
+
+def keyset_after_asc(columns, values):
+    """
+    Condição "linha vem depois do cursor" para ORDER BY col1 ASC, col2 ASC, ...
+    O col1 >= extra deixa o índice (…, col1) limitar a faixa lida.
+    """
+    condicoes = []
+    for i, (col, val) in enumerate(zip(columns, values)):
+        anteriores = [c == v for c, v in zip(columns[:i], values[:i])]
+        condicoes.append(and_(*anteriores, col > val))
+    return and_(columns[0] >= values[0], or_(*condicoes))
+
+
+def paginate_keyset(query, columns, limit, cursor_values=None):
+    """
+    Aplica o cursor e o limite a uma query já ordenada por `columns` DESC.
+    Retorna (linhas, has_more). Busca limit + 1 linhas para saber se há próxima página.
+    """
+    if cursor_values is not None:
+        query = query.filter(keyset_after_desc(columns, cursor_values))
+    rows = query.limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
@@ -0,0 +1,75 @@
+from flask import current_app
+from .extensions import bcrypt
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import threading
+
+
+class VerificadorOcupadoError(Exception):
+    """Fila de verificação de senha cheia (muitos logins simultâneos)."""
+
+
+# --- Pool limitado para verificação bcrypt ---
+# O bcrypt libera o GIL enquanto calcula o hash, então rodar a verificação em
+# threads separadas deixa as outras threads do worker livres para atender
+# requisições. Isso só vale para workers com várias threads (gunicorn --threads /
+# gthread): num worker sync a requisição espera o future de qualquer jeito e o
+# pool só acrescenta a troca de thread; com gevent, as threads do pool viram
+# greenlets e o hash bloqueia o loop do mesmo jeito. Por isso o pool só é criado
+# com BCRYPT_VERIFY_POOL=true; desligado, a verificação roda direto na requisição.
+# O semáforo limita quantas verificações podem estar em execução ou na fila:
+# acima disso o login responde 503 em vez de acumular trabalho.
+_executor = None
+_executor_lock = threading.Lock()
+_slots = None
+
+
+def init_app(app):
+    global _executor, _slots
+    if not app.config.get('BCRYPT_VERIFY_POOL', False):
+        return
+    workers = app.config.get('BCRYPT_VERIFY_WORKERS', 4)
+    max_pendentes = app.config.get('BCRYPT_VERIFY_MAX_PENDING', 64)
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt-verify')
+            _slots = threading.BoundedSemaphore(max_pendentes)
+
+
+def _verificar(password_hash, password):
+    try:
+        return bcrypt.check_password_hash(password_hash, password)
+    finally:
+        _slots.release()
+
+
+def verify_password(user, password):
+    """
+    Verifica a senha do usuário direto na requisição, ou no pool de threads com BCRYPT_VERIFY_POOL=true.
+    Lança VerificadorOcupadoError se a fila estiver cheia ou a espera passar do timeout.
+    """
+    if _executor is None or not current_app.config.get('BCRYPT_VERIFY_POOL', False):
+        return bcrypt.check_password_hash(user.password_hash, password)
+    if not _slots.acquire(blocking=False):
+        raise VerificadorOcupadoError()
+    try:
+        future = _executor.submit(_verificar, user.password_hash, password)
+    except Exception:
+        _slots.release()
+        raise
+    try:
+        return future.result(timeout=current_app.config.get('BCRYPT_VERIFY_TIMEOUT', 10))
+    except FutureTimeoutError:
+        raise VerificadorOcupadoError()
+
+
+def hash_rounds(password_hash):
+    """Extrai o custo (log rounds) de um hash bcrypt ('$2b$12$...')."""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(password_hash):
+    """True se o hash foi gerado com um custo diferente do BCRYPT_LOG_ROUNDS atual."""
+    return hash_rounds(password_hash) != current_app.config.get('BCRYPT_LOG_ROUNDS', 12)
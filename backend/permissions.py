@@ -0,0 +1,237 @@
+from flask import request, jsonify, g, current_app
+from .models import User, Role, ObraFuncionarios
+from .extensions import db, jwt
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload, Session
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, get_jwt
+from collections import OrderedDict, namedtuple
+from functools import wraps
+import threading
+import time
+
+# Identidade mínima necessária para autorizar uma requisição.
+# `obras` é o conjunto de obra_ids do usuário quando veio do token (Prestador),
+# ou None quando precisa ser consultado no banco.
+Identity = namedtuple('Identity', ['id', 'role', 'version', 'obras'])
+
+
+# --- Cache de Identidade (TTL + LRU) ---
+class IdentityCache:
+    """
+    Cache em memória (por processo) de user_id -> Identity.
+    As entradas expiram após `ttl` segundos e as menos usadas são
+    descartadas quando o cache passa de `maxsize`.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._invalidacoes = 0
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is None:
+                return None
+            identity, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[user_id]
+                return None
+            self._data.move_to_end(user_id)
+            return identity
+
+    def geracao(self):
+        """Marca a ser passada para set(): leituras feitas antes de uma invalidação não entram."""
+        return self._invalidacoes
+
+    def set(self, user_id, identity, geracao=None):
+        with self._lock:
+            if geracao is not None and geracao != self._invalidacoes:
+                return
+            self._data[user_id] = (identity, time.monotonic() + self.ttl)
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._invalidacoes += 1
+            self._data.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._invalidacoes += 1
+            self._data.clear()
+
+
+identity_cache = IdentityCache()
+
+
+def init_app(app):
+    """Aplica as configurações do cache de identidade."""
+    identity_cache.maxsize = app.config.get('IDENTITY_CACHE_SIZE', 1024)
+    identity_cache.ttl = app.config.get('IDENTITY_CACHE_TTL', 60)
+
+
+def invalidate_identity(user_id):
+    """Remove o usuário do cache (ex: após mudança de cargo ou exclusão)."""
+    identity_cache.invalidate(int(user_id))
+
+
+_INVALIDAR_KEY = 'identidades_a_invalidar'
+
+
+def bump_token_version(user):
+    """
+    Invalida as claims dos tokens já emitidos para o usuário (cargo ou vínculos mudaram).
+    Deve ser chamado antes do commit da rota; o cache de identidade só é limpo depois
+    do commit, senão uma requisição no meio guardaria de novo o cargo antigo.
+    """
+    user.token_version = (user.token_version or 1) + 1
+    db.session.info.setdefault(_INVALIDAR_KEY, set()).add(int(user.id))
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_identidades_pendentes(session):
+    for user_id in session.info.pop(_INVALIDAR_KEY, ()):
+        identity_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_identidades_pendentes(session):
+    session.info.pop(_INVALIDAR_KEY, None)
+
+
+# --- Claims do JWT ---
+@jwt.user_identity_loader
+def user_identity_lookup(user):
+    if isinstance(user, User):
+        return str(user.id)
+    return str(user)
+
+
+@jwt.additional_claims_loader
+def add_claims_to_access_token(user):
+    """
+    Embute cargo, versão de permissões e (para Prestador) os vínculos de obra no token,
+    para que a autorização não precise consultar o banco a cada requisição.
+    """
+    if not isinstance(user, User):
+        return {}
+    role = user.role.name if user.role else None
+    claims = {'role': role, 'perm_v': user.token_version or 1}
+    if role not in ('Administrador', 'Gestor'):
+        obra_ids = [row[0] for row in db.session.query(ObraFuncionarios.obra_id).filter(
+            ObraFuncionarios.user_id == user.id
+        ).distinct().all()]
+        if len(obra_ids) <= current_app.config.get('JWT_MAX_OBRAS_CLAIM', 200):
+            claims['obras'] = sorted(obra_ids)
+    return claims
+
+
+# --- Carregamento do Usuário (uma vez por requisição) ---
+def get_current_identity():
+    """
+    Retorna a Identity (id, role, version, obras) do usuário do token.
+    Ordem: flask.g -> cache em memória -> uma única query (users JOIN roles).
+    Se a versão das claims do token bate com a versão atual, cargo e vínculos
+    vêm do próprio token. Retorna None se o usuário não existir mais.
+    """
+    user_id = int(get_jwt_identity())
+    if g.get('identity_user_id') == user_id:
+        return g.identity
+
+    identity = identity_cache.get(user_id)
+    if identity is None:
+        geracao = identity_cache.geracao()
+        row = db.session.query(User.id, Role.name, User.token_version).outerjoin(
+            Role, User.role_id == Role.id
+        ).filter(User.id == user_id).first()
+        if row:
+            identity = Identity(id=row[0], role=row[1], version=row[2], obras=None)
+            identity_cache.set(user_id, identity, geracao)
+
+    if identity is not None:
+        claims = get_jwt()
+        if claims.get('perm_v') == identity.version and 'role' in claims:
+            obras = claims.get('obras')
+            identity = identity._replace(
+                role=claims['role'],
+                obras=frozenset(obras) if obras is not None else None
+            )
+
+    g.identity_user_id = user_id
+    g.identity = identity
+    return identity
+
+
+def get_current_user():
+    """
+    Retorna o objeto User completo do token (com o cargo já carregado).
+    A query é feita no máximo uma vez por requisição.
+    """
+    user_id = int(get_jwt_identity())
+    user = g.get('current_user')
+    if user is not None and user.id == user_id:
+        return user
+    user = User.query.options(joinedload(User.role)).filter_by(id=user_id).first()
+    g.current_user = user
+    return user
+
+
+def get_current_role(default='Prestador'):
+    identity = get_current_identity()
+    if identity is None or identity.role is None:
+        return default
+    return identity.role
+
+
+def usuario_vinculado_a_obra(obra_id):
+    """Verifica se o usuário do token está vinculado à obra (claims do token ou banco)."""
+    identity = get_current_identity()
+    if identity is None:
+        return False
+    if identity.obras is not None:
+        return obra_id in identity.obras
+    vinculo = ObraFuncionarios.query.filter_by(obra_id=obra_id, user_id=identity.id).first()
+    return vinculo is not None
+
+
+# --- Decorators de Permissão ---
+def roles_required(*roles, error_message=None):
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            # Ignora o token check para requisições OPTIONS
+            if request.method == 'OPTIONS':
+                return fn(*args, **kwargs)
+            try:
+                verify_jwt_in_request()
+            except Exception as e:
+                return jsonify({"error": f"Token inválido ou ausente: {str(e)}"}), 401
+
+            identity = get_current_identity()
+            if identity is None:
+                return jsonify({"error": "Usuário do token não encontrado."}), 404
+
+            if identity.role in roles:
+                return fn(*args, **kwargs)
+            return jsonify({"error": error_message or "Acesso negado."}), 403
+        return decorator
+    return wrapper
+
+
+def gestor_ou_admin_required():
+    return roles_required(
+        'Administrador', 'Gestor',
+        error_message="Acesso negado: Requer permissão de Gestor ou Administrador."
+    )
+
+
+def admin_required():
+    return roles_required(
+        'Administrador',
+        error_message="Acesso negado: Requer permissão de Administrador."
+    )
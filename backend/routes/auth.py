@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from ..models import User
 from ..extensions import db, bcrypt
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from ..passwords import verify_password, needs_rehash, VerificadorOcupadoError
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -18,11 +19,25 @@ def login():
     password = data.get('password')
     user = User.query.filter_by(username=username).first()
 
-    if not user or not user.check_password(password):
+    try:
+        senha_ok = user is not None and verify_password(user, password)
+    except VerificadorOcupadoError:
+        return jsonify({"error": "Servidor ocupado, tente novamente em instantes."}), 503, {'Retry-After': '2'}
+
+    if not senha_ok:
         return jsonify({"error": "Credenciais inválidas"}), 401 
 
+    # Regera o hash se o custo configurado (BCRYPT_LOG_ROUNDS) mudou
+    if needs_rehash(user.password_hash):
+        try:
+            user.set_password(password)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Aviso: Não foi possível regerar o hash da senha do user {user.id}: {e}")
+
     try:
-        access_token = create_access_token(identity=str(user.id))
+        access_token = create_access_token(identity=user)
         user_data = user.to_dict()
     except Exception as e:
         print(f"Erro ao serializar usuário ou criar token (auth.py): {e}")
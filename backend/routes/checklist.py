@@ -1,28 +1,18 @@
 from flask import Blueprint, jsonify, request, current_app
-from ..models import Obras, ChecklistItem, AuditLog, User, ChecklistAnexo
+from ..models import Obras, ChecklistItem, User, ChecklistAnexo
 from ..extensions import db
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy import insert, update
+from collections import defaultdict
 from datetime import datetime, date
 import os
 from werkzeug.utils import secure_filename
 import shutil
 # --- NOVO: Importa as funções de segurança ---
 from flask_jwt_extended import jwt_required, get_jwt_identity
-
-# --- Helper para Log de Auditoria ---
-def log_audit(user_id, action_type, resource_type, resource_id, details=None):
-    """Cria uma entrada no log de auditoria."""
-    try:
-        log_entry = AuditLog(
-            user_id=user_id, ### <-- Agora receberá o ID correto
-            action_type=action_type,
-            resource_type=resource_type,
-            resource_id=resource_id,
-            details=details
-        )
-        db.session.add(log_entry)
-        # O commit será feito pela rota principal
-    except Exception as e:
-        print(f"ERRO CRÍTICO ao tentar criar log de auditoria: {e}")
+from ..audit import log_audit
+from ..images import agendar_renditions, remover_renditions
+from ..cache import etag_por_versao, versao_da_obra
 
 # --- Constantes para Upload de Anexos ---
 CHECKLIST_UPLOAD_FOLDER = 'uploads/checklist_pics'
@@ -38,6 +28,8 @@ checklist_bp = Blueprint('checklist', __name__)
 # --- Rota GET /api/obras/<obra_id>/checklist/ ---
 @checklist_bp.route('/obras/<int:obra_id>/checklist/', methods=['GET', 'OPTIONS'])
 @jwt_required() ### <-- NOVO: Rota protegida
+# status_display ("Atrasado") depende do dia, então a data entra na versão
+@etag_por_versao(lambda obra_id: versao_da_obra(ChecklistItem, obra_id) + (date.today(),))
 def get_checklist_obra(obra_id):
     """Busca todos os itens de checklist de uma obra específica."""
     if request.method == 'OPTIONS':
@@ -47,7 +39,10 @@ def get_checklist_obra(obra_id):
 
     try:
         obra = Obras.query.get_or_404(obra_id)
-        itens = ChecklistItem.query.filter_by(obra_id=obra_id).order_by(ChecklistItem.status.asc(), ChecklistItem.data_cadastro.desc()).all()
+        itens = ChecklistItem.query.options(
+            joinedload(ChecklistItem.responsavel),
+            selectinload(ChecklistItem.anexos)
+        ).filter_by(obra_id=obra_id).order_by(ChecklistItem.status.asc(), ChecklistItem.data_cadastro.desc()).all()
         return jsonify([item.to_dict() for item in itens]), 200
     except Exception as e:
         print(f"Erro ao buscar checklist da obra {obra_id}: {e}")
@@ -134,9 +129,14 @@ def update_item_checklist(item_id):
     
     try:
         alteracoes = {}
-        estado_anterior = item.to_dict() 
-        estado_anterior.pop('status_display', None) 
-        estado_anterior.pop('anexos', None) 
+        # Só os campos editáveis (sem to_dict, que carregaria os anexos)
+        estado_anterior = {
+            'status': item.status,
+            'titulo': item.titulo,
+            'descricao': item.descricao,
+            'prazo': item.prazo.isoformat() if item.prazo else None,
+            'responsavel_user_id': item.responsavel_user_id,
+        }
 
         # Atualiza Status
         if 'status' in data:
@@ -200,6 +200,193 @@ def update_item_checklist(item_id):
         print(f"Erro ao atualizar item de checklist {item_id}: {e}")
         return jsonify({"error": "Erro interno ao atualizar o item."}), 500
 
+# --- Operações em lote ---
+MAX_ITENS_LOTE = 500
+
+def _valor_json(valor):
+    return valor.isoformat() if isinstance(valor, (date, datetime)) else valor
+
+def _ler_lista_itens(data):
+    """Aceita {"itens": [...]} ou a lista direto no corpo."""
+    itens = data.get('itens') if isinstance(data, dict) else data
+    if not isinstance(itens, list) or not itens:
+        return None, (jsonify({"error": "Envie uma lista de itens em 'itens'."}), 400)
+    if len(itens) > MAX_ITENS_LOTE:
+        return None, (jsonify({"error": f"Máximo de {MAX_ITENS_LOTE} itens por requisição."}), 400)
+    return itens, None
+
+def _ler_prazo(valor):
+    try:
+        return date.fromisoformat(valor) if valor else None
+    except (ValueError, TypeError):
+        raise ValueError("Formato de data inválido para o prazo (use YYYY-MM-DD).")
+
+def _ler_responsavel(valor):
+    try:
+        return int(valor) if valor else None
+    except (ValueError, TypeError):
+        raise ValueError("'responsavel_user_id' inválido.")
+
+def _ler_patch_checklist(patch):
+    """Valida um patch {id, status?, prazo?, responsavel_user_id?} e devolve (id, valores)."""
+    if not isinstance(patch, dict) or 'id' not in patch:
+        raise ValueError("Cada item precisa de 'id'.")
+    try:
+        item_id = int(patch['id'])
+    except (ValueError, TypeError):
+        raise ValueError("'id' inválido.")
+    valores = {}
+    if 'status' in patch:
+        if patch['status'] not in ('pendente', 'feito'):
+            raise ValueError("Status inválido (deve ser 'pendente' ou 'feito').")
+        valores['status'] = patch['status']
+    if 'prazo' in patch:
+        valores['prazo'] = _ler_prazo(patch['prazo'])
+    if 'responsavel_user_id' in patch:
+        valores['responsavel_user_id'] = _ler_responsavel(patch['responsavel_user_id'])
+    return item_id, valores
+
+# --- Rota PATCH /api/checklist/lote/ ---
+@checklist_bp.route('/checklist/lote/', methods=['PATCH', 'OPTIONS'])
+@jwt_required()
+def update_itens_checklist_lote():
+    """
+    Aplica vários patches {id, status, prazo, responsavel_user_id} numa única transação.
+    Itens com as mesmas alterações recebem um único UPDATE ... WHERE id IN (...).
+    Retorna apenas os campos alterados de cada item.
+    """
+    if request.method == 'OPTIONS':
+        return jsonify({'message': 'Preflight OK'}), 200
+
+    current_user_id = get_jwt_identity()
+    patches, erro = _ler_lista_itens(request.get_json(silent=True))
+    if erro:
+        return erro
+
+    valores_por_id = {}
+    erros = []
+    for indice, patch in enumerate(patches):
+        try:
+            item_id, valores = _ler_patch_checklist(patch)
+        except ValueError as e:
+            erros.append({'indice': indice, 'erro': str(e)})
+            continue
+        valores_por_id.setdefault(item_id, {}).update(valores)
+    if erros:
+        return jsonify({"error": "Itens inválidos.", "erros": erros}), 400
+
+    try:
+        atuais = {
+            row.id: row for row in db.session.query(
+                ChecklistItem.id, ChecklistItem.status, ChecklistItem.prazo, ChecklistItem.responsavel_user_id
+            ).filter(ChecklistItem.id.in_(valores_por_id))
+        }
+        faltando = sorted(set(valores_por_id) - set(atuais))
+        if faltando:
+            return jsonify({"error": "Itens de checklist não encontrados.", "ids": faltando}), 404
+
+        agora = datetime.now()
+        grupos = defaultdict(list)
+        atualizados = []
+        for item_id, valores in valores_por_id.items():
+            atual = atuais[item_id]
+            mudancas = {k: v for k, v in valores.items() if getattr(atual, k) != v}
+            if not mudancas:
+                continue
+            grupos[tuple(sorted(mudancas.items()))].append(item_id)
+            depois = {k: _valor_json(v) for k, v in mudancas.items()}
+            log_audit(
+                current_user_id,
+                'update',
+                'ChecklistItem',
+                item_id,
+                {'antes': {k: _valor_json(getattr(atual, k)) for k in mudancas}, 'depois': depois}
+            )
+            if 'status' in mudancas:
+                depois['data_conclusao'] = agora.isoformat() if mudancas['status'] == 'feito' else None
+            atualizados.append({'id': item_id, **depois})
+
+        for chave, ids in grupos.items():
+            valores = dict(chave)
+            if 'status' in valores:
+                valores['data_conclusao'] = agora if valores['status'] == 'feito' else None
+            db.session.execute(
+                update(ChecklistItem).where(ChecklistItem.id.in_(ids)).values(**valores),
+                execution_options={'synchronize_session': False}
+            )
+
+        db.session.commit()
+        return jsonify({'atualizados': atualizados}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao atualizar itens de checklist em lote: {e}")
+        return jsonify({"error": "Erro interno ao atualizar os itens."}), 500
+
+# --- Rota POST /api/obras/<obra_id>/checklist/lote/ ---
+@checklist_bp.route('/obras/<int:obra_id>/checklist/lote/', methods=['POST', 'OPTIONS'])
+@jwt_required()
+def add_itens_checklist_lote(obra_id):
+    """Cria vários itens de uma vez (ex: aplicar um modelo de checklist a uma obra nova)."""
+    if request.method == 'OPTIONS':
+        return jsonify({'message': 'Preflight OK'}), 200
+
+    current_user_id = get_jwt_identity()
+    Obras.query.get_or_404(obra_id)
+    itens, erro = _ler_lista_itens(request.get_json(silent=True))
+    if erro:
+        return erro
+
+    agora = datetime.now()
+    linhas = []
+    erros = []
+    for indice, item in enumerate(itens):
+        try:
+            if not isinstance(item, dict) or not item.get('titulo'):
+                raise ValueError("O Título é obrigatório.")
+            linhas.append({
+                'obra_id': obra_id,
+                'titulo': item['titulo'],
+                'descricao': item.get('descricao'),
+                'responsavel_user_id': _ler_responsavel(item.get('responsavel_user_id')),
+                'status': 'pendente',
+                'prazo': _ler_prazo(item.get('prazo')),
+                'data_cadastro': agora,
+            })
+        except ValueError as e:
+            erros.append({'indice': indice, 'erro': str(e)})
+    if erros:
+        return jsonify({"error": "Itens inválidos.", "erros": erros}), 400
+
+    try:
+        ids = db.session.execute(
+            insert(ChecklistItem).returning(ChecklistItem.id, sort_by_parameter_order=True),
+            linhas
+        ).scalars().all()
+        log_audit(
+            current_user_id,
+            'create',
+            'ChecklistItem',
+            None,
+            {'obra_id': obra_id, 'quantidade': len(ids), 'ids': ids}
+        )
+        db.session.commit()
+        return jsonify({
+            'criados': len(ids),
+            'itens': [{
+                'id': item_id,
+                'titulo': linha['titulo'],
+                'responsavel_user_id': linha['responsavel_user_id'],
+                'status': linha['status'],
+                'prazo': _valor_json(linha['prazo']),
+            } for item_id, linha in zip(ids, linhas)]
+        }), 201
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao criar itens de checklist em lote na obra {obra_id}: {e}")
+        return jsonify({"error": "Erro interno ao salvar os itens."}), 500
+
 # --- Rota DELETE /api/checklist/<item_id>/ ---
 @checklist_bp.route('/checklist/<int:item_id>/', methods=['DELETE', 'OPTIONS'])
 @jwt_required() ### <-- NOVO: Rota protegida
@@ -237,6 +424,7 @@ def delete_item_checklist(item_id):
                 file_path = os.path.join(upload_path_full, filename)
                 if os.path.exists(file_path):
                     os.remove(file_path)
+                remover_renditions(CHECKLIST_UPLOAD_FOLDER, filename)
             except Exception as file_e:
                 print(f"Aviso: Não foi possível remover o ficheiro de anexo {filename}: {file_e}")
 
@@ -298,6 +486,7 @@ def adicionar_anexo_checklist(item_id):
             )
             
             db.session.commit()
+            agendar_renditions(CHECKLIST_UPLOAD_FOLDER, filename)
             
             return jsonify(novo_anexo.to_dict()), 201
 
@@ -342,6 +531,7 @@ def remover_anexo_checklist(anexo_id):
             file_path = os.path.join(current_app.instance_path, CHECKLIST_UPLOAD_FOLDER, filename)
             if os.path.exists(file_path):
                 os.remove(file_path)
+            remover_renditions(CHECKLIST_UPLOAD_FOLDER, filename)
         except Exception as file_e:
             print(f"Aviso: Não foi possível remover o ficheiro de anexo {filename}: {file_e}")
 
@@ -1,46 +1,43 @@
 import os
 from flask import Blueprint, jsonify, request, current_app, send_from_directory
-from ..models import Obras, Documentos, AuditLog, User
+from ..models import Obras, Documentos, User, UploadSessao
 from ..extensions import db
+from sqlalchemy.orm import joinedload
 from datetime import datetime
-from werkzeug.utils import secure_filename
+from sqlalchemy import update
 import uuid
+from werkzeug.utils import secure_filename
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from ..audit import log_audit
+from ..cache import etag_por_versao, versao_da_obra
+from ..storage import (
+    DOCUMENTOS_UPLOAD_FOLDER, SHA256_RE, gravar_temporario, descartar_temporario,
+    adicionar_referencia, publicar_blob, blob_disponivel, blob_path,
+    staging_path, anexar_parte, hash_arquivo, ParteInvalidaError
+)
 
 # --- Constantes ---
-DOCUMENTOS_UPLOAD_FOLDER = 'uploads/documentos_obra' 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'doc', 'docx', 'xls', 'xlsx', 'dwg', 'dxf'}
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# --- Helper para Log de Auditoria ---
-def log_audit(user_id, action_type, resource_type, resource_id, details=None):
-    try:
-        log_entry = AuditLog(
-            user_id=user_id,
-            action_type=action_type,
-            resource_type=resource_type,
-            resource_id=resource_id,
-            details=details
-        )
-        db.session.add(log_entry)
-    except Exception as e:
-        print(f"ERRO CRÍTICO ao tentar criar log de auditoria: {e}")
-
 # Cria o Blueprint
 documentos_bp = Blueprint('documentos', __name__)
 
-# --- Rota GET (Sem alterações) ---
+# --- Rota GET ---
 @documentos_bp.route('/obras/<int:obra_id>/documentos/', methods=['GET', 'OPTIONS'])
 @jwt_required()
+@etag_por_versao(lambda obra_id: versao_da_obra(Documentos, obra_id))
 def get_documentos_obra(obra_id):
     if request.method == 'OPTIONS':
         return jsonify({'message': 'Preflight OK'}), 200
     try:
         obra = Obras.query.get_or_404(obra_id)
-        documentos = Documentos.query.filter_by(obra_id=obra_id).order_by(Documentos.uploaded_at.desc()).all()
+        documentos = Documentos.query.options(
+            joinedload(Documentos.uploader)
+        ).filter_by(obra_id=obra_id).order_by(Documentos.uploaded_at.desc()).all()
         return jsonify([doc.to_dict() for doc in documentos]), 200
     except Exception as e:
         print(f"Erro ao buscar documentos da obra {obra_id}: {e}")
@@ -69,63 +66,262 @@ def upload_documento_obra(obra_id):
     if not allowed_file(file.filename):
         return jsonify({"error": "Tipo de ficheiro não permitido."}), 400
     
+    original_filename = secure_filename(file.filename)
+    split_filename = original_filename.rsplit('.', 1)
+    extensao = split_filename[1].lower() if len(split_filename) == 2 else ''
+    # Usa a extensão como 'tipo' se o 'tipo' não for enviado pelo form
+    tipo_documento = request.form.get('tipo', extensao)
+
     try:
-        original_filename = secure_filename(file.filename)
-        
-        # --- INÍCIO DA CORREÇÃO ---
-        # Corrige o erro 'list index out of range'
-        split_filename = original_filename.rsplit('.', 1)
-        
-        # split_filename será ['nome', 'ext'] ou apenas ['nome']
-        if len(split_filename) == 2:
-            extensao = split_filename[1].lower()
-            unique_filename = f"{uuid.uuid4()}.{extensao}"
-        else:
-            # Caso o arquivo não tenha extensão (ex: 'meuarquivo')
-            extensao = '' # Sem extensão
-            unique_filename = str(uuid.uuid4())
-        
-        # Usa a extensão como 'tipo' se o 'tipo' não for enviado pelo form
-        tipo_documento = request.form.get('tipo', extensao)
-        # --- FIM DA CORREÇÃO ---
-        
-        upload_path_full = os.path.join(current_app.instance_path, DOCUMENTOS_UPLOAD_FOLDER)
-        os.makedirs(upload_path_full, exist_ok=True) 
-        
-        save_path = os.path.join(upload_path_full, unique_filename)
-        file.save(save_path)
+        temporario, sha256, tamanho = gravar_temporario(file.stream)
+    except Exception as e:
+        print(f"Erro ao gravar upload de documento para obra {obra_id}: {e}")
+        return jsonify({"error": "Erro interno ao salvar o documento."}), 500
+
+    try:
+        novo_documento = _criar_documento(
+            obra_id, current_user_id, original_filename, tipo_documento,
+            request.form.get('visibilidade', 'todos'), sha256, tamanho
+        )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        descartar_temporario(temporario)
+        print(f"Erro ao salvar documento para obra {obra_id}: {e}")
+        return jsonify({"error": "Erro interno ao salvar o documento."}), 500
+
+    publicar_blob(temporario, sha256)
+    return jsonify(novo_documento.to_dict()), 201
+
+def _criar_documento(obra_id, user_id, filename, tipo, visibilidade, sha256, tamanho):
+    """Cria o Documentos apontando para o blob (incrementa a referência) e registra o log."""
+    adicionar_referencia(sha256, tamanho)
+    novo_documento = Documentos(
+        obra_id=obra_id,
+        filename=filename,
+        filepath=sha256,
+        blob_sha256=sha256,
+        tipo=tipo,
+        visibilidade=visibilidade,
+        uploaded_by=user_id
+    )
+    db.session.add(novo_documento)
+    db.session.flush()
+    log_audit(
+        user_id,
+        'upload_documento',
+        'Documentos',
+        novo_documento.id,
+        {'obra_id': obra_id, 'filename': filename, 'sha256': sha256}
+    )
+    return novo_documento
 
-        novo_documento = Documentos(
+# --- Rota POST por hash (envio sem o arquivo, se o conteúdo já existe) ---
+@documentos_bp.route('/obras/<int:obra_id>/documentos/por-hash/', methods=['POST', 'OPTIONS'])
+@jwt_required()
+def upload_documento_por_hash(obra_id):
+    """
+    Recebe {sha256, filename, tipo?, visibilidade?}. Se o conteúdo já está armazenado,
+    cria o documento sem transferir o arquivo (201); senão responde 404 com
+    "upload_necessario": true e o cliente faz o upload normal.
+    """
+    if request.method == 'OPTIONS':
+        return jsonify({'message': 'Preflight OK'}), 200
+
+    current_user_id = get_jwt_identity()
+    Obras.query.get_or_404(obra_id)
+    data = request.get_json(silent=True) or {}
+    sha256 = str(data.get('sha256', '')).lower()
+    original_filename = secure_filename(data.get('filename') or '')
+    if not SHA256_RE.match(sha256):
+        return jsonify({"error": "sha256 inválido."}), 400
+    if not original_filename or not allowed_file(original_filename):
+        return jsonify({"error": "Tipo de ficheiro não permitido."}), 400
+
+    try:
+        blob = blob_disponivel(sha256)
+        if blob is None:
+            return jsonify({"error": "Conteúdo não encontrado.", "upload_necessario": True}), 404
+        novo_documento = _criar_documento(
+            obra_id, current_user_id, original_filename,
+            data.get('tipo', original_filename.rsplit('.', 1)[1].lower()),
+            data.get('visibilidade', 'todos'), sha256, blob.tamanho
+        )
+        db.session.commit()
+        if not os.path.exists(blob_path(sha256)):
+            # O último documento com este conteúdo foi removido durante a requisição
+            db.session.delete(novo_documento)
+            db.session.commit()
+            return jsonify({"error": "Conteúdo não encontrado.", "upload_necessario": True}), 404
+        return jsonify(novo_documento.to_dict()), 201
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao registrar documento por hash para obra {obra_id}: {e}")
+        return jsonify({"error": "Erro interno ao salvar o documento."}), 500
+
+# --- Upload retomável em partes ---
+# POST .../uploads/ abre a sessão; PUT envia cada parte com o header Upload-Offset
+# (ou ?offset=) igual ao offset confirmado; GET devolve o offset para retomar;
+# POST .../concluir/ confere tamanho e hash e cria o documento.
+
+def _sessao_do_usuario(sessao_id):
+    sessao = UploadSessao.query.get_or_404(sessao_id)
+    if str(sessao.user_id) != str(get_jwt_identity()):
+        return None, (jsonify({"error": "Acesso negado a esta sessão de upload."}), 403)
+    return sessao, None
+
+@documentos_bp.route('/obras/<int:obra_id>/documentos/uploads/', methods=['POST', 'OPTIONS'])
+@jwt_required()
+def iniciar_upload_documento(obra_id):
+    """Abre uma sessão de upload: {filename, tamanho, sha256?, tipo?, visibilidade?}."""
+    if request.method == 'OPTIONS':
+        return jsonify({'message': 'Preflight OK'}), 200
+
+    current_user_id = get_jwt_identity()
+    Obras.query.get_or_404(obra_id)
+    data = request.get_json(silent=True) or {}
+    original_filename = secure_filename(data.get('filename') or '')
+    if not original_filename or not allowed_file(original_filename):
+        return jsonify({"error": "Tipo de ficheiro não permitido."}), 400
+    try:
+        tamanho = int(data.get('tamanho'))
+    except (ValueError, TypeError):
+        return jsonify({"error": "Tamanho do arquivo inválido."}), 400
+    tamanho_maximo = current_app.config.get('DOCUMENT_MAX_SIZE')
+    if tamanho <= 0 or (tamanho_maximo and tamanho > tamanho_maximo):
+        return jsonify({"error": f"O arquivo deve ter entre 1 e {tamanho_maximo} bytes."}), 400
+    sha256 = (data.get('sha256') or '').lower() or None
+    if sha256 and not SHA256_RE.match(sha256):
+        return jsonify({"error": "sha256 inválido."}), 400
+
+    try:
+        sessao = UploadSessao(
+            id=uuid.uuid4().hex,
             obra_id=obra_id,
+            user_id=current_user_id,
             filename=original_filename,
-            filepath=unique_filename,
-            tipo=tipo_documento, # <-- Usa a variável corrigida
-            visibilidade=request.form.get('visibilidade', 'todos'),
-            uploaded_by=current_user_id
+            tipo=data.get('tipo', original_filename.rsplit('.', 1)[1].lower()),
+            visibilidade=data.get('visibilidade', 'todos'),
+            tamanho_total=tamanho,
+            sha256_esperado=sha256,
+            offset=0
         )
-        db.session.add(novo_documento)
-        
-        db.session.flush()
-        
-        log_audit(
-            current_user_id,
-            'upload_documento',
-            'Documentos',
-            novo_documento.id,
-            {'obra_id': obra_id, 'filename': original_filename}
+        db.session.add(sessao)
+        db.session.commit()
+        return jsonify({**sessao.to_dict(), 'parte_maxima': current_app.config.get('DOCUMENT_UPLOAD_CHUNK_MAX')}), 201
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao iniciar upload de documento para obra {obra_id}: {e}")
+        return jsonify({"error": "Erro interno ao iniciar o upload."}), 500
+
+@documentos_bp.route('/documentos/uploads/<sessao_id>/', methods=['GET', 'PUT', 'DELETE', 'OPTIONS'])
+@jwt_required()
+def sessao_upload_documento(sessao_id):
+    if request.method == 'OPTIONS':
+        return jsonify({'message': 'Preflight OK'}), 200
+
+    sessao, erro = _sessao_do_usuario(sessao_id)
+    if erro:
+        return erro
+
+    # --- GET: offset confirmado (para retomar) ---
+    if request.method == 'GET':
+        return jsonify(sessao.to_dict()), 200
+
+    # --- DELETE: cancela a sessão ---
+    if request.method == 'DELETE':
+        try:
+            db.session.delete(sessao)
+            db.session.commit()
+            descartar_temporario(staging_path(sessao_id))
+            return '', 204
+        except Exception as e:
+            db.session.rollback()
+            print(f"Erro ao cancelar upload {sessao_id}: {e}")
+            return jsonify({"error": "Erro interno ao cancelar o upload."}), 500
+
+    # --- PUT: grava uma parte ---
+    try:
+        offset = int(request.headers.get('Upload-Offset', request.args.get('offset')))
+    except (ValueError, TypeError):
+        return jsonify({"error": "Informe o offset da parte (header Upload-Offset)."}), 400
+    if offset != sessao.offset:
+        return jsonify({"error": "Offset diferente do último confirmado.", "offset": sessao.offset}), 409
+    parte_maxima = current_app.config.get('DOCUMENT_UPLOAD_CHUNK_MAX')
+    if parte_maxima and (request.content_length or 0) > parte_maxima:
+        return jsonify({"error": f"Cada parte pode ter no máximo {parte_maxima} bytes."}), 413
+
+    try:
+        gravados = anexar_parte(
+            staging_path(sessao_id), offset, request.stream, sessao.tamanho_total - offset
         )
-        
+    except ParteInvalidaError as e:
+        return jsonify({"error": str(e), "offset": sessao.offset}), 400
+    except Exception as e:
+        # Conexão interrompida: a parte incompleta é descartada no próximo PUT
+        print(f"Aviso: parte do upload {sessao_id} interrompida no offset {offset}: {e}")
+        return jsonify({"error": "Parte incompleta; reenvie a partir do offset confirmado.", "offset": sessao.offset}), 400
+
+    try:
+        # Só confirma se ninguém confirmou outra parte no meio-tempo
+        confirmado = db.session.execute(
+            update(UploadSessao)
+            .where(UploadSessao.id == sessao_id, UploadSessao.offset == offset)
+            .values(offset=offset + gravados, atualizado_em=datetime.now()),
+            execution_options={'synchronize_session': False}
+        ).rowcount
         db.session.commit()
-        
-        return jsonify(novo_documento.to_dict()), 201
+        if not confirmado:
+            db.session.refresh(sessao)
+            return jsonify({"error": "Offset diferente do último confirmado.", "offset": sessao.offset}), 409
+        return jsonify({'offset': offset + gravados, 'tamanho_total': sessao.tamanho_total}), 200
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao confirmar parte do upload {sessao_id}: {e}")
+        return jsonify({"error": "Erro interno ao gravar a parte."}), 500
 
+@documentos_bp.route('/documentos/uploads/<sessao_id>/concluir/', methods=['POST', 'OPTIONS'])
+@jwt_required()
+def concluir_upload_documento(sessao_id):
+    """Confere tamanho e SHA-256 do arquivo montado e cria o documento."""
+    if request.method == 'OPTIONS':
+        return jsonify({'message': 'Preflight OK'}), 200
+
+    current_user_id = get_jwt_identity()
+    sessao, erro = _sessao_do_usuario(sessao_id)
+    if erro:
+        return erro
+    caminho = staging_path(sessao_id)
+    if sessao.offset != sessao.tamanho_total or not os.path.exists(caminho) \
+            or os.path.getsize(caminho) < sessao.tamanho_total:
+        return jsonify({"error": "Upload incompleto.", "offset": sessao.offset}), 409
+
+    try:
+        # Uma parte interrompida depois da última confirmação pode ter deixado bytes a mais
+        with open(caminho, 'r+b') as arquivo:
+            arquivo.truncate(sessao.tamanho_total)
+        sha256 = hash_arquivo(caminho)
+        if sessao.sha256_esperado and sha256 != sessao.sha256_esperado:
+            db.session.delete(sessao)
+            db.session.commit()
+            descartar_temporario(caminho)
+            return jsonify({"error": "O SHA-256 do arquivo recebido não confere; envie novamente."}), 422
+
+        novo_documento = _criar_documento(
+            sessao.obra_id, current_user_id, sessao.filename, sessao.tipo,
+            sessao.visibilidade, sha256, sessao.tamanho_total
+        )
+        db.session.delete(sessao)
+        db.session.commit()
     except Exception as e:
         db.session.rollback()
-        # Esta é a linha que você viu no seu log
-        print(f"Erro ao salvar documento para obra {obra_id}: {e}")
-        return jsonify({"error": "Erro interno ao salvar o documento."}), 500
+        print(f"Erro ao concluir upload {sessao_id}: {e}")
+        return jsonify({"error": "Erro interno ao concluir o upload."}), 500
 
-# --- Rota DELETE (Sem alterações) ---
+    publicar_blob(caminho, sha256)
+    return jsonify(novo_documento.to_dict()), 201
+
+# --- Rota DELETE ---
 @documentos_bp.route('/documentos/<int:documento_id>/', methods=['DELETE', 'OPTIONS'])
 @jwt_required() 
 def delete_documento(documento_id):
@@ -148,15 +344,18 @@ def delete_documento(documento_id):
             {'obra_id': obra_id, 'filename': original_filename}
         )
 
+        legado = doc.blob_sha256 is None
+        # Com blob, a referência é liberada no after_delete e o arquivo só sai com a última
         db.session.delete(doc)
         db.session.commit()
 
-        try:
-            file_path = os.path.join(current_app.instance_path, DOCUMENTOS_UPLOAD_FOLDER, filename)
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except Exception as file_e:
-            print(f"Aviso: Não foi possível remover o ficheiro {filename}: {file_e}")
+        if legado:
+            try:
+                file_path = os.path.join(current_app.instance_path, DOCUMENTOS_UPLOAD_FOLDER, filename)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            except Exception as file_e:
+                print(f"Aviso: Não foi possível remover o ficheiro {filename}: {file_e}")
 
         return '', 204
 
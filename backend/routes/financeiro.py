@@ -1,71 +1,90 @@
 from flask import Blueprint, jsonify, request
-from ..models import Obras, FinanceiroTransacoes, User, AuditLog
+from ..models import Obras, FinanceiroTransacoes, User
 from ..extensions import db
+from ..cashflow import registrar_transacao, aplicar_no_rollup, agrupar_transacoes
+from ..serializers import TRANSACAO, query_transacoes
+from sqlalchemy import update, insert
+from sqlalchemy.sql import func
 from datetime import datetime
-from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
-from functools import wraps
-
-# --- Decorator de Permissão (Sem alterações) ---
-def gestor_ou_admin_required():
-    def wrapper(fn):
-        @wraps(fn)
-        def decorator(*args, **kwargs):
-            if request.method == 'OPTIONS':
-                return fn(*args, **kwargs)
-            try:
-                verify_jwt_in_request()
-            except Exception as e:
-                 return jsonify({"error": f"Token inválido ou ausente: {str(e)}"}), 401
-                 
-            current_user_id = get_jwt_identity()
-            user = User.query.get(current_user_id)
-            if not user:
-                 return jsonify({"error": "Usuário do token não encontrado."}), 404
-            role = user.role.name if user.role else None
-            if role == 'Administrador' or role == 'Gestor':
-                kwargs['current_user'] = user
-                return fn(*args, **kwargs) 
-            else:
-                return jsonify({"error": "Acesso negado: Requer permissão de Gestor ou Administrador."}), 403
-        return decorator
-    return wrapper
-
-# --- Helper para Log de Auditoria (Sem alterações) ---
-def log_audit(user_id, action_type, resource_type, resource_id, details=None):
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+import csv
+import io
+import json
+import re
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from ..permissions import gestor_ou_admin_required
+from ..cache import bump_data_version, etag_por_versao, versao_da_obra
+from ..audit import log_audit
+
+# --- Helpers de valores e orçamento ---
+CENTAVOS = Decimal('0.01')
+# valor é Numeric(10, 2): no PostgreSQL, 10^8 ou mais estoura a coluna
+VALOR_MAXIMO = Decimal('100000000')
+# Ponto decimal ("1234.56") ou formato brasileiro ("1.234,56" / "1234,56")
+_VALOR_PONTO = re.compile(r'^-?(\d+(\.\d*)?|\.\d+)$')
+_VALOR_VIRGULA = re.compile(r'^-?(\d{1,3}(\.\d{3})*|\d+),\d+$')
+
+def parse_valor(raw):
+    """
+    Converte o valor recebido para Decimal com 2 casas. Lança ValueError se inválido.
+    Aceita também o formato brasileiro ("1.234,56"); separadores misturados em outra
+    ordem ("1,234.56") são rejeitados em vez de adivinhados.
+    """
+    texto = str(raw).strip()
+    if _VALOR_VIRGULA.match(texto):
+        texto = texto.replace('.', '').replace(',', '.')
+    elif not _VALOR_PONTO.match(texto):
+        raise ValueError("Formato de valor inválido.")
     try:
-        log_entry = AuditLog(
-            user_id=user_id, 
-            action_type=action_type,
-            resource_type=resource_type,
-            resource_id=resource_id,
-            details=details
-        )
-        db.session.add(log_entry)
-    except Exception as e:
-        print(f"ERRO CRÍTICO ao tentar criar log de auditoria: {e}")
+        valor = Decimal(texto).quantize(CENTAVOS, rounding=ROUND_HALF_UP)
+    except (InvalidOperation, TypeError):
+        raise ValueError("Formato de valor inválido.")
+    if abs(valor) >= VALOR_MAXIMO:
+        raise ValueError("Valor acima do máximo permitido (99.999.999,99).")
+    return valor
+
+def delta_orcamento(tipo, valor):
+    """Efeito de uma transação ativa no orçamento: entrada soma, saída subtrai."""
+    return valor if tipo == 'entrada' else -valor
+
+def aplicar_delta_orcamento(obra_id, delta):
+    """
+    Soma `delta` ao orcamento_atual da obra com um único UPDATE atômico
+    (orcamento_atual = orcamento_atual + :delta), sem ler o saldo para o Python.
+    Assim duas transações simultâneas na mesma obra não perdem atualização.
+    """
+    db.session.execute(
+        update(Obras)
+        .where(Obras.id == obra_id)
+        .values(orcamento_atual=func.coalesce(Obras.orcamento_atual, 0) + delta)
+        .execution_options(synchronize_session=False)
+    )
 
 # Cria o Blueprint
 financeiro_bp = Blueprint('financeiro', __name__)
 
-# --- Rota GET (Sem alterações) ---
+# --- Rota GET ---
 @financeiro_bp.route('/obras/<int:obra_id>/financeiro/', methods=['GET'])
 @jwt_required()
+@etag_por_versao(lambda obra_id: versao_da_obra(FinanceiroTransacoes, obra_id))
 def get_transacoes_obra(obra_id):
     try:
         obra = Obras.query.get_or_404(obra_id)
         # Agora ordenamos por status (ativos primeiro) e depois por data
-        transacoes = FinanceiroTransacoes.query.filter_by(obra_id=obra_id).order_by(FinanceiroTransacoes.status.asc(), FinanceiroTransacoes.criado_em.desc()).all()
-        return jsonify([t.to_dict() for t in transacoes]), 200
+        # Projeção de colunas: mesmas chaves de to_dict(), sem hidratar objetos
+        transacoes = query_transacoes().filter(
+            FinanceiroTransacoes.obra_id == obra_id
+        ).order_by(FinanceiroTransacoes.status.asc(), FinanceiroTransacoes.criado_em.desc()).all()
+        return jsonify(TRANSACAO.lista(transacoes)), 200
     except Exception as e:
         print(f"Erro ao buscar transações financeiras da obra {obra_id}: {e}")
         return jsonify({"error": "Erro interno ao buscar transações."}), 500
 
-# --- Rota POST (Sem alterações) ---
+# --- Rota POST ---
 @financeiro_bp.route('/obras/<int:obra_id>/financeiro/', methods=['POST', 'OPTIONS'])
 @gestor_ou_admin_required()
 def add_transacao_obra(obra_id, **kwargs):
-    # ... (O código desta função continua exatamente o mesmo) ...
-    # ... (Ele já cria a transação com o status 'ativo' por padrão) ...
+    # A transação nasce com status 'ativo' e o delta entra no orcamento_atual no mesmo commit
     if request.method == 'OPTIONS':
         return jsonify({'message': 'Preflight OK'}), 200
     current_user_id = get_jwt_identity()
@@ -74,11 +93,11 @@ def add_transacao_obra(obra_id, **kwargs):
     if not data or not data.get('tipo') or not data.get('valor') or not data.get('descricao'):
         return jsonify({"error": "Tipo, valor e descrição são obrigatórios."}), 400
     try:
-        valor = float(data.get('valor'))
+        valor = parse_valor(data.get('valor'))
         if valor <= 0:
             return jsonify({"error": "Valor deve ser positivo."}), 400
-    except (ValueError, TypeError):
-        return jsonify({"error": "Formato de valor inválido."}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     tipo = data.get('tipo')
     if tipo not in ['entrada', 'saida']:
         return jsonify({"error": "Tipo inválido (deve ser 'entrada' ou 'saida')."}), 400
@@ -92,21 +111,18 @@ def add_transacao_obra(obra_id, **kwargs):
             criado_por=current_user_id,
             status='ativo' # Garante que o status inicial é 'ativo'
         )
-        orcamento_atual_decimal = float(obra.orcamento_atual) if obra.orcamento_atual is not None else 0.0
-        if tipo == 'entrada':
-            obra.orcamento_atual = orcamento_atual_decimal + valor
-        else:
-            obra.orcamento_atual = orcamento_atual_decimal - valor
         db.session.add(nova_transacao)
-        db.session.add(obra) 
         db.session.flush() 
+        aplicar_delta_orcamento(obra_id, delta_orcamento(tipo, valor))
+        registrar_transacao(obra_id, tipo, valor, nova_transacao.criado_em)
         log_audit(
             current_user_id,
             'create',
             'FinanceiroTransacoes',
             nova_transacao.id,
-            {'obra_id': obra_id, 'tipo': tipo, 'valor': valor, 'descricao': descricao}
+            {'obra_id': obra_id, 'tipo': tipo, 'valor': float(valor), 'descricao': descricao}
         )
+        bump_data_version()
         db.session.commit()
         return jsonify(nova_transacao.to_dict()), 201
     except Exception as e:
@@ -129,7 +145,6 @@ def cancel_transacao(transacao_id, **kwargs):
         return jsonify({'message': 'Preflight OK'}), 200
         
     transacao = FinanceiroTransacoes.query.get_or_404(transacao_id)
-    obra = Obras.query.get_or_404(transacao.obra_id)
     data = request.get_json()
     current_user_id = get_jwt_identity()
 
@@ -142,26 +157,31 @@ def cancel_transacao(transacao_id, **kwargs):
     try:
         # Guarda valores para o log e recálculo
         tipo_transacao = transacao.tipo
-        valor_transacao = float(transacao.valor)
-        
-        # --- Lógica de Recálculo do Orçamento da Obra ---
-        orcamento_atual = float(obra.orcamento_atual)
-        
-        # Reverte o valor da transação que está sendo cancelada
-        if tipo_transacao == 'entrada':
-            orcamento_atual -= valor_transacao # Remove a entrada do orçamento
-        else: # 'saida'
-            orcamento_atual += valor_transacao # Devolve a saída ao orçamento
-            
-        obra.orcamento_atual = orcamento_atual
-        # --- Fim do Recálculo ---
-
-        # Atualiza a transação com os dados do cancelamento
-        transacao.status = 'cancelado'
-        transacao.motivo_cancelamento = data.get('motivo')
-        transacao.cancelado_em = datetime.now()
-        transacao.cancelado_por = current_user_id
-        transacao.atualizado_em = datetime.now()
+        valor_transacao = transacao.valor
+        agora = datetime.now()
+
+        # Marca como cancelada só se ainda estiver ativa: dois cancelamentos
+        # simultâneos não conseguem reverter o mesmo valor duas vezes.
+        resultado = db.session.execute(
+            update(FinanceiroTransacoes)
+            .where(FinanceiroTransacoes.id == transacao_id, FinanceiroTransacoes.status == 'ativo')
+            .values(
+                status='cancelado',
+                motivo_cancelamento=data.get('motivo'),
+                cancelado_em=agora,
+                cancelado_por=current_user_id,
+                atualizado_em=agora
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if resultado.rowcount != 1:
+            db.session.rollback()
+            return jsonify({"error": "Esta transação já foi cancelada."}), 409
+
+        # Reverte o valor da transação no orçamento da obra
+        aplicar_delta_orcamento(transacao.obra_id, -delta_orcamento(tipo_transacao, valor_transacao))
+        if transacao.criado_em:
+            registrar_transacao(transacao.obra_id, tipo_transacao, valor_transacao, transacao.criado_em, sinal=-1)
 
         # Log de Auditoria
         log_audit(
@@ -169,16 +189,171 @@ def cancel_transacao(transacao_id, **kwargs):
             'cancel', # Nova ação de log
             'FinanceiroTransacoes',
             transacao.id,
-            {'motivo': data.get('motivo'), 'valor_revertido': valor_transacao}
+            {'motivo': data.get('motivo'), 'valor_revertido': float(valor_transacao)}
         )
-        
-        db.session.add(transacao)
-        db.session.add(obra)
+
+        bump_data_version()
         db.session.commit()
+        db.session.refresh(transacao)
         
         return jsonify(transacao.to_dict()), 200
 
     except Exception as e:
         db.session.rollback()
         print(f"Erro ao CANCELAR transação {transacao_id}: {e}")
-        return jsonify({"error": "Erro interno ao cancelar a transação."}), 500
\ No newline at end of file
+        return jsonify({"error": "Erro interno ao cancelar a transação."}), 500
+
+
+# --- #################################### ---
+# ---   IMPORTAÇÃO EM LOTE (CSV / NDJSON)  ---
+# --- #################################### ---
+
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_ERROS_REPORTADOS = 1000
+IMPORT_DESCRICAO_MAX = 1000
+
+def _linhas_importacao(formato):
+    """
+    Lê o corpo da requisição linha a linha (sem carregar o arquivo inteiro na memória)
+    e gera (numero_da_linha, dict) para cada registro.
+    """
+    texto = io.TextIOWrapper(io.BufferedReader(request.stream), encoding='utf-8-sig', newline='')
+    if formato == 'csv':
+        leitor = csv.DictReader(texto, delimiter=request.args.get('delimiter', ','))
+        for registro in leitor:
+            yield leitor.line_num, registro
+    else:
+        for numero, linha in enumerate(texto, start=1):
+            if not linha.strip():
+                continue
+            try:
+                registro = json.loads(linha)
+            except ValueError:
+                yield numero, None
+                continue
+            yield numero, registro
+
+def _validar_linha_importacao(registro):
+    """Valida um registro importado. Retorna (tipo, valor, descricao) ou lança ValueError."""
+    if not isinstance(registro, dict):
+        raise ValueError("Linha não é um objeto JSON válido.")
+    tipo = registro.get('tipo') or ''
+    if not isinstance(tipo, str) or tipo.strip() not in ['entrada', 'saida']:
+        raise ValueError("Tipo inválido (deve ser 'entrada' ou 'saida').")
+    if registro.get('valor') in (None, ''):
+        raise ValueError("Valor é obrigatório.")
+    valor = parse_valor(registro.get('valor'))
+    if valor <= 0:
+        raise ValueError("Valor deve ser positivo.")
+    descricao = registro.get('descricao')
+    if not descricao:
+        raise ValueError("Descrição é obrigatória.")
+    if not isinstance(descricao, str):
+        raise ValueError("Descrição deve ser texto.")
+    if len(descricao) > IMPORT_DESCRICAO_MAX:
+        raise ValueError(f"Descrição maior que {IMPORT_DESCRICAO_MAX} caracteres.")
+    return tipo.strip(), valor, descricao
+
+def _gravar_lote_importacao(obra_id, user_id, lote, primeira_linha, ultima_linha):
+    """Insere o lote com um único executemany, ajusta o orçamento uma vez e registra um log resumido."""
+    db.session.execute(insert(FinanceiroTransacoes), lote)
+    total_entradas = sum((r['valor'] for r in lote if r['tipo'] == 'entrada'), Decimal('0.00'))
+    total_saidas = sum((r['valor'] for r in lote if r['tipo'] == 'saida'), Decimal('0.00'))
+    aplicar_delta_orcamento(obra_id, total_entradas - total_saidas)
+    aplicar_no_rollup(agrupar_transacoes(lote))
+    log_audit(
+        user_id,
+        'import',
+        'FinanceiroTransacoes',
+        None,
+        {
+            'obra_id': obra_id,
+            'quantidade': len(lote),
+            'linhas': [primeira_linha, ultima_linha],
+            'total_entradas': float(total_entradas),
+            'total_saidas': float(total_saidas)
+        }
+    )
+    bump_data_version()
+    db.session.commit()
+    return total_entradas, total_saidas
+
+@financeiro_bp.route('/obras/<int:obra_id>/financeiro/importar/', methods=['POST', 'OPTIONS'])
+@gestor_ou_admin_required()
+def importar_transacoes_obra(obra_id, **kwargs):
+    """
+    Importa transações em lote a partir de um corpo CSV (cabeçalho tipo,valor,descricao)
+    ou NDJSON (um objeto por linha). O arquivo é lido em streaming e gravado em lotes
+    de IMPORT_BATCH_SIZE linhas; linhas inválidas são reportadas sem abortar a importação.
+    """
+    if request.method == 'OPTIONS':
+        return jsonify({'message': 'Preflight OK'}), 200
+    current_user_id = get_jwt_identity()
+    Obras.query.get_or_404(obra_id)
+
+    formato = request.args.get('format')
+    if not formato:
+        content_type = (request.mimetype or '').lower()
+        formato = 'csv' if 'csv' in content_type else 'ndjson'
+    if formato not in ('csv', 'ndjson'):
+        return jsonify({"error": "Formato inválido (use 'csv' ou 'ndjson')."}), 400
+
+    importadas = 0
+    total_entradas = Decimal('0.00')
+    total_saidas = Decimal('0.00')
+    erros = []
+    total_erros = 0
+    lote = []
+    primeira_linha = None
+    ultima_linha = None
+    try:
+        for numero, registro in _linhas_importacao(formato):
+            try:
+                tipo, valor, descricao = _validar_linha_importacao(registro)
+            except ValueError as e:
+                total_erros += 1
+                if len(erros) < IMPORT_MAX_ERROS_REPORTADOS:
+                    erros.append({'linha': numero, 'erro': str(e)})
+                continue
+            if not lote:
+                primeira_linha = numero
+            ultima_linha = numero
+            lote.append({
+                'obra_id': obra_id,
+                'tipo': tipo,
+                'valor': valor,
+                'descricao': descricao,
+                'criado_por': current_user_id,
+                'criado_em': datetime.now(),
+                'status': 'ativo'
+            })
+            if len(lote) >= IMPORT_BATCH_SIZE:
+                entradas, saidas = _gravar_lote_importacao(obra_id, current_user_id, lote, primeira_linha, ultima_linha)
+                importadas += len(lote)
+                total_entradas += entradas
+                total_saidas += saidas
+                lote = []
+        if lote:
+            entradas, saidas = _gravar_lote_importacao(obra_id, current_user_id, lote, primeira_linha, ultima_linha)
+            importadas += len(lote)
+            total_entradas += entradas
+            total_saidas += saidas
+    except (UnicodeDecodeError, csv.Error) as e:
+        db.session.rollback()
+        total_erros += 1
+        erros.append({'linha': ultima_linha, 'erro': f"Arquivo ilegível: {e}"})
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao importar transações para a obra {obra_id}: {e}")
+        return jsonify({
+            "error": "Erro interno durante a importação. Os lotes anteriores já foram gravados.",
+            'importadas': importadas
+        }), 500
+
+    return jsonify({
+        'importadas': importadas,
+        'total_entradas': str(total_entradas),
+        'total_saidas': str(total_saidas),
+        'total_erros': total_erros,
+        'erros': erros
+    }), 200
@@ -1,75 +1,46 @@
 from flask import Blueprint, jsonify, request # <-- 'request' FOI ADICIONADO AQUI
-from ..models import Obras, InventarioItens, AuditLog, User
+from ..models import Obras, InventarioItens, InventarioMovimento, User
 from ..extensions import db
 from datetime import datetime
-from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
-from functools import wraps
-
-# --- Decorator de Permissão (CORRIGIDO) ---
-def gestor_ou_admin_required():
-    def wrapper(fn):
-        @wraps(fn)
-        def decorator(*args, **kwargs):
-            # --- CORREÇÃO: Ignora o token check para requisições OPTIONS ---
-            if request.method == 'OPTIONS':
-                return fn(*args, **kwargs)
-            # -----------------------------------------------------------
-            
-            try:
-                verify_jwt_in_request()
-            except Exception as e:
-                 return jsonify({"error": f"Token inválido ou ausente: {str(e)}"}), 401
-                 
-            current_user_id = get_jwt_identity()
-            user = User.query.get(current_user_id)
-            
-            if not user:
-                 return jsonify({"error": "Usuário do token não encontrado."}), 404
-            
-            role = user.role.name if user.role else None
-            
-            if role == 'Administrador' or role == 'Gestor':
-                kwargs['current_user'] = user 
-                return fn(*args, **kwargs) 
-            else:
-                return jsonify({"error": "Acesso negado: Requer permissão de Gestor ou Administrador."}), 403
-        return decorator
-    return wrapper
-# ------------------------------------
-
-
-# --- Helper para Log de Auditoria (Sem alterações) ---
-def log_audit(user_id, action_type, resource_type, resource_id, details=None):
-    try:
-        log_entry = AuditLog(
-            user_id=user_id, 
-            action_type=action_type,
-            resource_type=resource_type,
-            resource_id=resource_id,
-            details=details
-        )
-        db.session.add(log_entry)
-    except Exception as e:
-        print(f"ERRO CRÍTICO ao tentar criar log de auditoria: {e}")
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from ..permissions import gestor_ou_admin_required
+from ..cache import bump_data_version, etag_por_versao, versao_da_obra
+from ..audit import log_audit
+from ..estoque import (
+    movimentar, definir_saldo, registrar_saldo_inicial, transferir, obra_estoque_central, SaldoInsuficienteError
+)
+from ..serializers import ITEM_INVENTARIO, query_itens_inventario
+from ..pagination import encode_cursor, decode_cursor, parse_limit, paginate_keyset, CursorInvalidoError
+
+def diff_campos(antes, depois):
+    """Guarda no log só os campos que mudaram, em vez do objeto inteiro."""
+    campos = [k for k in depois if antes.get(k) != depois.get(k)]
+    return {
+        'antes': {k: antes.get(k) for k in campos},
+        'depois': {k: depois.get(k) for k in campos},
+    }
 
 # Cria o Blueprint
 inventario_bp = Blueprint('inventario', __name__)
 
-# --- Rota GET /api/obras/<obra_id>/inventario/ (Sem alterações) ---
+# --- Rota GET /api/obras/<obra_id>/inventario/ ---
 @inventario_bp.route('/obras/<int:obra_id>/inventario/', methods=['GET', 'OPTIONS'])
 @jwt_required()
+@etag_por_versao(lambda obra_id: versao_da_obra(InventarioItens, obra_id))
 def get_inventario_obra(obra_id):
     if request.method == 'OPTIONS':
         return jsonify({'message': 'Preflight OK'}), 200
     try:
         obra = Obras.query.get_or_404(obra_id)
-        itens = InventarioItens.query.filter_by(obra_id=obra_id).order_by(InventarioItens.nome).all()
-        return jsonify([item.to_dict() for item in itens]), 200
+        itens = query_itens_inventario().filter(
+            InventarioItens.obra_id == obra_id
+        ).order_by(InventarioItens.nome).all()
+        return jsonify(ITEM_INVENTARIO.lista(itens)), 200
     except Exception as e:
         print(f"Erro ao buscar inventário da obra {obra_id}: {e}")
         return jsonify({"error": "Erro interno ao buscar inventário."}), 500
 
-# --- Rota POST /api/obras/<obra_id>/inventario/ (Sem alterações) ---
+# --- Rota POST /api/obras/<obra_id>/inventario/ ---
 @inventario_bp.route('/obras/<int:obra_id>/inventario/', methods=['POST', 'OPTIONS'])
 @gestor_ou_admin_required()
 def add_item_inventario(obra_id, **kwargs):
@@ -112,6 +83,7 @@ def add_item_inventario(obra_id, **kwargs):
         )
         db.session.add(novo_item)
         db.session.flush() 
+        registrar_saldo_inicial(novo_item, current_user_id)
         log_audit(
             current_user_id,
             'create',
@@ -119,6 +91,7 @@ def add_item_inventario(obra_id, **kwargs):
             novo_item.id,
             {'obra_id': obra_id, 'nome': nome, 'tipo': tipo, 'quantidade': quantidade}
         )
+        bump_data_version()
         db.session.commit()
         return jsonify(novo_item.to_dict()), 201
     except Exception as e:
@@ -127,7 +100,7 @@ def add_item_inventario(obra_id, **kwargs):
         return jsonify({"error": "Erro interno ao salvar o item."}), 500
 
 
-# --- ROTA COMBINADA (PUT / DELETE) (Sem alterações na lógica interna) ---
+# --- ROTA COMBINADA (PUT / DELETE) ---
 @inventario_bp.route('/inventario/<int:item_id>/', methods=['PUT', 'DELETE', 'OPTIONS'])
 @gestor_ou_admin_required()
 def manage_item_inventario(item_id, **kwargs):
@@ -155,11 +128,14 @@ def manage_item_inventario(item_id, **kwargs):
             item.status_movimentacao = data.get('status_movimentacao', item.status_movimentacao)
             if 'quantidade' in data:
                 try:
-                    item.quantidade = int(data.get('quantidade'))
-                    if item.quantidade < 0:
+                    nova_quantidade = int(data.get('quantidade'))
+                    if nova_quantidade < 0:
                          return jsonify({"error": "Quantidade não pode ser negativa."}), 400
                 except (ValueError, TypeError):
                     return jsonify({"error": "Formato de quantidade inválido."}), 400
+                # A quantidade só muda pelo livro de movimentos (ajuste manual); a diferença
+                # é calculada contra o saldo atual no banco, não contra o lido acima
+                definir_saldo(item, nova_quantidade, 'ajuste', current_user_id, observacao=data.get('observacao'))
             if 'custo_unitario' in data:
                  try:
                     custo_unitario_str = data.get('custo_unitario')
@@ -177,10 +153,14 @@ def manage_item_inventario(item_id, **kwargs):
                 'update',
                 'InventarioItens',
                 item.id,
-                {'antes': estado_anterior, 'depois': item.to_dict()}
+                diff_campos(estado_anterior, item.to_dict())
             )
+            bump_data_version()
             db.session.commit()
             return jsonify(item.to_dict()), 200
+        except SaldoInsuficienteError as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 409
         except Exception as e:
             db.session.rollback()
             print(f"Erro ao ATUALIZAR item de inventário {item_id}: {e}")
@@ -196,10 +176,194 @@ def manage_item_inventario(item_id, **kwargs):
                 item.id,
                 {'removido': item.to_dict()}
             )
+            if item.quantidade:
+                movimentar(item, -item.quantidade, 'remocao', current_user_id)
             db.session.delete(item)
+            bump_data_version()
             db.session.commit()
             return '', 204
         except Exception as e:
             db.session.rollback()
             print(f"Erro ao REMOVER item de inventário {item_id}: {e}")
-            return jsonify({"error": "Erro interno ao remover o item."}), 500
\ No newline at end of file
+            return jsonify({"error": "Erro interno ao remover o item."}), 500
+
+
+# --- #################################### ---
+# --- MOVIMENTAÇÕES E TRANSFERÊNCIAS       ---
+# --- #################################### ---
+
+def _ler_quantidade(data):
+    try:
+        quantidade = int(data.get('quantidade'))
+    except (ValueError, TypeError):
+        return None
+    return quantidade if quantidade > 0 else None
+
+
+def _responder_movimentos(query):
+    """Lista paginada por cursor (id DESC): {"movimentos": [...], "next_cursor": ...}."""
+    cursor = request.args.get('cursor')
+    try:
+        cursor_values = decode_cursor(cursor, int) if cursor else None
+    except CursorInvalidoError as e:
+        return jsonify({"error": str(e)}), 400
+    movimentos, has_more = paginate_keyset(
+        query.order_by(InventarioMovimento.id.desc()), (InventarioMovimento.id,), parse_limit(), cursor_values
+    )
+    next_cursor = encode_cursor(movimentos[-1].id) if has_more else None
+    return jsonify({
+        'movimentos': [m.to_dict() for m in movimentos],
+        'next_cursor': next_cursor
+    }), 200
+
+
+# --- Rota POST /api/inventario/transferencias/ ---
+@inventario_bp.route('/inventario/transferencias/', methods=['POST', 'OPTIONS'])
+@gestor_ou_admin_required()
+def transferir_item(**kwargs):
+    """
+    Transfere quantidade de um item para outra obra: {item_id, quantidade, obra_destino_id?, observacao?}.
+    Sem obra_destino_id, o destino é o Estoque Central (itens do próprio estoque exigem o destino).
+    """
+    if request.method == 'OPTIONS':
+        return jsonify({'message': 'Preflight OK'}), 200
+    current_user_id = get_jwt_identity()
+    data = request.get_json() or {}
+    quantidade = _ler_quantidade(data)
+    if quantidade is None:
+        return jsonify({"error": "Quantidade deve ser um inteiro positivo."}), 400
+    try:
+        item_id = int(data.get('item_id'))
+        obra_destino_id = data.get('obra_destino_id')
+        if obra_destino_id is not None:
+            obra_destino_id = int(obra_destino_id)
+    except (ValueError, TypeError):
+        return jsonify({"error": "item_id e obra_destino_id devem ser inteiros."}), 400
+    item = db.session.get(InventarioItens, item_id)
+    if item is None:
+        return jsonify({"error": "Item de origem não encontrado."}), 404
+
+    if obra_destino_id is None:
+        estoque = obra_estoque_central()
+        if estoque is None or estoque.id == item.obra_id:
+            return jsonify({"error": "Informe a obra de destino."}), 400
+        obra_destino_id = estoque.id
+    elif db.session.get(Obras, obra_destino_id) is None:
+        return jsonify({"error": "Obra de destino não encontrada."}), 404
+    if obra_destino_id == item.obra_id:
+        return jsonify({"error": "A obra de destino é a mesma da origem."}), 400
+
+    try:
+        destino, transferencia_id = transferir(item, obra_destino_id, quantidade, current_user_id, data.get('observacao'))
+        log_audit(
+            current_user_id,
+            'transfer',
+            'InventarioItens',
+            item.id,
+            {'transferencia_id': transferencia_id, 'quantidade': quantidade,
+             'obra_origem_id': item.obra_id, 'obra_destino_id': obra_destino_id, 'item_destino_id': destino.id}
+        )
+        bump_data_version()
+        db.session.commit()
+        return jsonify({
+            'transferencia_id': transferencia_id,
+            'origem': item.to_dict(),
+            'destino': destino.to_dict()
+        }), 201
+    except SaldoInsuficienteError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 409
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao transferir item de inventário {item.id}: {e}")
+        return jsonify({"error": "Erro interno ao transferir o item."}), 500
+
+
+# --- Rota GET/POST /api/inventario/<item_id>/movimentos/ ---
+@inventario_bp.route('/inventario/<int:item_id>/movimentos/', methods=['GET', 'OPTIONS'])
+@jwt_required()
+def get_movimentos_item(item_id):
+    if request.method == 'OPTIONS':
+        return jsonify({'message': 'Preflight OK'}), 200
+    InventarioItens.query.get_or_404(item_id)
+    try:
+        return _responder_movimentos(InventarioMovimento.query.filter_by(item_id=item_id))
+    except Exception as e:
+        print(f"Erro ao buscar movimentos do item {item_id}: {e}")
+        return jsonify({"error": "Erro interno ao buscar movimentos."}), 500
+
+
+@inventario_bp.route('/inventario/<int:item_id>/movimentos/', methods=['POST'])
+@gestor_ou_admin_required()
+def add_movimento_item(item_id, **kwargs):
+    """Entrada ou saída manual: {tipo: 'entrada'|'saida', quantidade, observacao?}."""
+    current_user_id = get_jwt_identity()
+    item = InventarioItens.query.get_or_404(item_id)
+    data = request.get_json() or {}
+    tipo = data.get('tipo')
+    if tipo not in ('entrada', 'saida'):
+        return jsonify({"error": "Tipo deve ser 'entrada' ou 'saida'."}), 400
+    quantidade = _ler_quantidade(data)
+    if quantidade is None:
+        return jsonify({"error": "Quantidade deve ser um inteiro positivo."}), 400
+    try:
+        movimento = movimentar(
+            item, quantidade if tipo == 'entrada' else -quantidade, tipo, current_user_id,
+            observacao=data.get('observacao')
+        )
+        bump_data_version()
+        db.session.commit()
+        return jsonify(movimento.to_dict()), 201
+    except SaldoInsuficienteError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 409
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao registrar movimento do item {item_id}: {e}")
+        return jsonify({"error": "Erro interno ao registrar o movimento."}), 500
+
+
+# --- Rota GET /api/obras/<obra_id>/inventario/movimentos/ ---
+@inventario_bp.route('/obras/<int:obra_id>/inventario/movimentos/', methods=['GET', 'OPTIONS'])
+@jwt_required()
+@etag_por_versao(lambda obra_id: versao_da_obra(InventarioMovimento, obra_id))
+def get_movimentos_obra(obra_id):
+    if request.method == 'OPTIONS':
+        return jsonify({'message': 'Preflight OK'}), 200
+    Obras.query.get_or_404(obra_id)
+    try:
+        return _responder_movimentos(InventarioMovimento.query.filter_by(obra_id=obra_id))
+    except Exception as e:
+        print(f"Erro ao buscar movimentos da obra {obra_id}: {e}")
+        return jsonify({"error": "Erro interno ao buscar movimentos."}), 500
+
+
+# --- Rota GET /api/inventario/localizar/?nome= ---
+@inventario_bp.route('/inventario/localizar/', methods=['GET', 'OPTIONS'])
+@gestor_ou_admin_required()
+def localizar_item(**kwargs):
+    """Onde está o item: saldos positivos do nome informado, por obra (lidos dos saldos, não do livro)."""
+    if request.method == 'OPTIONS':
+        return jsonify({'message': 'Preflight OK'}), 200
+    nome = request.args.get('nome')
+    if not nome:
+        return jsonify({"error": "Informe o nome do item."}), 400
+    try:
+        linhas = db.session.query(
+            InventarioItens.id, InventarioItens.obra_id, Obras.nome.label('obra_nome'),
+            Obras.is_stock_default, InventarioItens.tipo, InventarioItens.quantidade, InventarioItens.custo_unitario
+        ).join(Obras, Obras.id == InventarioItens.obra_id).filter(
+            InventarioItens.nome == nome, InventarioItens.quantidade > 0
+        ).order_by(InventarioItens.obra_id).all()
+        return jsonify([{
+            'item_id': linha.id,
+            'obra_id': linha.obra_id,
+            'obra_nome': linha.obra_nome,
+            'is_stock_default': linha.is_stock_default,
+            'tipo': linha.tipo,
+            'quantidade': linha.quantidade,
+            'custo_unitario': str(linha.custo_unitario) if linha.custo_unitario is not None else "0.00",
+        } for linha in linhas]), 200
+    except Exception as e:
+        print(f"Erro ao localizar item '{nome}': {e}")
+        return jsonify({"error": "Erro interno ao localizar o item."}), 500
@@ -1,12 +1,18 @@
 from flask import Blueprint, jsonify, request, current_app, send_from_directory
 from ..models import Imovel, ImovelFotos, User, AuditLog
 from ..extensions import db
+from sqlalchemy.orm import joinedload, selectinload
 from datetime import datetime
 import os
 from werkzeug.utils import secure_filename
 import uuid
-from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
-from functools import wraps
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from ..permissions import gestor_ou_admin_required
+from ..images import agendar_renditions, remover_renditions, rendition_urls
+from ..busca import normalizar_texto, so_digitos, metragem_em_m2, faixa_de_prefixo, CEP_DIGITOS
+from ..pagination import (
+    encode_cursor, decode_cursor, parse_limit, paginate_keyset, escape_like, CursorInvalidoError
+)
 
 # --- Configurações de Upload ---
 MARKETPLACE_UPLOAD_FOLDER = 'uploads/marketplace'
@@ -16,44 +22,111 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# --- Decorator de Permissão (Admin/Gestor) ---
-def gestor_ou_admin_required():
-    def wrapper(fn):
-        @wraps(fn)
-        def decorator(*args, **kwargs):
-            if request.method == 'OPTIONS':
-                return fn(*args, **kwargs)
-            try:
-                verify_jwt_in_request()
-            except Exception as e:
-                 return jsonify({"error": f"Token inválido: {str(e)}"}), 401
-            current_user_id = get_jwt_identity()
-            user = User.query.get(current_user_id)
-            if not user or (user.role.name != 'Administrador' and user.role.name != 'Gestor'):
-                return jsonify({"error": "Acesso negado."}), 403
-            return fn(*args, **kwargs)
-        return decorator
-    return wrapper
-
 marketplace_bp = Blueprint('marketplace', __name__)
 
-# --- LISTAR IMÓVEIS (Sem alterações) ---
+# --- LISTAR IMÓVEIS ---
 @marketplace_bp.route('/marketplace/', methods=['GET', 'OPTIONS'])
 @jwt_required()
 def get_imoveis():
     if request.method == 'OPTIONS': return jsonify({'msg': 'OK'}), 200
-    imoveis = Imovel.query.order_by(Imovel.criado_em.desc()).all()
+    imoveis = Imovel.query.options(
+        joinedload(Imovel.criador),
+        selectinload(Imovel.fotos)
+    ).order_by(Imovel.criado_em.desc()).all()
     return jsonify([i.to_dict() for i in imoveis]), 200
 
-# --- OBTER DETALHES DE UM IMÓVEL (Sem alterações) ---
+# --- BUSCAR IMÓVEIS (listagem paginada, sem a galeria) ---
+# Colunas da projeção de listagem: sem fotos da galeria e sem o criador
+COLUNAS_RESUMO = (
+    Imovel.id, Imovel.titulo, Imovel.endereco, Imovel.numero, Imovel.bairro, Imovel.cep,
+    Imovel.metragem, Imovel.metragem_m2, Imovel.status, Imovel.foto_capa, Imovel.foto_capa_renditions,
+    Imovel.criado_em
+)
+
+
+def resumo_imovel(row):
+    return {
+        'id': row.id,
+        'titulo': row.titulo,
+        'endereco_completo': f"{row.endereco}, {row.numero} - {row.bairro}",
+        'bairro': row.bairro,
+        'cep': row.cep,
+        'metragem': row.metragem,
+        'metragem_m2': float(row.metragem_m2) if row.metragem_m2 is not None else None,
+        'status': row.status,
+        'foto_capa_url': f'/api/uploads/marketplace/{row.foto_capa}' if row.foto_capa else None,
+        'foto_capa_urls': rendition_urls(MARKETPLACE_UPLOAD_FOLDER, row.foto_capa, row.foto_capa_renditions),
+        'criado_em': row.criado_em.isoformat() if row.criado_em else None,
+    }
+
+
+@marketplace_bp.route('/marketplace/busca/', methods=['GET', 'OPTIONS'])
+@jwt_required()
+def buscar_imoveis():
+    """
+    Busca paginada por cursor (criado_em, id), com filtros opcionais:
+    ?status=, ?bairro=, ?cep= (prefixo, só dígitos), ?metragem_min=, ?metragem_max=
+    e ?q= (texto em título, endereço e observações, sem diferenciar acentos).
+    Retorna {"imoveis": [...], "next_cursor": ...}; os detalhes ficam em /marketplace/<id>/.
+    """
+    if request.method == 'OPTIONS': return jsonify({'msg': 'OK'}), 200
+    try:
+        query = db.session.query(*COLUNAS_RESUMO)
+
+        status = request.args.get('status')
+        if status:
+            query = query.filter(Imovel.status == status)
+        bairro = request.args.get('bairro')
+        if bairro:
+            query = query.filter(Imovel.bairro == bairro)
+        cep = so_digitos(request.args.get('cep'), CEP_DIGITOS)
+        if cep:
+            query = query.filter(Imovel.cep_digitos.between(*faixa_de_prefixo(cep, CEP_DIGITOS)))
+        for parametro in ('metragem_min', 'metragem_max'):
+            valor = request.args.get(parametro)
+            if not valor:
+                continue
+            metragem = metragem_em_m2(valor)
+            if metragem is None:
+                return jsonify({"error": f"Parâmetro '{parametro}' inválido."}), 400
+            if parametro == 'metragem_min':
+                query = query.filter(Imovel.metragem_m2 >= metragem)
+            else:
+                query = query.filter(Imovel.metragem_m2 <= metragem)
+        termo = normalizar_texto(request.args.get('q'))
+        if termo:
+            query = query.filter(Imovel.texto_busca.like('%' + escape_like(termo) + '%', escape='\\'))
+
+        query = query.order_by(Imovel.criado_em.desc(), Imovel.id.desc())
+        cursor = request.args.get('cursor')
+        try:
+            cursor_values = decode_cursor(cursor, datetime, int) if cursor else None
+        except CursorInvalidoError as e:
+            return jsonify({"error": str(e)}), 400
+        imoveis, has_more = paginate_keyset(
+            query, (Imovel.criado_em, Imovel.id), parse_limit(), cursor_values
+        )
+        next_cursor = encode_cursor(imoveis[-1].criado_em, imoveis[-1].id) if has_more else None
+        return jsonify({
+            'imoveis': [resumo_imovel(row) for row in imoveis],
+            'next_cursor': next_cursor
+        }), 200
+    except Exception as e:
+        print(f"Erro ao buscar imóveis: {e}")
+        return jsonify({"error": "Erro interno ao buscar imóveis."}), 500
+
+# --- OBTER DETALHES DE UM IMÓVEL ---
 @marketplace_bp.route('/marketplace/<int:id>/', methods=['GET', 'OPTIONS'])
 @jwt_required()
 def get_imovel(id):
     if request.method == 'OPTIONS': return jsonify({'msg': 'OK'}), 200
-    imovel = Imovel.query.get_or_404(id)
+    imovel = Imovel.query.options(
+        joinedload(Imovel.criador),
+        selectinload(Imovel.fotos)
+    ).get_or_404(id)
     return jsonify(imovel.to_dict()), 200
 
-# --- CRIAR IMÓVEL (Sem alterações) ---
+# --- CRIAR IMÓVEL ---
 @marketplace_bp.route('/marketplace/', methods=['POST', 'OPTIONS'])
 @gestor_ou_admin_required()
 def create_imovel():
@@ -81,13 +154,14 @@ def create_imovel():
             novo_imovel.foto_capa = filename
         db.session.add(novo_imovel)
         db.session.commit()
+        agendar_renditions(MARKETPLACE_UPLOAD_FOLDER, novo_imovel.foto_capa)
         return jsonify(novo_imovel.to_dict()), 201
     except Exception as e:
         db.session.rollback()
         print(f"Erro ao criar imóvel: {e}")
         return jsonify({"error": "Erro ao salvar imóvel"}), 500
 
-# --- ADICIONAR FOTO NA GALERIA (Sem alterações) ---
+# --- ADICIONAR FOTO NA GALERIA ---
 @marketplace_bp.route('/marketplace/<int:id>/fotos/', methods=['POST', 'OPTIONS'])
 @gestor_ou_admin_required()
 def add_gallery_photo(id):
@@ -103,12 +177,13 @@ def add_gallery_photo(id):
             nova_foto = ImovelFotos(imovel_id=id, filename=filename)
             db.session.add(nova_foto)
             db.session.commit()
+            agendar_renditions(MARKETPLACE_UPLOAD_FOLDER, filename)
             return jsonify(nova_foto.to_dict()), 201
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     return jsonify({"error": "Arquivo inválido"}), 400
 
-# --- ATUALIZAR IMÓVEL (Sem alterações) ---
+# --- ATUALIZAR IMÓVEL ---
 @marketplace_bp.route('/marketplace/<int:id>/', methods=['PUT', 'OPTIONS'])
 @gestor_ou_admin_required()
 def update_imovel(id):
@@ -127,7 +202,7 @@ def update_imovel(id):
     db.session.commit()
     return jsonify(imovel.to_dict()), 200
 
-# --- REMOVER IMÓVEL (Sem alterações) ---
+# --- REMOVER IMÓVEL ---
 @marketplace_bp.route('/marketplace/<int:id>/', methods=['DELETE', 'OPTIONS'])
 @gestor_ou_admin_required()
 def delete_imovel(id):
@@ -137,10 +212,12 @@ def delete_imovel(id):
         try:
             os.remove(os.path.join(current_app.instance_path, MARKETPLACE_UPLOAD_FOLDER, imovel.foto_capa))
         except: pass
+        remover_renditions(MARKETPLACE_UPLOAD_FOLDER, imovel.foto_capa)
     for foto in imovel.fotos:
         try:
             os.remove(os.path.join(current_app.instance_path, MARKETPLACE_UPLOAD_FOLDER, foto.filename))
         except: pass
+        remover_renditions(MARKETPLACE_UPLOAD_FOLDER, foto.filename)
     db.session.delete(imovel)
     db.session.commit()
     return '', 204
@@ -162,6 +239,7 @@ def delete_gallery_photo(foto_id):
                 os.remove(os.path.join(current_app.instance_path, MARKETPLACE_UPLOAD_FOLDER, foto.filename))
             except Exception as e:
                 print(f"Aviso: Não foi possível remover o arquivo físico da foto {foto_id}: {e}")
+            remover_renditions(MARKETPLACE_UPLOAD_FOLDER, foto.filename)
                 
         # 2. Remove o registro do banco de dados
         db.session.delete(foto)
@@ -1,41 +1,26 @@
-from flask import Blueprint, jsonify, request, current_app
-from ..models import Obras, User, ObraFuncionarios, Role, AuditLog 
+from flask import Blueprint, jsonify, request, current_app, Response
+from ..models import (
+    Obras, User, ObraFuncionarios, Role,
+    FinanceiroTransacoes, ChecklistItem, Documentos
+)
 from ..extensions import db
+from sqlalchemy.orm import selectinload, joinedload
 from datetime import datetime, date
 import os
 from werkzeug.utils import secure_filename
 import shutil 
 import json 
-from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
-from functools import wraps
-
-# --- Decorator de Permissão ---
-def gestor_ou_admin_required():
-    def wrapper(fn):
-        @wraps(fn)
-        def decorator(*args, **kwargs):
-            if request.method == 'OPTIONS':
-                return fn(*args, **kwargs)
-            try:
-                verify_jwt_in_request()
-            except Exception as e:
-                 return jsonify({"error": f"Token inválido ou ausente: {str(e)}"}), 401
-                 
-            current_user_id = get_jwt_identity()
-            user = User.query.get(current_user_id)
-            
-            if not user:
-                 return jsonify({"error": "Usuário do token não encontrado."}), 404
-            
-            role = user.role.name if user.role else None
-            
-            if role == 'Administrador' or role == 'Gestor':
-                kwargs['current_user'] = user 
-                return fn(*args, **kwargs) 
-            else:
-                return jsonify({"error": "Acesso negado: Requer permissão de Gestor ou Administrador."}), 403
-        return decorator
-    return wrapper
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from ..permissions import (
+    gestor_ou_admin_required, get_current_identity, get_current_role,
+    usuario_vinculado_a_obra, bump_token_version
+)
+from ..cache import bump_data_version
+from ..audit import log_audit, consultar_historico
+from ..export import montar_manifesto, gerar_zip
+from ..pagination import (
+    encode_cursor, decode_cursor, parse_limit, paginate_keyset, escape_like, CursorInvalidoError
+)
 
 obras_bp = Blueprint('obras', __name__)
 
@@ -46,40 +31,62 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def log_audit(user_id, action_type, resource_type, resource_id, details=None):
-    try:
-        log_entry = AuditLog(
-            user_id=user_id, 
-            action_type=action_type,
-            resource_type=resource_type,
-            resource_id=resource_id,
-            details=details 
-        )
-        db.session.add(log_entry)
-    except Exception as e:
-        print(f"ERRO CRÍTICO ao tentar criar log de auditoria: {e}")
-
 
 # --- Rota GET /api/obras/ ---
 @obras_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_obras():
+    """
+    Lista as obras visíveis ao usuário, com filtros opcionais:
+    ?status=, ?is_stock_default=true|false, ?nome= (prefixo).
+    Com ?limit= e/ou ?cursor= a resposta é paginada por cursor (criado_em, id)
+    no formato {"obras": [...], "next_cursor": ...}; sem eles, devolve a lista completa.
+    """
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        if not user:
+        identity = get_current_identity()
+        if not identity:
             return jsonify({"error": "Usuário não encontrado"}), 404
-        role = user.role.name if user.role else 'Prestador'
-        if role == 'Administrador' or role == 'Gestor':
-            obras_query = Obras.query.order_by(Obras.criado_em.desc()).all()
-        else:
-            obras_query = Obras.query.join(
-                ObraFuncionarios, ObraFuncionarios.obra_id == Obras.id
-            ).filter(
-                ObraFuncionarios.user_id == current_user_id
-            ).order_by(Obras.criado_em.desc()).all()
-        obras = [obra.to_dict() for obra in obras_query]
-        return jsonify(obras), 200
+        role = identity.role or 'Prestador'
+        obras_query = Obras.query
+        if role != 'Administrador' and role != 'Gestor':
+            if identity.obras is not None:
+                obras_query = obras_query.filter(Obras.id.in_(identity.obras))
+            else:
+                obras_query = obras_query.filter(Obras.id.in_(
+                    db.session.query(ObraFuncionarios.obra_id).filter(
+                        ObraFuncionarios.user_id == current_user_id
+                    )
+                ))
+
+        status = request.args.get('status')
+        if status:
+            obras_query = obras_query.filter(Obras.status == status)
+        is_stock_default = request.args.get('is_stock_default')
+        if is_stock_default is not None:
+            obras_query = obras_query.filter(Obras.is_stock_default == (is_stock_default.lower() == 'true'))
+        nome = request.args.get('nome')
+        if nome:
+            obras_query = obras_query.filter(Obras.nome.like(escape_like(nome) + '%', escape='\\'))
+
+        obras_query = obras_query.order_by(Obras.criado_em.desc(), Obras.id.desc())
+
+        if 'limit' not in request.args and 'cursor' not in request.args:
+            return jsonify([obra.to_dict() for obra in obras_query.all()]), 200
+
+        cursor = request.args.get('cursor')
+        try:
+            cursor_values = decode_cursor(cursor, datetime, int) if cursor else None
+        except CursorInvalidoError as e:
+            return jsonify({"error": str(e)}), 400
+        obras, has_more = paginate_keyset(
+            obras_query, (Obras.criado_em, Obras.id), parse_limit(), cursor_values
+        )
+        next_cursor = encode_cursor(obras[-1].criado_em, obras[-1].id) if has_more else None
+        return jsonify({
+            'obras': [obra.to_dict() for obra in obras],
+            'next_cursor': next_cursor
+        }), 200
     except Exception as e:
         print(f"Erro ao buscar obras (obras.py GET): {e}")
         return jsonify({"error": "Erro interno do servidor ao processar obras"}), 500
@@ -105,6 +112,7 @@ def create_obra(**kwargs):
         db.session.add(nova_obra)
         db.session.flush()
         log_audit(current_user_id, 'create', 'Obras', nova_obra.id, {'nome': nova_obra.nome})
+        bump_data_version()
         db.session.commit()
         return jsonify(nova_obra.to_dict()), 201
     except Exception as e:
@@ -117,22 +125,84 @@ def create_obra(**kwargs):
 @jwt_required() 
 def get_obra_detalhes(obra_id):
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        role = user.role.name if user.role else 'Prestador'
+        role = get_current_role()
         obra = Obras.query.get_or_404(obra_id)
-        if role == 'Prestador':
-            vinculo = ObraFuncionarios.query.filter_by(
-                obra_id=obra_id, 
-                user_id=current_user_id
-            ).first()
-            if not vinculo:
-                return jsonify({"error": "Acesso negado a esta obra."}), 403
+        if role == 'Prestador' and not usuario_vinculado_a_obra(obra_id):
+            return jsonify({"error": "Acesso negado a esta obra."}), 403
         return jsonify(obra.to_dict()), 200
     except Exception as e:
         print(f"Erro ao buscar detalhes da obra (obras.py GET <id>): {e}")
         return jsonify({"error": "Erro interno ao buscar detalhes da obra."}), 500
 
+# --- Rota GET /api/obras/<id>/dashboard/ ---
+DASHBOARD_SECTIONS = ('funcionarios', 'financeiro', 'inventario', 'checklist', 'documentos')
+
+def _dashboard_loader_options(sections):
+    """Opções de eager loading (selectinload) para as seções pedidas e o que seus to_dict usam."""
+    options = []
+    if 'funcionarios' in sections:
+        options.append(selectinload(Obras.funcionarios).joinedload(ObraFuncionarios.user))
+    if 'financeiro' in sections:
+        transacoes = selectinload(Obras.transacoes)
+        options.append(transacoes.joinedload(FinanceiroTransacoes.criador))
+        options.append(transacoes.joinedload(FinanceiroTransacoes.cancelador))
+    if 'inventario' in sections:
+        options.append(selectinload(Obras.inventario))
+    if 'checklist' in sections:
+        checklist = selectinload(Obras.checklist_itens)
+        options.append(checklist.joinedload(ChecklistItem.responsavel))
+        options.append(checklist.selectinload(ChecklistItem.anexos))
+    if 'documentos' in sections:
+        options.append(selectinload(Obras.documentos).joinedload(Documentos.uploader))
+    return options
+
+@obras_bp.route('/<int:obra_id>/dashboard/', methods=['GET', 'OPTIONS'])
+@jwt_required()
+def get_obra_dashboard(obra_id):
+    """
+    Retorna a obra e suas listas (funcionários, financeiro, inventário, checklist, documentos)
+    numa única requisição, com número fixo de queries.
+    ?include=financeiro,checklist escolhe as seções (padrão: todas).
+    """
+    if request.method == 'OPTIONS':
+        return jsonify({'message': 'Preflight OK'}), 200
+    include = request.args.get('include')
+    if include:
+        sections = {s.strip() for s in include.split(',') if s.strip()}
+        invalidas = sections - set(DASHBOARD_SECTIONS)
+        if invalidas:
+            return jsonify({"error": f"Seções inválidas em 'include': {', '.join(sorted(invalidas))}."}), 400
+    else:
+        sections = set(DASHBOARD_SECTIONS)
+    try:
+        if get_current_role() == 'Prestador' and not usuario_vinculado_a_obra(obra_id):
+            return jsonify({"error": "Acesso negado a esta obra."}), 403
+        obra = Obras.query.options(*_dashboard_loader_options(sections)).filter_by(id=obra_id).first()
+        if not obra:
+            return jsonify({"error": "Obra não encontrada."}), 404
+
+        # Mesma ordenação das rotas de listagem de cada seção
+        data = {'obra': obra.to_dict()}
+        if 'funcionarios' in sections:
+            data['funcionarios'] = [v.to_dict() for v in sorted(obra.funcionarios, key=lambda v: v.id)]
+        if 'financeiro' in sections:
+            transacoes = sorted(obra.transacoes, key=lambda t: t.criado_em or datetime.min, reverse=True)
+            transacoes.sort(key=lambda t: t.status)
+            data['financeiro'] = [t.to_dict() for t in transacoes]
+        if 'inventario' in sections:
+            data['inventario'] = [i.to_dict() for i in sorted(obra.inventario, key=lambda i: i.nome)]
+        if 'checklist' in sections:
+            itens = sorted(obra.checklist_itens, key=lambda i: i.data_cadastro or datetime.min, reverse=True)
+            itens.sort(key=lambda i: i.status or '')
+            data['checklist'] = [i.to_dict() for i in itens]
+        if 'documentos' in sections:
+            documentos = sorted(obra.documentos, key=lambda d: d.uploaded_at or datetime.min, reverse=True)
+            data['documentos'] = [d.to_dict() for d in documentos]
+        return jsonify(data), 200
+    except Exception as e:
+        print(f"Erro ao montar dashboard da obra {obra_id}: {e}")
+        return jsonify({"error": "Erro interno ao carregar a obra."}), 500
+
 # --- ATUALIZADA: Rota PUT /api/obras/<id>/ (EDITAR OBRA) ---
 @obras_bp.route('/<int:obra_id>/', methods=['PUT', 'OPTIONS'])
 @gestor_ou_admin_required()
@@ -182,6 +252,7 @@ def update_obra(obra_id, **kwargs):
                 obra.id,
                 {'antes': estado_anterior, 'depois': alteracoes}
             )
+            bump_data_version()
             db.session.commit()
         return jsonify(obra.to_dict()), 200
     except Exception as e:
@@ -204,9 +275,10 @@ def delete_obra(obra_id, **kwargs):
             'delete',
             'Obras',
             obra.id,
-            {'removido': obra.to_dict()}
+            {'removido': {'id': obra.id, 'nome': obra.nome, 'status': obra.status}}
         )
         db.session.delete(obra)
+        bump_data_version()
         db.session.commit()
         return '', 204
     except Exception as e:
@@ -216,6 +288,33 @@ def delete_obra(obra_id, **kwargs):
              return jsonify({"error": "Erro de integridade: Não foi possível remover a obra."}), 409
         return jsonify({"error": "Erro interno ao remover a obra."}), 500
         
+# --- Helper: histórico de auditoria de um recurso ---
+def responder_historico(resource_type, resource_id):
+    """
+    Histórico (inclui logs arquivados) com o nome do usuário via JOIN.
+    Com ?limit= e/ou ?cursor= responde {"logs": [...], "next_cursor": ...}; sem eles, a lista completa.
+    """
+    paginado = 'limit' in request.args or 'cursor' in request.args
+    cursor = request.args.get('cursor')
+    try:
+        cursor_values = decode_cursor(cursor, datetime, int) if cursor else None
+    except CursorInvalidoError as e:
+        return jsonify({"error": str(e)}), 400
+    logs, has_more = consultar_historico(
+        resource_type, resource_id, parse_limit() if paginado else None, cursor_values
+    )
+    logs_data = [{
+        'id': log.id,
+        'timestamp': log.timestamp.isoformat(),
+        'action_type': log.action_type,
+        'user_nome': log.user_nome or "Sistema",
+        'details': log.details
+    } for log in logs]
+    if not paginado:
+        return jsonify(logs_data), 200
+    next_cursor = encode_cursor(logs[-1].timestamp, logs[-1].id) if has_more else None
+    return jsonify({'logs': logs_data, 'next_cursor': next_cursor}), 200
+
 # --- NOVA ROTA (LOG DE AUDITORIA) ---
 @obras_bp.route('/<int:obra_id>/audit_logs/', methods=['GET', 'OPTIONS'])
 @gestor_ou_admin_required()
@@ -225,27 +324,72 @@ def get_obra_audit_logs(obra_id, **kwargs):
         return jsonify({'message': 'Preflight OK'}), 200
     Obras.query.get_or_404(obra_id)
     try:
-        logs = AuditLog.query.filter_by(
-            resource_type='Obras',
-            resource_id=obra_id
-        ).order_by(AuditLog.timestamp.desc()).all()
-        logs_data = []
-        for log in logs:
-            user_nome = log.user.nome if log.user else "Sistema"
-            logs_data.append({
-                'id': log.id,
-                'timestamp': log.timestamp.isoformat(),
-                'action_type': log.action_type,
-                'user_nome': user_nome,
-                'details': log.details
-            })
-        return jsonify(logs_data), 200
+        return responder_historico('Obras', obra_id)
     except Exception as e:
         print(f"Erro ao buscar logs de auditoria para obra {obra_id}: {e}")
         return jsonify({"error": "Erro interno ao buscar o histórico de alterações."}), 500
 
+# --- Rota GET /api/obras/<id>/export.zip ---
+@obras_bp.route('/<int:obra_id>/export.zip', methods=['GET', 'OPTIONS'])
+@gestor_ou_admin_required()
+def export_obra_zip(obra_id, **kwargs):
+    """
+    ZIP com todos os documentos e fotos do checklist da obra, gerado em streaming.
+    ?manifesto=<id>&a_partir_de=<n> retoma um download interrompido (ver indice.json).
+    """
+    if request.method == 'OPTIONS':
+        return jsonify({'message': 'Preflight OK'}), 200
+    Obras.query.get_or_404(obra_id)
+    try:
+        manifesto, caminhos = montar_manifesto(obra_id)
+    except Exception as e:
+        print(f"Erro ao montar a exportação da obra {obra_id}: {e}")
+        return jsonify({"error": "Erro interno ao preparar a exportação."}), 500
+
+    a_partir_de = request.args.get('a_partir_de', 0, type=int)
+    if a_partir_de < 0 or a_partir_de > manifesto['total_arquivos']:
+        return jsonify({"error": "Parâmetro 'a_partir_de' fora do índice da exportação."}), 400
+    if a_partir_de and request.args.get('manifesto') != manifesto['manifesto']:
+        return jsonify({
+            "error": "Os arquivos da obra mudaram desde o início do download. Baixe a exportação novamente.",
+            "manifesto": manifesto['manifesto']
+        }), 409
+
+    log_audit(
+        get_jwt_identity(), 'export_zip', 'Obras', obra_id,
+        {'manifesto': manifesto['manifesto'], 'a_partir_de': a_partir_de, 'arquivos': manifesto['total_arquivos']}
+    )
+    db.session.commit()
+
+    nome = f'obra_{obra_id}.zip' if not a_partir_de else f'obra_{obra_id}_a_partir_de_{a_partir_de}.zip'
+    return Response(
+        gerar_zip(manifesto, caminhos, a_partir_de),
+        mimetype='application/zip',
+        headers={
+            'Content-Disposition': f'attachment; filename="{nome}"',
+            'X-Export-Manifesto': manifesto['manifesto'],
+            # Sem isso o nginx acumularia o ZIP inteiro antes de repassar
+            'X-Accel-Buffering': 'no',
+        }
+    )
+
+# --- Rota GET /api/obras/<id>/export/indice/ ---
+@obras_bp.route('/<int:obra_id>/export/indice/', methods=['GET', 'OPTIONS'])
+@gestor_ou_admin_required()
+def export_obra_indice(obra_id, **kwargs):
+    """O mesmo indice.json do ZIP, para o cliente conferir o que falta antes de retomar."""
+    if request.method == 'OPTIONS':
+        return jsonify({'message': 'Preflight OK'}), 200
+    Obras.query.get_or_404(obra_id)
+    try:
+        manifesto, _ = montar_manifesto(obra_id)
+        return jsonify(manifesto), 200
+    except Exception as e:
+        print(f"Erro ao montar o índice da exportação da obra {obra_id}: {e}")
+        return jsonify({"error": "Erro interno ao preparar a exportação."}), 500
+
 # --- #################################### ---
-# --- ROTAS DE FUNCIONÁRIOS (Sem alterações) ---
+# --- ROTAS DE FUNCIONÁRIOS ---
 # --- #################################### ---
 
 # --- Rota GET /api/obras/<id>/funcionarios/ ---
@@ -254,18 +398,13 @@ def get_obra_audit_logs(obra_id, **kwargs):
 def get_funcionarios_da_obra(obra_id):
     # ... (código existente sem alterações) ...
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        role = user.role.name if user.role else 'Prestador'
+        role = get_current_role()
         obra = Obras.query.get_or_404(obra_id)
-        if role == 'Prestador':
-            vinculo = ObraFuncionarios.query.filter_by(
-                obra_id=obra_id, 
-                user_id=current_user_id
-            ).first()
-            if not vinculo:
-                return jsonify({"error": "Acesso negado a esta obra."}), 403
-        vinculos = ObraFuncionarios.query.filter_by(obra_id=obra_id).all()
+        if role == 'Prestador' and not usuario_vinculado_a_obra(obra_id):
+            return jsonify({"error": "Acesso negado a esta obra."}), 403
+        vinculos = ObraFuncionarios.query.options(
+            joinedload(ObraFuncionarios.user)
+        ).filter_by(obra_id=obra_id).all()
         funcionarios_data = [vinculo.to_dict() for vinculo in vinculos]
         return jsonify(funcionarios_data), 200
     except Exception as e:
@@ -322,6 +461,7 @@ def adicionar_funcionario_obra(obra_id, **kwargs):
             novo_vinculo.user_id = user_id
             audit_details['user_id'] = user_id
             audit_details['nome'] = user.nome
+            bump_token_version(user)
         else:
             nome_nao_cadastrado = form_data.get('nome_nao_cadastrado')
             cpf_nao_cadastrado = form_data.get('cpf_nao_cadastrado')
@@ -442,6 +582,8 @@ def remover_funcionario_obra(obra_id, vinculo_id, **kwargs):
         if vinculo.user_id is None and vinculo.foto_path_nao_cadastrado:
             foto_a_remover = vinculo.foto_path_nao_cadastrado
         log_audit(current_user_id, 'delete', 'ObraFuncionarios', vinculo_id, {'removido': antes})
+        if vinculo.user:
+            bump_token_version(vinculo.user)
         db.session.delete(vinculo)
         db.session.commit()
         if foto_a_remover:
@@ -465,21 +607,7 @@ def get_funcionario_audit_logs(obra_id, vinculo_id, **kwargs):
     obra = Obras.query.get_or_404(obra_id)
     vinculo = ObraFuncionarios.query.filter_by(id=vinculo_id, obra_id=obra_id).first_or_404()
     try:
-        logs = AuditLog.query.filter_by(
-            resource_type='ObraFuncionarios',
-            resource_id=vinculo_id
-        ).order_by(AuditLog.timestamp.desc()).all()
-        logs_data = []
-        for log in logs:
-            user_nome = log.user.nome if log.user else "Sistema"
-            logs_data.append({
-                'id': log.id,
-                'timestamp': log.timestamp.isoformat(),
-                'action_type': log.action_type,
-                'user_nome': user_nome,
-                'details': log.details
-            })
-        return jsonify(logs_data), 200
+        return responder_historico('ObraFuncionarios', vinculo_id)
     except Exception as e:
         print(f"Erro ao buscar logs de auditoria para vínculo {vinculo_id}: {e}")
         return jsonify({"error": "Erro interno ao buscar o histórico de alterações."}), 500
\ No newline at end of file
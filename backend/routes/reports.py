@@ -1,36 +1,19 @@
 from flask import Blueprint, jsonify, request
-from ..models import Obras, FinanceiroTransacoes, User, InventarioItens, ChecklistItem, Documentos
+from ..models import Obras, FinanceiroTransacoes, User, InventarioItens, ChecklistItem, Documentos, CashflowRollup
 from ..extensions import db
 from sqlalchemy.sql import func
+from sqlalchemy import case, true
+from sqlalchemy.orm import joinedload, selectinload
+from ..cashflow import PERIOD_FORMATS, period_key
+from ..cache import cached_by_version, etag_por_versao, versao_global
 from datetime import datetime, date
-from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
-from functools import wraps
-
-# --- Decorator (Sem alterações) ---
-def gestor_ou_admin_required():
-    def wrapper(fn):
-        @wraps(fn)
-        def decorator(*args, **kwargs):
-            if request.method == 'OPTIONS':
-                return fn(*args, **kwargs)
-            try:
-                verify_jwt_in_request()
-            except Exception as e:
-                 return jsonify({"error": f"Token inválido ou ausente: {str(e)}"}), 401
-            current_user_id = get_jwt_identity()
-            user = User.query.get(current_user_id)
-            if not user:
-                 return jsonify({"error": "Usuário do token não encontrado."}), 404
-            role = user.role.name if user.role else None
-            if role == 'Administrador' or role == 'Gestor':
-                kwargs['current_user'] = user 
-                return fn(*args, **kwargs) 
-            else:
-                return jsonify({"error": "Acesso negado: Requer permissão de Gestor ou Administrador."}), 403
-        return decorator
-    return wrapper
+from decimal import Decimal
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from ..permissions import gestor_ou_admin_required, admin_required
+from ..audit import audit_writer
+from ..streaming import FORMATOS_STREAM, responder_stream, linhas_da_query
 
-# --- Helper (Sem alterações) ---
+# --- Helper ---
 def format_cashflow_data(query_results):
     data_map = {}
     for mes, tipo, total in query_results:
@@ -58,67 +41,97 @@ def format_cashflow_data(query_results):
 # --- Blueprint ---
 reports_bp = Blueprint('reports', __name__)
 
-# --- Rota KPIs (Sem alterações) ---
+# --- Rota KPIs ---
+def calcular_kpis():
+    """Calcula todos os KPIs globais numa única query (dois agregados de uma linha cada)."""
+    nao_estoque = Obras.is_stock_default == False # Ignora o estoque
+    obras_agg = db.session.query(
+        func.count(Obras.id).label('total_obras'),
+        func.sum(case((Obras.status == 'Em Andamento', 1), else_=0)).label('obras_ativas'),
+        func.sum(case((Obras.status == 'Concluída', 1), else_=0)).label('obras_concluidas'),
+        func.sum(Obras.orcamento_atual).label('total_orcamento_atual')
+    ).filter(nao_estoque).subquery()
+    transacoes_agg = db.session.query(
+        func.sum(case((FinanceiroTransacoes.tipo == 'saida', FinanceiroTransacoes.valor))).label('total_custos'),
+        func.sum(case((FinanceiroTransacoes.tipo == 'entrada', FinanceiroTransacoes.valor))).label('total_receitas')
+    ).join(Obras).filter(
+        FinanceiroTransacoes.status == 'ativo',
+        nao_estoque
+    ).subquery()
+    # Os dois agregados têm exatamente uma linha: o JOIN ON true só os coloca lado a lado
+    row = db.session.query(obras_agg, transacoes_agg).select_from(obras_agg).join(transacoes_agg, true()).one()
+    return {
+        'total_obras': row.total_obras or 0,
+        'obras_ativas': row.obras_ativas or 0,
+        'obras_concluidas': row.obras_concluidas or 0,
+        'total_orcamento_atual': str(row.total_orcamento_atual or 0.0),
+        'total_custos': str(row.total_custos or 0.0),
+        'total_receitas': str(row.total_receitas or 0.0),
+    }
+
 @reports_bp.route('/reports/kpis/', methods=['GET', 'OPTIONS'])
 @gestor_ou_admin_required()
+@etag_por_versao(versao_global)
 def get_global_kpis(**kwargs):
-    # ... (código existente sem alterações) ...
+    """KPIs globais, em cache até a próxima escrita em obras/financeiro/inventário."""
     if request.method == 'OPTIONS':
         return jsonify({'message': 'Preflight OK'}), 200
     try:
-        total_obras = db.session.query(func.count(Obras.id)).filter(Obras.is_stock_default == False).scalar() or 0 # Ignora o estoque
-        obras_ativas = db.session.query(func.count(Obras.id)).filter(Obras.status == 'Em Andamento', Obras.is_stock_default == False).scalar() or 0
-        total_orcamento_atual = db.session.query(func.sum(Obras.orcamento_atual)).filter(Obras.is_stock_default == False).scalar() or 0.0
-        total_custos = db.session.query(func.sum(FinanceiroTransacoes.valor)).join(Obras).filter(
-            FinanceiroTransacoes.tipo == 'saida',
-            FinanceiroTransacoes.status == 'ativo',
-            Obras.is_stock_default == False
-        ).scalar() or 0.0
-        total_receitas = db.session.query(func.sum(FinanceiroTransacoes.valor)).join(Obras).filter(
-            FinanceiroTransacoes.tipo == 'entrada',
-            FinanceiroTransacoes.status == 'ativo',
-            Obras.is_stock_default == False
-        ).scalar() or 0.0
-        kpis = {
-            'total_obras': total_obras,
-            'obras_ativas': obras_ativas,
-            'obras_concluidas': db.session.query(func.count(Obras.id)).filter(Obras.status == 'Concluída', Obras.is_stock_default == False).scalar() or 0,
-            'total_orcamento_atual': str(total_orcamento_atual),
-            'total_custos': str(total_custos),
-            'total_receitas': str(total_receitas),
-        }
+        kpis = cached_by_version('kpis', calcular_kpis)
         return jsonify(kpis), 200
     except Exception as e:
         print(f"Erro ao calcular KPIs globais: {e}")
         return jsonify({"error": "Erro interno ao calcular os relatórios."}), 500
 
+# --- Rota de métricas da auditoria (fila, lotes, descartes) ---
+@reports_bp.route('/reports/audit-metrics/', methods=['GET', 'OPTIONS'])
+@admin_required()
+def get_audit_metrics(**kwargs):
+    if request.method == 'OPTIONS':
+        return jsonify({'message': 'Preflight OK'}), 200
+    return jsonify(audit_writer.metrics()), 200
+
 # --- Rota Cashflow (ATUALIZADA) ---
 @reports_bp.route('/reports/cashflow/', methods=['GET', 'OPTIONS'])
 @gestor_ou_admin_required()
+@etag_por_versao(versao_global)
 def get_cashflow_report(**kwargs):
+    """
+    Fluxo de caixa por período, lido da tabela cashflow_rollup (mantida a cada lançamento).
+    Filtros opcionais: ?periodo=mensal|semanal, ?obra_id=, ?inicio=YYYY-MM-DD, ?fim=YYYY-MM-DD
+    (as datas selecionam os períodos que as contêm).
+    """
     if request.method == 'OPTIONS':
         return jsonify({'message': 'Preflight OK'}), 200
+    periodo = request.args.get('periodo', 'mensal')
+    if periodo not in PERIOD_FORMATS:
+        periodo = 'mensal'
     try:
-        periodo = request.args.get('periodo', 'mensal')
-        dialect = db.engine.dialect.name
-        if dialect == 'postgresql':
-            grouping_format = 'YYYY-WW' if periodo == 'semanal' else 'YYYY-MM'
-            grouping_expression = func.to_char(FinanceiroTransacoes.criado_em, grouping_format)
-        else:
-            grouping_format = '%Y-%W' if periodo == 'semanal' else '%Y-%m'
-            grouping_expression = func.strftime(grouping_format, FinanceiroTransacoes.criado_em)
-        
-        cashflow_data = db.session.query(
-            grouping_expression.label('periodo_label'),
-            FinanceiroTransacoes.tipo,
-            func.sum(FinanceiroTransacoes.valor).label('total')
-        ).join(Obras).filter( # <-- JOIN com Obras
-            FinanceiroTransacoes.status == 'ativo',
+        inicio = date.fromisoformat(request.args['inicio']) if request.args.get('inicio') else None
+        fim = date.fromisoformat(request.args['fim']) if request.args.get('fim') else None
+    except ValueError:
+        return jsonify({"error": "Formato de data inválido (use YYYY-MM-DD)."}), 400
+    obra_id = request.args.get('obra_id', type=int)
+    try:
+        cashflow_query = db.session.query(
+            CashflowRollup.period_key,
+            CashflowRollup.tipo,
+            func.sum(CashflowRollup.total).label('total')
+        ).join(Obras, CashflowRollup.obra_id == Obras.id).filter(
+            CashflowRollup.period_kind == periodo,
+            CashflowRollup.count > 0,
             Obras.is_stock_default == False # <-- Ignora o estoque
-        ).group_by(
-            'periodo_label', FinanceiroTransacoes.tipo
+        )
+        if obra_id:
+            cashflow_query = cashflow_query.filter(CashflowRollup.obra_id == obra_id)
+        if inicio:
+            cashflow_query = cashflow_query.filter(CashflowRollup.period_key >= period_key(periodo, inicio))
+        if fim:
+            cashflow_query = cashflow_query.filter(CashflowRollup.period_key <= period_key(periodo, fim))
+        cashflow_data = cashflow_query.group_by(
+            CashflowRollup.period_key, CashflowRollup.tipo
         ).order_by(
-            'periodo_label'
+            CashflowRollup.period_key
         ).all()
         formatted_data = format_cashflow_data(cashflow_data)
         return jsonify(formatted_data), 200
@@ -127,12 +140,52 @@ def get_cashflow_report(**kwargs):
         return jsonify({"error": "Erro interno ao calcular o fluxo de caixa."}), 500
 
 
+# --- Formatos de saída dos relatórios globais ---
+# Sem ?format= (ou format=json) a resposta é o JSON de sempre; com format=ndjson|csv
+# as linhas saem em streaming, uma por registro, sem objetos aninhados.
+
+def formato_pedido():
+    """Retorna 'json', 'ndjson' ou 'csv'; None se o formato pedido não existe."""
+    formato = request.args.get('format', 'json').lower()
+    return formato if formato == 'json' or formato in FORMATOS_STREAM else None
+
+
+def _formato_invalido():
+    return jsonify({"error": "Formato inválido (use json, ndjson ou csv)."}), 400
+
+
+COLUNAS_INVENTARIO = [
+    'id', 'obra_id', 'obra_nome', 'is_stock_default', 'tipo', 'nome', 'descricao',
+    'quantidade', 'custo_unitario', 'status_movimentacao', 'criado_em'
+]
+
+
+def _query_inventario_stream():
+    return db.session.query(
+        InventarioItens.id, InventarioItens.obra_id, Obras.nome.label('obra_nome'), Obras.is_stock_default,
+        InventarioItens.tipo, InventarioItens.nome, InventarioItens.descricao, InventarioItens.quantidade,
+        InventarioItens.custo_unitario, InventarioItens.status_movimentacao, InventarioItens.criado_em
+    ).join(
+        Obras, InventarioItens.obra_id == Obras.id
+    ).order_by(
+        Obras.nome.asc(), InventarioItens.nome.asc()
+    )
+
+
 # --- Rota Inventário Global (ATUALIZADA) ---
 @reports_bp.route('/reports/global-inventory/', methods=['GET', 'OPTIONS'])
 @gestor_ou_admin_required()
+@etag_por_versao(versao_global)
 def get_global_inventory(**kwargs):
     if request.method == 'OPTIONS':
         return jsonify({'message': 'Preflight OK'}), 200
+    formato = formato_pedido()
+    if formato is None:
+        return _formato_invalido()
+    if formato in FORMATOS_STREAM:
+        return responder_stream(
+            formato, COLUNAS_INVENTARIO, linhas_da_query(_query_inventario_stream()), 'inventario_global'
+        )
     try:
         # Busca TODOS os itens e suas obras
         all_items_query = db.session.query(
@@ -168,20 +221,98 @@ def get_global_inventory(**kwargs):
         return jsonify({"error": "Erro interno ao calcular o inventário."}), 500
 
 
-# --- Rota Checklist Global (Sem alterações) ---
+# --- Rota Valorização do Inventário ---
+@reports_bp.route('/reports/inventory-valuation/', methods=['GET', 'OPTIONS'])
+@gestor_ou_admin_required()
+@etag_por_versao(versao_global)
+def get_inventory_valuation(**kwargs):
+    """Quantidade e valor (quantidade x custo unitário) em estoque por obra, a partir dos saldos."""
+    if request.method == 'OPTIONS':
+        return jsonify({'message': 'Preflight OK'}), 200
+    try:
+        linhas = db.session.query(
+            Obras.id, Obras.nome, Obras.is_stock_default,
+            func.count(InventarioItens.id).label('itens'),
+            func.coalesce(func.sum(InventarioItens.quantidade), 0).label('quantidade_total'),
+            func.coalesce(func.sum(InventarioItens.quantidade * InventarioItens.custo_unitario), 0).label('valor_total')
+        ).join(Obras, InventarioItens.obra_id == Obras.id).filter(
+            InventarioItens.quantidade > 0
+        ).group_by(Obras.id, Obras.nome, Obras.is_stock_default).order_by(Obras.nome).all()
+        return jsonify([{
+            'obra_id': linha.id,
+            'obra_nome': linha.nome,
+            'is_stock_default': linha.is_stock_default,
+            'itens': linha.itens,
+            'quantidade_total': int(linha.quantidade_total),
+            'valor_total': str(Decimal(str(linha.valor_total)).quantize(Decimal('0.01'))),
+        } for linha in linhas]), 200
+    except Exception as e:
+        print(f"Erro ao calcular a valorização do inventário: {e}")
+        return jsonify({"error": "Erro interno ao calcular a valorização do inventário."}), 500
+
+
+COLUNAS_CHECKLIST = [
+    'lista', 'id', 'obra_id', 'obra_nome', 'titulo', 'descricao', 'responsavel_user_id',
+    'responsavel_nome', 'status', 'status_display', 'prazo', 'data_cadastro', 'data_conclusao'
+]
+
+
+def _linhas_checklist_stream(user_id):
+    today = date.today()
+    colunas = (
+        ChecklistItem.id, ChecklistItem.obra_id, Obras.nome.label('obra_nome'), ChecklistItem.titulo,
+        ChecklistItem.descricao, ChecklistItem.responsavel_user_id, User.nome.label('responsavel_nome'),
+        ChecklistItem.status, ChecklistItem.prazo, ChecklistItem.data_cadastro, ChecklistItem.data_conclusao
+    )
+    base = db.session.query(*colunas).join(
+        Obras, ChecklistItem.obra_id == Obras.id
+    ).outerjoin(
+        User, ChecklistItem.responsavel_user_id == User.id
+    ).filter(
+        ChecklistItem.status == 'pendente',
+        Obras.is_stock_default == False # Ignora o estoque
+    )
+    consultas = (
+        ('minhas', base.filter(ChecklistItem.responsavel_user_id == user_id)),
+        ('atrasadas', base.filter(ChecklistItem.prazo != None, ChecklistItem.prazo < today)),
+    )
+    for lista, query in consultas:
+        def transformar(linha, lista=lista):
+            linha['status_display'] = ChecklistItem.status_display_de(linha['status'], linha['prazo'])
+            linha['lista'] = lista
+            return linha
+        yield from linhas_da_query(query.order_by(ChecklistItem.prazo.asc()), transformar)
+
+
+# --- Rota Checklist Global ---
 @reports_bp.route('/reports/global-checklist/', methods=['GET', 'OPTIONS'])
 @jwt_required()
 def get_global_checklist(**kwargs):
-    # ... (código existente sem alterações) ...
+    """
+    Tarefas pendentes do usuário e tarefas atrasadas de todas as obras.
+    Com format=ndjson|csv, as duas listas saem numa só, marcadas pela coluna 'lista'
+    ('minhas' ou 'atrasadas'), sem os anexos.
+    """
     if request.method == 'OPTIONS':
         return jsonify({'message': 'Preflight OK'}), 200
+    formato = formato_pedido()
+    if formato is None:
+        return _formato_invalido()
+    if formato in FORMATOS_STREAM:
+        return responder_stream(
+            formato, COLUNAS_CHECKLIST, _linhas_checklist_stream(get_jwt_identity()), 'checklist_global'
+        )
     try:
         current_user_id = get_jwt_identity()
         today = date.today()
+        checklist_options = (
+            joinedload(ChecklistItem.responsavel),
+            selectinload(ChecklistItem.anexos)
+        )
         my_tasks_query = db.session.query(
             ChecklistItem,
             Obras.nome.label('obra_nome')
-        ).join(Obras).filter(
+        ).join(Obras).options(*checklist_options).filter(
             ChecklistItem.responsavel_user_id == current_user_id,
             ChecklistItem.status == 'pendente',
             Obras.is_stock_default == False # Ignora o estoque
@@ -191,7 +322,7 @@ def get_global_checklist(**kwargs):
         overdue_tasks_query = db.session.query(
             ChecklistItem,
             Obras.nome.label('obra_nome')
-        ).join(Obras).filter(
+        ).join(Obras).options(*checklist_options).filter(
             ChecklistItem.status == 'pendente',
             ChecklistItem.prazo != None,
             ChecklistItem.prazo < today,
@@ -214,17 +345,50 @@ def get_global_checklist(**kwargs):
         print(f"Erro ao calcular checklist global: {e}")
         return jsonify({"error": "Erro interno ao calcular o checklist."}), 500
 
+COLUNAS_DOCUMENTOS = [
+    'id', 'obra_id', 'obra_nome', 'filename', 'filepath_url', 'sha256', 'tipo',
+    'visibilidade', 'uploaded_by_nome', 'uploaded_at'
+]
+
+
+def _linhas_documentos_stream():
+    query = db.session.query(
+        Documentos.id, Documentos.obra_id, Obras.nome.label('obra_nome'), Documentos.filename,
+        Documentos.filepath, Documentos.blob_sha256.label('sha256'), Documentos.tipo,
+        Documentos.visibilidade, User.nome.label('uploaded_by_nome'), Documentos.uploaded_at
+    ).join(
+        Obras, Documentos.obra_id == Obras.id
+    ).outerjoin(
+        User, Documentos.uploaded_by == User.id
+    ).filter(
+        Obras.is_stock_default == False # <-- Ignora o estoque
+    ).order_by(
+        Obras.nome.asc(), Documentos.uploaded_at.desc()
+    )
+
+    def transformar(linha):
+        linha['filepath_url'] = Documentos.montar_url(linha['sha256'], linha['filename'], linha['filepath'])
+        linha['uploaded_by_nome'] = linha['uploaded_by_nome'] or "Sistema"
+        return linha
+    return linhas_da_query(query, transformar)
+
+
 # --- Rota Documentos Globais (ATUALIZADA) ---
 @reports_bp.route('/reports/global-documents/', methods=['GET', 'OPTIONS'])
 @gestor_ou_admin_required()
 def get_global_documents(**kwargs):
     if request.method == 'OPTIONS':
         return jsonify({'message': 'Preflight OK'}), 200
+    formato = formato_pedido()
+    if formato is None:
+        return _formato_invalido()
+    if formato in FORMATOS_STREAM:
+        return responder_stream(formato, COLUNAS_DOCUMENTOS, _linhas_documentos_stream(), 'documentos_globais')
     try:
         documents_data = db.session.query(
             Documentos,
             Obras.nome.label('obra_nome')
-        ).join(Obras).filter(
+        ).join(Obras).options(joinedload(Documentos.uploader)).filter(
             Obras.is_stock_default == False # <-- Ignora o estoque
         ).order_by(
             Obras.nome.asc(), Documentos.uploaded_at.desc()
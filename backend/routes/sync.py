@@ -0,0 +1,32 @@
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required
+from ..permissions import get_current_identity
+from ..pagination import parse_limit, CursorInvalidoError
+from ..sync import sincronizar, SYNC_LIMITE, SYNC_LIMITE_MAX
+
+# Cria o Blueprint
+sync_bp = Blueprint('sync', __name__)
+
+# --- Rota GET /api/sync/?since=<cursor> ---
+@sync_bp.route('/sync/', methods=['GET', 'OPTIONS'], strict_slashes=False)
+@jwt_required()
+def get_sync():
+    """
+    Sincronização incremental para clientes offline: linhas criadas, alteradas e
+    removidas desde o cursor nas obras do usuário (obras, funcionários, financeiro,
+    inventário, checklist e documentos). ?limit= vale por recurso; com has_more=true
+    o cliente chama de novo com next_cursor. Guarde o next_cursor para a próxima sync.
+    """
+    if request.method == 'OPTIONS':
+        return jsonify({'message': 'Preflight OK'}), 200
+    identity = get_current_identity()
+    if not identity:
+        return jsonify({"error": "Usuário não encontrado"}), 404
+    try:
+        dados = sincronizar(identity, request.args.get('since'), parse_limit(SYNC_LIMITE, SYNC_LIMITE_MAX))
+        return jsonify(dados), 200
+    except CursorInvalidoError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Erro na sincronização: {e}")
+        return jsonify({"error": "Erro interno na sincronização."}), 500
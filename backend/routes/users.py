@@ -1,78 +1,27 @@
 from flask import Blueprint, request, jsonify, current_app
 from ..models import User, Role, AuditLog # <-- 1. IMPORTA O AUDITLOG
 from ..extensions import db, bcrypt
+from sqlalchemy.orm import joinedload
 import os
 from werkzeug.utils import secure_filename
 from datetime import datetime
 # --- 2. IMPORTS ATUALIZADOS ---
-from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
-from functools import wraps 
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy.exc import IntegrityError # <-- IMPORTA O INTEGRITYERROR
+from ..permissions import gestor_ou_admin_required, admin_required, get_current_role, invalidate_identity, bump_token_version
+from ..images import agendar_renditions
 # ---------------------------
 
-# --- 3. ADICIONADO Decorator de Permissão (Gestor ou Admin) ---
-def gestor_ou_admin_required():
-    def wrapper(fn):
-        @wraps(fn)
-        def decorator(*args, **kwargs):
-            # Ignora o token check para requisições OPTIONS
-            if request.method == 'OPTIONS':
-                return fn(*args, **kwargs)
-            try:
-                verify_jwt_in_request()
-            except Exception as e:
-                 return jsonify({"error": f"Token inválido ou ausente: {str(e)}"}), 401
-                 
-            current_user_id = get_jwt_identity()
-            user = User.query.get(current_user_id)
-            
-            if not user:
-                 return jsonify({"error": "Usuário do token não encontrado."}), 404
-            
-            role = user.role.name if user.role else None
-            
-            if role == 'Administrador' or role == 'Gestor':
-                kwargs['current_user'] = user 
-                return fn(*args, **kwargs) 
-            else:
-                return jsonify({"error": "Acesso negado: Requer permissão de Gestor ou Administrador."}), 403
-        return decorator
-    return wrapper
-# ------------------------------------
-
-# --- Decorator de Admin (Sem alterações) ---
-def admin_required():
-    def wrapper(fn):
-        @wraps(fn)
-        def decorator(*args, **kwargs):
-            if request.method == 'OPTIONS':
-                return fn(*args, **kwargs)
-            
-            try:
-                verify_jwt_in_request()
-            except Exception as e:
-                 return jsonify({"error": f"Token inválido ou ausente: {str(e)}"}), 401
-
-            current_user_id = get_jwt_identity()
-            user = User.query.get(current_user_id)
-            
-            if user and user.role and user.role.name == 'Administrador':
-                return fn(*args, **kwargs)
-            else:
-                return jsonify({"error": "Acesso negado: Requer permissão de Administrador."}), 403
-        return decorator
-    return wrapper
-# ------------------------------------
-
 users_bp = Blueprint('users', __name__)
 
+PROFILE_UPLOAD_FOLDER = 'uploads/profile_pics'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# --- Rota POST /api/users (Criar Usuário) (Sem alterações) ---
+# --- Rota POST /api/users (Criar Usuário) ---
 @users_bp.route('/', methods=['POST'])
 @admin_required()
 def create_user():
@@ -121,13 +70,13 @@ def create_user():
 def get_users(**kwargs): # <-- ADICIONADO **kwargs
     """Lista todos os usuários."""
     try:
-        users = User.query.all()
+        users = User.query.options(joinedload(User.role)).all()
         return jsonify({"users": [user.to_dict() for user in users]}), 200
     except Exception as e:
         print(f"Erro ao buscar usuários (users.py GET): {e}")
         return jsonify({"error": "Erro interno ao buscar usuários."}), 500
 
-# --- Rota GET /api/users/roles/ (Sem alterações) ---
+# --- Rota GET /api/users/roles/ ---
 @users_bp.route('/roles/', methods=['GET'])
 @jwt_required()
 def get_roles():
@@ -139,24 +88,23 @@ def get_roles():
         print(f"Erro ao buscar cargos (users.py GET /roles/): {e}")
         return jsonify({"error": "Erro interno ao buscar cargos."}), 500
 
-# --- Rota GET /api/users/<id> (Buscar Usuário Específico) (Sem alterações) ---
+# --- Rota GET /api/users/<id> (Buscar Usuário Específico) ---
 @users_bp.route('/<int:user_id>', methods=['GET'])
 @jwt_required()
 def get_user(user_id):
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    if user.role.name != 'Administrador' and str(current_user_id) != str(user_id):
+    if get_current_role() != 'Administrador' and str(current_user_id) != str(user_id):
         return jsonify({"error": "Acesso negado."}), 403
     user_to_get = User.query.get_or_404(user_id)
     return jsonify(user_to_get.to_dict(include_details=True)), 200
 
-# --- Rota PUT /api/users/<id> (Atualizar Usuário) (Sem alterações) ---
+# --- Rota PUT /api/users/<id> (Atualizar Usuário) ---
 @users_bp.route('/<int:user_id>', methods=['PUT'])
 @jwt_required()
 def update_user(user_id):
     current_user_id = get_jwt_identity()
-    user_making_request = User.query.get(current_user_id)
-    if user_making_request.role.name != 'Administrador' and str(current_user_id) != str(user_id):
+    is_admin = get_current_role() == 'Administrador'
+    if not is_admin and str(current_user_id) != str(user_id):
         return jsonify({"error": "Acesso negado: Você só pode editar seu próprio perfil."}), 403
     user_to_update = User.query.get_or_404(user_id)
     data = request.get_json()
@@ -176,20 +124,23 @@ def update_user(user_id):
         if data['rg'] and data['rg'] != user_to_update.rg and User.query.filter_by(rg=data['rg']).first():
              return jsonify({"error": "RG já cadastrado"}), 409
         user_to_update.rg = data['rg'] if data['rg'] else None
-    if 'role' in data and user_making_request.role.name == 'Administrador':
+    if 'role' in data and is_admin:
         role = Role.query.filter_by(name=data['role']).first()
         if not role:
              return jsonify({"error": f"Role '{data['role']}' inválida."}), 400
-        user_to_update.role_id = role.id
+        if role.id != user_to_update.role_id:
+            user_to_update.role_id = role.id
+            bump_token_version(user_to_update)
     try:
         db.session.commit()
+        invalidate_identity(user_id)
         return jsonify(user_to_update.to_dict(include_details=True)), 200
     except Exception as e:
         db.session.rollback()
         print(f"Erro ao atualizar usuário {user_id} (users.py PUT): {e}")
         return jsonify({"error": "Erro interno ao atualizar usuário."}), 500
 
-# --- Rota DELETE /api/users/<id> (Deletar Usuário) (Sem alterações) ---
+# --- Rota DELETE /api/users/<id> (Deletar Usuário) ---
 @users_bp.route('/<int:user_id>', methods=['DELETE'])
 @admin_required() 
 def delete_user(user_id):
@@ -201,6 +152,7 @@ def delete_user(user_id):
         AuditLog.query.filter_by(user_id=user_id).delete()
         db.session.delete(user)
         db.session.commit()
+        invalidate_identity(user_id)
         return '', 204
     except IntegrityError as e:
         db.session.rollback()
@@ -211,13 +163,12 @@ def delete_user(user_id):
         print(f"Erro ao deletar usuário {user_id} (users.py DELETE): {e}")
         return jsonify({"error": "Erro interno ao deletar o usuário."}), 500
 
-# --- ROTA: PUT /api/users/<id>/photo (Upload Foto de Perfil) (Sem alterações) ---
+# --- ROTA: PUT /api/users/<id>/photo (Upload Foto de Perfil) ---
 @users_bp.route('/<int:user_id>/photo', methods=['PUT'])
 @jwt_required()
 def update_user_photo(user_id):
     current_user_id = get_jwt_identity()
-    user_making_request = User.query.get(current_user_id)
-    if user_making_request.role.name != 'Administrador' and str(current_user_id) != str(user_id):
+    if get_current_role() != 'Administrador' and str(current_user_id) != str(user_id):
         return jsonify({"error": "Acesso negado: Você só pode editar sua própria foto."}), 403
     user = User.query.get_or_404(user_id)
     if 'photo' not in request.files:
@@ -227,13 +178,15 @@ def update_user_photo(user_id):
         return jsonify({"error": "Nenhum ficheiro selecionado."}), 400
     if file and allowed_file(file.filename):
         filename = secure_filename(f"user_{user.id}_{datetime.now().timestamp()}{os.path.splitext(file.filename)[1]}")
-        upload_folder = os.path.join(current_app.instance_path, 'uploads', 'profile_pics')
+        upload_folder = os.path.join(current_app.instance_path, PROFILE_UPLOAD_FOLDER)
         os.makedirs(upload_folder, exist_ok=True)
         filepath = os.path.join(upload_folder, filename)
         try:
             file.save(filepath)
             user.foto_path = filename 
+            user.foto_renditions = None
             db.session.commit()
+            agendar_renditions(PROFILE_UPLOAD_FOLDER, filename)
             return jsonify(user.to_dict()), 200
         except Exception as e:
             db.session.rollback()
@@ -0,0 +1,83 @@
+from .models import FinanceiroTransacoes, InventarioItens, User
+from .extensions import db
+from sqlalchemy.orm import aliased
+
+# --- Serializadores por projeção de colunas ---
+# Para listagens grandes: a query seleciona só as colunas da resposta e cada Row
+# vira dict direto, sem hidratar objetos ORM nem disparar lazy loads. Datas e
+# Decimal seguem crus e o provider JSON (json_provider.py) os converte no mesmo
+# formato dos to_dict(). As chaves e os valores padrão são resolvidos uma vez,
+# na criação da projeção.
+
+
+class Projecao:
+    def __init__(self, campos, padroes=None):
+        """campos: [(chave, expressão SQL)]; padroes: {chave: valor usado quando a coluna vem NULL}."""
+        self.chaves = tuple(chave for chave, _ in campos)
+        self.colunas = tuple(coluna for _, coluna in campos)
+        self.padroes = tuple((self.chaves.index(chave), valor) for chave, valor in (padroes or {}).items())
+
+    def query(self):
+        return db.session.query(*self.colunas)
+
+    def linha(self, row):
+        if not self.padroes:
+            return dict(zip(self.chaves, row))
+        valores = list(row)
+        for indice, padrao in self.padroes:
+            if valores[indice] is None:
+                valores[indice] = padrao
+        return dict(zip(self.chaves, valores))
+
+    def lista(self, rows):
+        if not self.padroes:
+            chaves = self.chaves
+            return [dict(zip(chaves, row)) for row in rows]
+        return [self.linha(row) for row in rows]
+
+
+# --- FinanceiroTransacoes (mesmas chaves de FinanceiroTransacoes.to_dict) ---
+_Criador = aliased(User)
+_Cancelador = aliased(User)
+
+TRANSACAO = Projecao([
+    ('id', FinanceiroTransacoes.id),
+    ('obra_id', FinanceiroTransacoes.obra_id),
+    ('tipo', FinanceiroTransacoes.tipo),
+    ('valor', FinanceiroTransacoes.valor),
+    ('descricao', FinanceiroTransacoes.descricao),
+    ('criado_por_nome', _Criador.nome),
+    ('criado_em', FinanceiroTransacoes.criado_em),
+    ('atualizado_em', FinanceiroTransacoes.atualizado_em),
+    ('status', FinanceiroTransacoes.status),
+    ('cancelado_por_nome', _Cancelador.nome),
+    ('cancelado_em', FinanceiroTransacoes.cancelado_em),
+    ('motivo_cancelamento', FinanceiroTransacoes.motivo_cancelamento),
+], padroes={'valor': '0.00', 'criado_por_nome': 'Sistema'})
+
+
+def query_transacoes():
+    return TRANSACAO.query().outerjoin(
+        _Criador, _Criador.id == FinanceiroTransacoes.criado_por
+    ).outerjoin(
+        _Cancelador, _Cancelador.id == FinanceiroTransacoes.cancelado_por
+    )
+
+
+# --- InventarioItens (mesmas chaves de InventarioItens.to_dict) ---
+ITEM_INVENTARIO = Projecao([
+    ('id', InventarioItens.id),
+    ('obra_id', InventarioItens.obra_id),
+    ('tipo', InventarioItens.tipo),
+    ('nome', InventarioItens.nome),
+    ('descricao', InventarioItens.descricao),
+    ('quantidade', InventarioItens.quantidade),
+    ('custo_unitario', InventarioItens.custo_unitario),
+    ('status_movimentacao', InventarioItens.status_movimentacao),
+    ('criado_em', InventarioItens.criado_em),
+    ('atualizado_em', InventarioItens.atualizado_em),
+], padroes={'custo_unitario': '0.00'})
+
+
+def query_itens_inventario():
+    return ITEM_INVENTARIO.query()
@@ -0,0 +1,250 @@
+from .models import DocumentoBlob, Documentos, UploadSessao
+from .extensions import db
+from flask import current_app
+from sqlalchemy import event, update, delete, select
+from sqlalchemy.orm import Session, object_session
+from datetime import datetime, timedelta
+import click
+import hashlib
+import os
+import re
+import uuid
+
+# --- Armazenamento de documentos endereçado por conteúdo ---
+# Cada arquivo é gravado uma única vez em uploads/documentos_obra/<sha256>;
+# documento_blobs.ref_count conta quantos Documentos apontam para ele.
+# Fluxo do upload: stream -> temporário (calculando o hash) -> referência no banco
+# -> commit -> publicar_blob() move o temporário para o nome final (ou o descarta,
+# se o conteúdo já existia). A remoção do último Documentos (inclusive em cascata,
+# ao remover a obra) apaga a linha do blob e, após o commit, o arquivo.
+
+DOCUMENTOS_UPLOAD_FOLDER = 'uploads/documentos_obra'
+CHUNK_SIZE = 1024 * 1024
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+_LIBERADOS_KEY = 'blobs_liberados'
+
+
+def pasta_blobs():
+    return os.path.join(current_app.instance_path, DOCUMENTOS_UPLOAD_FOLDER)
+
+
+def blob_path(sha256):
+    return os.path.join(pasta_blobs(), sha256)
+
+
+def caminho_temporario():
+    pasta = pasta_blobs()
+    os.makedirs(pasta, exist_ok=True)
+    return os.path.join(pasta, f'.tmp-{uuid.uuid4().hex}')
+
+
+def gravar_temporario(stream):
+    """
+    Copia o stream em blocos para um temporário na pasta dos blobs, calculando o SHA-256.
+    Retorna (caminho_temporario, sha256, tamanho). A memória usada é de um bloco.
+    """
+    temporario = caminho_temporario()
+    sha = hashlib.sha256()
+    tamanho = 0
+    try:
+        with open(temporario, 'wb') as destino:
+            while True:
+                bloco = stream.read(CHUNK_SIZE)
+                if not bloco:
+                    break
+                sha.update(bloco)
+                destino.write(bloco)
+                tamanho += len(bloco)
+    except Exception:
+        descartar_temporario(temporario)
+        raise
+    return temporario, sha.hexdigest(), tamanho
+
+
+def hash_arquivo(caminho):
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as origem:
+        for bloco in iter(lambda: origem.read(CHUNK_SIZE), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def descartar_temporario(temporario):
+    try:
+        os.remove(temporario)
+    except FileNotFoundError:
+        pass
+
+
+def _upsert_statement():
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Armazenamento de documentos não suportado no banco '{dialect}'.")
+    return insert(DocumentoBlob)
+
+
+def adicionar_referencia(sha256, tamanho):
+    """Cria o blob com ref_count=1 ou incrementa a contagem (na transação atual)."""
+    stmt = _upsert_statement().values(
+        sha256=sha256, tamanho=tamanho, ref_count=1, criado_em=datetime.now()
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['sha256'],
+        set_={'ref_count': DocumentoBlob.ref_count + 1}
+    )
+    db.session.execute(stmt)
+
+
+def publicar_blob(temporario, sha256):
+    """Depois do commit: move o temporário para o nome final, ou o descarta se o conteúdo já existe."""
+    if os.path.exists(blob_path(sha256)):
+        descartar_temporario(temporario)
+    else:
+        os.replace(temporario, blob_path(sha256))
+
+
+def blob_disponivel(sha256):
+    """Retorna o DocumentoBlob se o conteúdo já está armazenado (usado no upload pelo hash)."""
+    blob = db.session.get(DocumentoBlob, sha256)
+    if blob is None or blob.ref_count <= 0 or not os.path.exists(blob_path(sha256)):
+        return None
+    return blob
+
+
+# --- Uploads retomáveis ---
+# Os bytes de cada UploadSessao vão para .sessoes/<id>.part, na mesma pasta dos
+# blobs (o rename final não copia dados). O offset no banco é o último byte
+# confirmado ao cliente: uma parte interrompida é descartada truncando o arquivo.
+
+class ParteInvalidaError(ValueError):
+    pass
+
+
+def staging_path(sessao_id):
+    pasta = os.path.join(pasta_blobs(), '.sessoes')
+    os.makedirs(pasta, exist_ok=True)
+    return os.path.join(pasta, f'{sessao_id}.part')
+
+
+def anexar_parte(caminho, offset, stream, limite):
+    """
+    Grava o stream a partir de `offset`, em blocos, sem passar de `limite` bytes.
+    Retorna quantos bytes foram gravados.
+    """
+    modo = 'r+b' if os.path.exists(caminho) else 'wb'
+    gravados = 0
+    with open(caminho, modo) as destino:
+        destino.truncate(offset)
+        destino.seek(offset)
+        while True:
+            bloco = stream.read(CHUNK_SIZE)
+            if not bloco:
+                break
+            gravados += len(bloco)
+            if gravados > limite:
+                destino.truncate(offset)
+                raise ParteInvalidaError("A parte ultrapassa o tamanho declarado do arquivo.")
+            destino.write(bloco)
+    return gravados
+
+
+def limpar_sessoes_expiradas(horas):
+    limite = datetime.now() - timedelta(hours=horas)
+    removidas = 0
+    for sessao in UploadSessao.query.filter(UploadSessao.atualizado_em < limite).all():
+        descartar_temporario(staging_path(sessao.id))
+        db.session.delete(sessao)
+        removidas += 1
+    db.session.commit()
+    return removidas
+
+
+def _remover_arquivo(sha256):
+    """
+    Remove o arquivo de um blob sem referências. O arquivo é renomeado antes da
+    conferência final no banco: se um upload do mesmo conteúdo recriou a linha
+    nesse meio-tempo, o arquivo volta para o lugar.
+    """
+    final = blob_path(sha256)
+    lixo = f'{final}.removendo-{uuid.uuid4().hex}'
+    try:
+        os.replace(final, lixo)
+    except FileNotFoundError:
+        return
+    tabela = DocumentoBlob.__table__
+    with db.engine.connect() as conn:
+        em_uso = conn.execute(select(tabela.c.sha256).where(tabela.c.sha256 == sha256)).first()
+    if em_uso and not os.path.exists(final):
+        os.replace(lixo, final)
+    else:
+        os.remove(lixo)
+
+
+@event.listens_for(Documentos, 'after_delete')
+def _liberar_referencia(mapper, connection, target):
+    if not target.blob_sha256:
+        return
+    tabela = DocumentoBlob.__table__
+    connection.execute(
+        update(tabela).where(tabela.c.sha256 == target.blob_sha256).values(ref_count=tabela.c.ref_count - 1)
+    )
+    removidos = connection.execute(
+        delete(tabela).where(tabela.c.sha256 == target.blob_sha256, tabela.c.ref_count <= 0)
+    ).rowcount
+    if removidos:
+        object_session(target).info.setdefault(_LIBERADOS_KEY, set()).add(target.blob_sha256)
+
+
+@event.listens_for(Session, 'after_commit')
+def _remover_blobs_liberados(session):
+    for sha256 in session.info.pop(_LIBERADOS_KEY, ()):
+        try:
+            _remover_arquivo(sha256)
+        except Exception as e:
+            print(f"Aviso: Não foi possível remover o arquivo do documento {sha256}: {e}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_blobs_liberados(session):
+    session.info.pop(_LIBERADOS_KEY, None)
+
+
+def deduplicar_documentos():
+    """Converte documentos antigos (<uuid>.<ext>) para o armazenamento por hash. Retorna (convertidos, bytes_liberados)."""
+    convertidos = 0
+    liberados = 0
+    for doc in Documentos.query.filter(Documentos.blob_sha256 == None).all():
+        antigo = os.path.join(pasta_blobs(), doc.filepath)
+        if not os.path.isfile(antigo):
+            continue
+        sha256 = hash_arquivo(antigo)
+        tamanho = os.path.getsize(antigo)
+        adicionar_referencia(sha256, tamanho)
+        doc.blob_sha256 = sha256
+        doc.filepath = sha256
+        db.session.commit()
+        if os.path.exists(blob_path(sha256)):
+            os.remove(antigo)
+            liberados += tamanho
+        else:
+            os.replace(antigo, blob_path(sha256))
+        convertidos += 1
+    return convertidos, liberados
+
+
+def init_app(app):
+    @app.cli.command('dedupe-documentos')
+    def dedupe_documentos_command():
+        """Move os documentos antigos para o armazenamento por SHA-256, removendo cópias repetidas."""
+        convertidos, liberados = deduplicar_documentos()
+        click.echo(f"{convertidos} documentos convertidos; {liberados / (1024 * 1024):.1f} MB liberados.")
+
+    @app.cli.command('limpar-uploads')
+    @click.option('--horas', default=24, show_default=True, help='Remove sessões sem atividade há mais de N horas.')
+    def limpar_uploads_command(horas):
+        """Remove sessões de upload abandonadas e seus arquivos parciais."""
+        click.echo(f"{limpar_sessoes_expiradas(horas)} sessões de upload removidas.")
@@ -0,0 +1,74 @@
+from flask import Response, stream_with_context
+from datetime import datetime, date
+from decimal import Decimal
+import csv
+import io
+import json
+
+# --- Respostas em streaming (NDJSON / CSV) ---
+# Para relatórios grandes: a query é lida em lotes (yield_per, que no PostgreSQL usa
+# cursor no servidor) e cada linha é serializada e enviada em blocos de ~64 KB.
+# A memória fica constante e o primeiro byte sai logo após a primeira linha.
+# Um erro no meio do envio não tem mais como virar 500: no NDJSON vira uma última
+# linha {"error": ...}; no CSV a resposta termina ali.
+
+FORMATOS_STREAM = ('ndjson', 'csv')
+STREAM_BATCH = 1000
+BLOCO_BYTES = 64 * 1024
+
+
+def _valor(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def linhas_da_query(query, transformar=None):
+    """Itera a query em lotes devolvendo dicts (transformar(dict) pode ajustar cada linha)."""
+    for linha in query.execution_options(yield_per=STREAM_BATCH):
+        dados = linha._asdict()
+        yield transformar(dados) if transformar else dados
+
+
+def responder_stream(formato, colunas, linhas, nome_arquivo):
+    """Response em streaming com as `colunas` de cada dict de `linhas` (iterável preguiçoso)."""
+
+    def gerar():
+        buffer = io.StringIO()
+        writer = None
+        if formato == 'csv':
+            buffer.write('\ufeff')  # BOM: o Excel abre o UTF-8 com acentos corretamente
+            writer = csv.DictWriter(buffer, fieldnames=colunas, extrasaction='ignore')
+            writer.writeheader()
+        primeira = True
+        try:
+            for linha in linhas:
+                linha = {coluna: _valor(linha.get(coluna)) for coluna in colunas}
+                if writer:
+                    writer.writerow(linha)
+                else:
+                    buffer.write(json.dumps(linha, ensure_ascii=False))
+                    buffer.write('\n')
+                if primeira or buffer.tell() >= BLOCO_BYTES:
+                    primeira = False
+                    yield buffer.getvalue().encode('utf-8')
+                    buffer.seek(0)
+                    buffer.truncate()
+        except Exception as e:
+            print(f"Erro durante o streaming de {nome_arquivo}: {e}")
+            if not writer:
+                buffer.write(json.dumps({'error': 'Erro interno durante a geração do relatório.'}) + '\n')
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+
+    mimetype = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(gerar()),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename="{nome_arquivo}.{formato}"',
+            'X-Accel-Buffering': 'no',
+        }
+    )
@@ -0,0 +1,191 @@
+from .models import (
+    Obras, ObraFuncionarios, FinanceiroTransacoes, InventarioItens, ChecklistItem, Documentos, SyncRemocao
+)
+from .extensions import db
+from .pagination import encode_cursor, decode_cursor, keyset_after_asc, CursorInvalidoError
+from flask import current_app
+from sqlalchemy import delete
+from sqlalchemy.orm import joinedload, selectinload
+from collections import namedtuple
+from datetime import datetime, timedelta
+import click
+
+# --- Sincronização incremental (clientes offline) ---
+# Cada recurso tem uma coluna de atualização indexada junto com obra_id, e o cursor
+# guarda por recurso a última posição (atualização, id) entregue; as remoções vêm de
+# sync_remocoes. A entrega é "pelo menos uma vez": uma transação pode gravar o
+# horário antes e fazer commit depois da leitura, então só o que está mais de
+# SYNC_MARGEM_SEGUNDOS atrás do relógio da leitura é dado como visto. O cursor
+# guarda também essa posição segura; quando uma passada precisa de várias páginas
+# e entrega linhas dentro da margem, a passada seguinte recomeça da posição segura
+# (reentregando o que já foi), e não da última linha. O cliente aplica por id.
+
+SYNC_LIMITE = 500
+SYNC_LIMITE_MAX = 2000
+REMOVIDOS = 'removidos'
+
+Recurso = namedtuple('Recurso', ['nome', 'modelo', 'coluna_obra', 'coluna_versao', 'opcoes'])
+
+RECURSOS = (
+    Recurso('obras', Obras, Obras.id, Obras.atualizado_em, ()),
+    Recurso('funcionarios', ObraFuncionarios, ObraFuncionarios.obra_id, ObraFuncionarios.ultima_atualizacao,
+            (joinedload(ObraFuncionarios.user),)),
+    Recurso('financeiro', FinanceiroTransacoes, FinanceiroTransacoes.obra_id, FinanceiroTransacoes.atualizado_em,
+            (joinedload(FinanceiroTransacoes.criador), joinedload(FinanceiroTransacoes.cancelador))),
+    Recurso('inventario', InventarioItens, InventarioItens.obra_id, InventarioItens.atualizado_em, ()),
+    Recurso('checklist', ChecklistItem, ChecklistItem.obra_id, ChecklistItem.atualizado_em,
+            (joinedload(ChecklistItem.responsavel), selectinload(ChecklistItem.anexos))),
+    Recurso('documentos', Documentos, Documentos.obra_id, Documentos.atualizado_em,
+            (joinedload(Documentos.uploader),)),
+)
+NOMES_POSICAO = {recurso.nome for recurso in RECURSOS} | {REMOVIDOS}
+
+
+def _ids_ou_nada(valor):
+    return None if valor is None else [int(v) for v in valor]
+
+
+def _posicao(momento, ultimo_id):
+    return datetime.fromisoformat(momento), int(ultimo_id)
+
+
+def ler_cursor(cursor):
+    """
+    Retorna ({recurso: (posição, posição segura)}, obra_ids do escopo anterior ou None).
+    Posições são (datetime, id); no cursor, a segura só aparece quando é diferente.
+    """
+    posicoes_json, obras = decode_cursor(cursor, dict, _ids_ou_nada)
+    posicoes = {}
+    try:
+        for nome, valores in posicoes_json.items():
+            if nome not in NOMES_POSICAO or len(valores) not in (2, 4):
+                raise ValueError
+            posicao = _posicao(*valores[:2])
+            segura = _posicao(*valores[2:]) if len(valores) == 4 else posicao
+            if segura > posicao:
+                raise ValueError
+            posicoes[nome] = (posicao, segura)
+    except (ValueError, TypeError):
+        raise CursorInvalidoError("Cursor inválido.")
+    return posicoes, obras
+
+
+def _escrever_posicao(posicao, segura):
+    valores = [posicao[0].isoformat(), posicao[1]]
+    if segura != posicao:
+        valores += [segura[0].isoformat(), segura[1]]
+    return valores
+
+
+def obras_da_identidade(identity):
+    """Ids das obras visíveis ao usuário e o escopo guardado no cursor (None = todas as obras)."""
+    query = db.session.query(Obras.id)
+    escopo = None
+    if identity.role not in ('Administrador', 'Gestor'):
+        if identity.obras is not None:
+            query = query.filter(Obras.id.in_(identity.obras))
+        else:
+            query = query.filter(Obras.id.in_(
+                db.session.query(ObraFuncionarios.obra_id).filter(ObraFuncionarios.user_id == identity.id)
+            ))
+    obra_ids = [row[0] for row in query.order_by(Obras.id)]
+    if identity.role not in ('Administrador', 'Gestor'):
+        escopo = obra_ids
+    return obra_ids, escopo
+
+
+def _pagina(query, colunas, posicao, limite):
+    if posicao is not None:
+        query = query.filter(keyset_after_asc(colunas, posicao))
+    linhas = query.order_by(*colunas).limit(limite + 1).all()
+    return linhas[:limite], len(linhas) > limite
+
+
+def _proxima_posicao(ultima, mais, anterior, marca):
+    """
+    (posição, posição segura) depois de uma página. `anterior` é o par do cursor
+    (None numa sincronização completa); `ultima` é a última linha entregue.
+    Enquanto a passada só entregou linhas mais velhas que a margem, a posição segura
+    acompanha a leitura; depois que passou da margem, fica parada até a passada
+    terminar, e a próxima recomeça dela.
+    """
+    posicao, segura = anterior if anterior else (None, None)
+    if posicao == segura:
+        # Tudo até a posição foi lido e já estava visível: avança até onde a leitura cobriu,
+        # limitada à margem (o que está dentro dela ainda pode receber commits)
+        coberta = ultima if mais else None
+        limite = min(coberta, (marca, 0)) if coberta else (marca, 0)
+        segura = max(segura, limite) if segura else limite
+    if mais:
+        return ultima, segura
+    return segura, segura
+
+
+def sincronizar(identity, cursor=None, limite=SYNC_LIMITE):
+    """
+    Alterações e remoções desde o cursor nas obras visíveis ao usuário.
+    Sem cursor (ou com o escopo ampliado, ou cursor mais velho que a retenção das
+    remoções) devolve tudo com completo=True: o cliente descarta o que tinha.
+    """
+    agora = datetime.now()
+    marca = agora - timedelta(seconds=current_app.config['SYNC_MARGEM_SEGUNDOS'])
+    retencao = agora - timedelta(days=current_app.config['SYNC_REMOCOES_DIAS'])
+    obra_ids, escopo = obras_da_identidade(identity)
+
+    posicoes, completo = {}, True
+    if cursor:
+        posicoes, escopo_anterior = ler_cursor(cursor)
+        obras_novas = escopo_anterior is not None and set(obra_ids) - set(escopo_anterior)
+        expirado = REMOVIDOS in posicoes and posicoes[REMOVIDOS][1][0] < retencao
+        completo = bool(obras_novas or expirado)
+    if completo:
+        # As remoções anteriores não interessam a quem recebe tudo de novo
+        posicoes = {REMOVIDOS: ((marca, 0), (marca, 0))}
+
+    alteracoes, novas_posicoes, has_more = {}, {}, False
+    for recurso in RECURSOS:
+        colunas = (recurso.coluna_versao, recurso.modelo.id)
+        query = recurso.modelo.query.options(*recurso.opcoes).filter(recurso.coluna_obra.in_(obra_ids))
+        anterior = posicoes.get(recurso.nome)
+        linhas, mais = _pagina(query, colunas, anterior[0] if anterior else None, limite)
+        alteracoes[recurso.nome] = [linha.to_dict() for linha in linhas]
+        ultima = (getattr(linhas[-1], recurso.coluna_versao.key), linhas[-1].id) if linhas else None
+        novas_posicoes[recurso.nome] = _proxima_posicao(ultima, mais, anterior, marca)
+        has_more = has_more or mais
+
+    query = SyncRemocao.query.filter(SyncRemocao.obra_id.in_(obra_ids))
+    anterior = posicoes.get(REMOVIDOS)
+    removidos, mais = _pagina(query, (SyncRemocao.removido_em, SyncRemocao.id), anterior[0] if anterior else None, limite)
+    ultima = (removidos[-1].removido_em, removidos[-1].id) if removidos else None
+    novas_posicoes[REMOVIDOS] = _proxima_posicao(ultima, mais, anterior, marca)
+    has_more = has_more or mais
+
+    return {
+        'completo': completo,
+        'obras_visiveis': obra_ids,
+        'alteracoes': alteracoes,
+        'removidos': [r.to_dict() for r in removidos],
+        'has_more': has_more,
+        'next_cursor': encode_cursor(
+            {nome: _escrever_posicao(*par) for nome, par in novas_posicoes.items()},
+            escopo
+        ),
+    }
+
+
+def limpar_remocoes(dias):
+    """Apaga as remoções mais velhas que `dias`; cursores anteriores recebem tudo de novo."""
+    limite = datetime.now() - timedelta(days=dias)
+    tabela = SyncRemocao.__table__
+    resultado = db.session.execute(delete(tabela).where(tabela.c.removido_em < limite))
+    db.session.commit()
+    return resultado.rowcount
+
+
+def init_app(app):
+    @app.cli.command('limpar-remocoes-sync')
+    @click.option('--dias', default=None, type=int, help='Padrão: SYNC_REMOCOES_DIAS.')
+    def limpar_remocoes_command(dias):
+        """Remove os registros de remoção (tombstones) da sincronização já fora da retenção."""
+        dias = dias or app.config['SYNC_REMOCOES_DIAS']
+        click.echo(f"{limpar_remocoes(dias)} registros de remoção apagados (mais de {dias} dias).")
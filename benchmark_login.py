@@ -0,0 +1,78 @@
+"""
+Benchmark de throughput do login (POST /api/auth/login).
+
+Cria um banco SQLite temporário com um usuário de teste e dispara logins
+com concorrência 1, 8 e 32, reportando p50/p99 de latência e logins/s.
+
+Uso: python benchmark_login.py [--requests 64] [--rounds 12]
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend import create_app, db
+from backend.config import Config
+from backend.models import Role, User
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100.0 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=64, help='logins por nível de concorrência')
+    parser.add_argument('--rounds', type=int, default=Config.BCRYPT_LOG_ROUNDS, help='BCRYPT_LOG_ROUNDS')
+    args = parser.parse_args()
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+        BCRYPT_LOG_ROUNDS = args.rounds
+        # Os logins concorrentes rodam em threads, como num worker gthread
+        BCRYPT_VERIFY_POOL = True
+        BCRYPT_VERIFY_MAX_PENDING = 1024
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        role = Role(name='Prestador')
+        db.session.add(role)
+        db.session.flush()
+        user = User(username='bench', nome='Bench', email='bench@local', role_id=role.id)
+        user.set_password('bench123')
+        db.session.add(user)
+        db.session.commit()
+
+    def login(_):
+        client = app.test_client()
+        inicio = time.perf_counter()
+        resp = client.post('/api/auth/login', json={'username': 'bench', 'password': 'bench123'})
+        duracao = time.perf_counter() - inicio
+        return duracao, resp.status_code
+
+    print(f"BCRYPT_LOG_ROUNDS={args.rounds}, {args.requests} logins por nível")
+    for concorrencia in (1, 8, 32):
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concorrencia) as pool:
+            resultados = list(pool.map(login, range(args.requests)))
+        total = time.perf_counter() - inicio
+        latencias = [d * 1000 for d, status in resultados if status == 200]
+        erros = len(resultados) - len(latencias)
+        if not latencias:
+            print(f"concorrência={concorrencia:>2}  todos os logins falharam")
+            continue
+        print(
+            f"concorrência={concorrencia:>2}  "
+            f"p50={percentil(latencias, 50):7.1f}ms  "
+            f"p99={percentil(latencias, 99):7.1f}ms  "
+            f"{len(latencias) / total:6.1f} logins/s  "
+            f"erros={erros}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Benchmark da serialização das listagens grandes.
+
+Cria um banco SQLite temporário com N transações financeiras e N itens de
+inventário numa obra e compara, para cada listagem, o caminho antigo
+(objetos ORM + to_dict()) com a projeção de colunas (backend/serializers.py),
+serializando com o json padrão e com orjson. Reporta a mediana de cada etapa
+e confere que todas as combinações produzem o mesmo JSON.
+
+Uso: python benchmark_serializacao.py [--linhas 10000] [--repeticoes 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy.orm import joinedload
+
+from backend import create_app, db
+from backend.config import Config
+from backend.json_provider import OrjsonProvider, StdlibJSONProvider, orjson
+from backend.models import FinanceiroTransacoes, InventarioItens, Obras, Role, User
+from backend.serializers import ITEM_INVENTARIO, TRANSACAO, query_itens_inventario, query_transacoes
+
+
+def popular(linhas):
+    role = Role(name='Administrador')
+    db.session.add(role)
+    db.session.flush()
+    user = User(username='bench', nome='Bench', email='bench@local', role_id=role.id)
+    user.set_password('bench123')
+    obra = Obras(nome='Obra Benchmark')
+    db.session.add_all([user, obra])
+    db.session.flush()
+
+    base = datetime(2024, 1, 1)
+    db.session.execute(FinanceiroTransacoes.__table__.insert(), [
+        {
+            'obra_id': obra.id,
+            'tipo': 'saida' if i % 3 else 'entrada',
+            'valor': Decimal(i % 5000) + Decimal('0.25'),
+            'descricao': f'Lançamento {i}',
+            'criado_por': user.id if i % 4 else None,
+            'criado_em': base + timedelta(minutes=i),
+            'atualizado_em': base + timedelta(minutes=i),
+            'status': 'ativo',
+        }
+        for i in range(linhas)
+    ])
+    db.session.execute(InventarioItens.__table__.insert(), [
+        {
+            'obra_id': obra.id,
+            'tipo': 'Material' if i % 2 else 'Ferramenta',
+            'nome': f'Item {i:05d}',
+            'descricao': 'Descrição do item',
+            'quantidade': i % 100,
+            'custo_unitario': Decimal(i % 300) + Decimal('0.90'),
+            'status_movimentacao': 'Em Estoque',
+            'criado_em': base + timedelta(minutes=i),
+        }
+        for i in range(linhas)
+    ])
+    db.session.commit()
+    return obra.id
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--linhas', type=int, default=10000, help='linhas por tabela')
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+        BCRYPT_LOG_ROUNDS = 4
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        obra_id = popular(args.linhas)
+
+    ordem_transacoes = (FinanceiroTransacoes.status.asc(), FinanceiroTransacoes.criado_em.desc())
+    listagens = {
+        'financeiro': {
+            'ORM + to_dict': lambda: [t.to_dict() for t in FinanceiroTransacoes.query.options(
+                joinedload(FinanceiroTransacoes.criador), joinedload(FinanceiroTransacoes.cancelador)
+            ).filter_by(obra_id=obra_id).order_by(*ordem_transacoes).all()],
+            'projeção': lambda: TRANSACAO.lista(query_transacoes().filter(
+                FinanceiroTransacoes.obra_id == obra_id
+            ).order_by(*ordem_transacoes).all()),
+        },
+        'inventario': {
+            'ORM + to_dict': lambda: [i.to_dict() for i in InventarioItens.query.filter_by(
+                obra_id=obra_id
+            ).order_by(InventarioItens.nome).all()],
+            'projeção': lambda: ITEM_INVENTARIO.lista(query_itens_inventario().filter(
+                InventarioItens.obra_id == obra_id
+            ).order_by(InventarioItens.nome).all()),
+        },
+    }
+    providers = {'json padrão': StdlibJSONProvider(app)}
+    if orjson is not None:
+        providers['orjson'] = OrjsonProvider(app)
+    else:
+        print("orjson não instalado: medindo só o json padrão")
+
+    print(f"{args.linhas} linhas por listagem, mediana de {args.repeticoes} repetições")
+    for nome, caminhos in listagens.items():
+        print(f"\n{nome}")
+        saidas = []
+        for caminho, montar in caminhos.items():
+            for nome_provider, provider in providers.items():
+                tempos_montar, tempos_serializar = [], []
+                for _ in range(args.repeticoes):
+                    with app.app_context():
+                        inicio = time.perf_counter()
+                        dados = montar()
+                        meio = time.perf_counter()
+                        corpo = provider.response(dados).get_data()
+                        fim = time.perf_counter()
+                    tempos_montar.append((meio - inicio) * 1000)
+                    tempos_serializar.append((fim - meio) * 1000)
+                montar_ms = statistics.median(tempos_montar)
+                serializar_ms = statistics.median(tempos_serializar)
+                saidas.append(json.loads(corpo))
+                print(
+                    f"  {caminho:<14} {nome_provider:<12} "
+                    f"consulta+dicts={montar_ms:7.1f}ms  "
+                    f"serialização={serializar_ms:7.1f}ms  "
+                    f"total={montar_ms + serializar_ms:7.1f}ms  "
+                    f"{len(corpo) / 1024:7.0f} KB"
+                )
+        identicas = all(saida == saidas[0] for saida in saidas[1:])
+        print(f"  saídas idênticas: {'sim' if identicas else 'NÃO'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Teste de estresse do orcamento_atual sob escrita concorrente.
+
+Cria um banco (SQLite temporário, ou o indicado em --database-url, que precisa
+estar vazio) com uma obra e dispara, em várias threads, lançamentos de entrada e
+saída pela API, cancelando parte deles logo em seguida. Ao final confere que
+orcamento_atual == orcamento_inicial + entradas ativas - saídas ativas, isto é,
+que nenhuma atualização concorrente do saldo se perdeu. Requisições que falharem
+(ex: "database is locked" no SQLite) são só contadas: o rollback delas não pode
+deixar o saldo divergente.
+
+No SQLite as transações de escrita já são serializadas pelo banco, então o teste
+só exercita de verdade a corrida no PostgreSQL (--database-url); o SQLite serve
+para conferir o script e a contabilidade dos cancelamentos.
+
+Uso: python check_orcamento_concorrente.py [--threads 16] [--lancamentos 50] [--database-url URL]
+Sai com código 1 se o saldo divergir.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from sqlalchemy import func
+
+from backend import create_app, db
+from backend.config import Config
+from backend.models import FinanceiroTransacoes, Obras, Role, User
+
+ORCAMENTO_INICIAL = Decimal('100000.00')
+
+
+def popular():
+    role = Role(name='Administrador')
+    db.session.add(role)
+    db.session.flush()
+    user = User(username='estresse', nome='Estresse', email='estresse@local', role_id=role.id)
+    user.set_password('estresse123')
+    obra = Obras(nome='Obra Estresse', orcamento_inicial=ORCAMENTO_INICIAL, orcamento_atual=ORCAMENTO_INICIAL)
+    db.session.add_all([user, obra])
+    db.session.commit()
+    return obra.id
+
+
+def saldo_esperado(obra_id):
+    soma = dict(
+        db.session.query(FinanceiroTransacoes.tipo, func.coalesce(func.sum(FinanceiroTransacoes.valor), 0))
+        .filter(FinanceiroTransacoes.obra_id == obra_id, FinanceiroTransacoes.status == 'ativo')
+        .group_by(FinanceiroTransacoes.tipo)
+        .all()
+    )
+    return ORCAMENTO_INICIAL + Decimal(soma.get('entrada', 0)) - Decimal(soma.get('saida', 0))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--lancamentos', type=int, default=50, help='lançamentos por thread')
+    parser.add_argument('--cancelar', type=float, default=0.3, help='fração dos lançamentos cancelados')
+    parser.add_argument('--database-url', default=None, help='padrão: SQLite temporário')
+    args = parser.parse_args()
+
+    class EstresseConfig(Config):
+        SQLALCHEMY_DATABASE_URI = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'estresse.db')
+        BCRYPT_LOG_ROUNDS = 4
+        AUDIT_ASYNC = False
+
+    app = create_app(EstresseConfig)
+    with app.app_context():
+        db.create_all()
+        obra_id = popular()
+
+    client = app.test_client()
+    resp = client.post('/api/auth/login', json={'username': 'estresse', 'password': 'estresse123'})
+    headers = {'Authorization': f"Bearer {resp.get_json()['access_token']}"}
+
+    def trabalhador(semente):
+        sorteio = random.Random(semente)
+        client = app.test_client()
+        status = Counter()
+        for _ in range(args.lancamentos):
+            valor = f"{sorteio.randint(1, 500000) / 100:.2f}"
+            tipo = sorteio.choice(('entrada', 'saida'))
+            resp = client.post(f'/api/obras/{obra_id}/financeiro/', headers=headers,
+                               json={'tipo': tipo, 'valor': valor, 'descricao': 'estresse'})
+            status[f'criar {resp.status_code}'] += 1
+            if resp.status_code == 201 and sorteio.random() < args.cancelar:
+                transacao_id = resp.get_json()['id']
+                resp = client.put(f'/api/financeiro/{transacao_id}/cancelar/', headers=headers,
+                                  json={'motivo': 'estresse'})
+                status[f'cancelar {resp.status_code}'] += 1
+        return status
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        contagens = sum(pool.map(trabalhador, range(args.threads)), Counter())
+    duracao = time.perf_counter() - inicio
+
+    with app.app_context():
+        atual = db.session.get(Obras, obra_id).orcamento_atual
+        esperado = saldo_esperado(obra_id)
+
+    print(f"{args.threads} threads x {args.lancamentos} lançamentos em {duracao:.1f}s")
+    for chave, total in sorted(contagens.items()):
+        print(f"  {chave}: {total}")
+    print(f"orcamento_atual={atual}  esperado={esperado}")
+    if Decimal(atual) != esperado:
+        print(f"DIVERGÊNCIA: {Decimal(atual) - esperado}")
+        sys.exit(1)
+    print("Saldo consistente.")
+
+
+if __name__ == '__main__':
+    main()
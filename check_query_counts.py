@@ -0,0 +1,179 @@
+"""
+Verificação do número de consultas das rotas de listagem (regressões N+1).
+
+Chama cada rota de ROTAS duas vezes: com os dados mínimos de check_query_plans.py
+e depois de acrescentar LINHAS_EXTRAS linhas em cada tabela listada, cada uma
+ligada a um usuário diferente (criador, responsável, anexos, fotos...). Conta
+todas as instruções SQL executadas (depois de uma chamada de aquecimento, que
+preenche os caches do processo) e sai com código 1 se, em alguma das duas
+rodadas, o total for diferente do fixado em ROTAS. Um lazy load por linha faz o
+total crescer na segunda rodada.
+
+Se uma mudança alterar de propósito o número de consultas de uma rota, ajuste o
+valor em ROTAS no mesmo commit.
+
+Uso: python check_query_counts.py [--database-url postgresql://...] [-v]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event
+
+from backend import create_app, db
+from backend.config import Config
+from backend.estoque import registrar_saldo_inicial
+from backend.models import (
+    AuditLog, ChecklistAnexo, ChecklistItem, Documentos, FinanceiroTransacoes, Imovel, ImovelFotos,
+    InventarioItens, ObraFuncionarios, Obras, Role, User
+)
+from backend.pagination import encode_cursor
+from backend.sync import NOMES_POSICAO
+from check_query_plans import preparar_dados
+
+LINHAS_EXTRAS = 5
+
+# (usuário, rota, consultas esperadas). {obra} e {sync} como em check_query_plans.py.
+ROTAS = [
+    ('admin', '/api/obras/', 1),
+    ('admin', '/api/obras/?limit=20', 1),
+    ('prestador', '/api/obras/', 1),
+    ('admin', '/api/obras/{obra}/funcionarios/', 2),
+    ('admin', '/api/obras/{obra}/audit_logs/?limit=20', 3),
+    ('admin', '/api/obras/{obra}/financeiro/', 3),
+    ('admin', '/api/obras/{obra}/inventario/', 3),
+    ('admin', '/api/obras/{obra}/inventario/movimentos/?limit=20', 4),
+    ('admin', '/api/obras/{obra}/checklist/', 4),
+    ('admin', '/api/obras/{obra}/documentos/', 3),
+    ('admin', '/api/reports/global-inventory/', 2),
+    ('admin', '/api/reports/global-checklist/', 2),
+    ('prestador', '/api/reports/global-checklist/', 3),
+    ('admin', '/api/reports/global-documents/', 1),
+    ('admin', '/api/marketplace/', 2),
+    ('admin', '/api/marketplace/busca/?limit=20', 1),
+    ('admin', '/api/sync/', 9),
+    ('admin', '/api/sync/?since={sync}', 9),
+    ('prestador', '/api/sync/?since={sync}', 9),
+    ('admin', '/api/users/', 1),
+]
+
+
+def acrescentar_dados(obra_id, quantidade):
+    """Acrescenta `quantidade` linhas em cada tabela listada, cada uma com o seu próprio usuário."""
+    role = Role.query.filter_by(name='Prestador').first()
+    prestador = User.query.filter_by(username='prestador_plano').first()
+    for i in range(quantidade):
+        user = User(username=f'contagem_{i}', nome=f'Contagem {i}', email=f'contagem{i}@local', role_id=role.id)
+        user.set_password('contagem123')
+        outra_obra = Obras(nome=f'Obra Contagem {i}', status='Em Andamento')
+        db.session.add_all([user, outra_obra])
+        db.session.flush()
+        outra_obra.criado_por = user.id
+        checklist = ChecklistItem(obra_id=obra_id, titulo=f'Tarefa {i}', responsavel_user_id=user.id,
+                                  prazo=date.today())
+        imovel = Imovel(titulo=f'Imóvel {i}', endereco='Rua B', bairro='Centro', metragem='80m²',
+                        criado_por=user.id, criado_em=datetime.now())
+        item = InventarioItens(obra_id=obra_id, nome=f'Item {i}', quantidade=i + 1)
+        db.session.add_all([
+            checklist, imovel, item,
+            ObraFuncionarios(obra_id=obra_id, user_id=user.id, cargo='Servente'),
+            ObraFuncionarios(obra_id=outra_obra.id, user_id=prestador.id, cargo='Pedreiro'),
+            FinanceiroTransacoes(obra_id=obra_id, tipo='entrada', valor=10 + i, criado_por=user.id,
+                                 status='cancelado', cancelado_por=user.id, cancelado_em=datetime.now()),
+            Documentos(obra_id=obra_id, filename=f'{i}.pdf', filepath=f'{i}.pdf', uploaded_by=user.id),
+            AuditLog(user_id=user.id, action_type='update', resource_type='Obras', resource_id=obra_id,
+                     timestamp=datetime.now()),
+        ])
+        db.session.flush()
+        db.session.add_all([
+            ChecklistAnexo(checklist_item_id=checklist.id, filename=f'{i}.jpg'),
+            ImovelFotos(imovel_id=imovel.id, filename=f'{i}.jpg'),
+        ])
+        registrar_saldo_inicial(item, user.id)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', help='banco vazio e descartável (padrão: SQLite temporário)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='mostra as consultas de cada rota')
+    args = parser.parse_args()
+
+    class ContagemConfig(Config):
+        SQLALCHEMY_DATABASE_URI = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'contagem.db')
+        AUDIT_ASYNC = False
+        BCRYPT_LOG_ROUNDS = 4
+
+    app = create_app(ContagemConfig)
+    with app.app_context():
+        db.create_all()
+        with contextlib.redirect_stdout(io.StringIO()):
+            obra_id, _ = preparar_dados()
+
+    client = app.test_client()
+    tokens = {}
+    for usuario, username, senha in (('admin', 'admin', 'admin123'), ('prestador', 'prestador_plano', 'prestador123')):
+        resp = client.post('/api/auth/login', json={'username': username, 'password': senha})
+        tokens[usuario] = {'Authorization': 'Bearer ' + resp.get_json()['access_token']}
+
+    ontem = (datetime.now() - timedelta(days=1)).isoformat()
+    cursor_sync = encode_cursor({nome: [ontem, 0] for nome in NOMES_POSICAO}, None)
+
+    capturadas = []
+
+    def capturar(conn, cursor, statement, parameters, context, executemany):
+        capturadas.append(statement)
+
+    def contar(usuario, url):
+        capturadas.clear()
+        event.listen(db.engine, 'before_cursor_execute', capturar)
+        try:
+            # buffered: rotas em streaming só consultam o banco enquanto o corpo é lido
+            resp = client.get(url, headers=tokens[usuario], buffered=True)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capturar)
+        return resp.status_code, list(capturadas)
+
+    falhas = 0
+    with app.app_context():
+        medidas = {}
+        for rodada in ('mínima', 'ampliada'):
+            if rodada == 'ampliada':
+                acrescentar_dados(obra_id, LINHAS_EXTRAS)
+            for usuario, rota, _ in ROTAS:
+                url = rota.format(obra=obra_id, sync=cursor_sync)
+                # A primeira chamada preenche os caches do processo (versões, tabelas de arquivo)
+                contar(usuario, url)
+                medidas[(usuario, rota, rodada)] = contar(usuario, url)
+
+        for usuario, rota, esperado in ROTAS:
+            url = rota.format(obra=obra_id, sync='<cursor>')
+            (status_min, sql_min), (status_amp, sql_amp) = (
+                medidas[(usuario, rota, 'mínima')], medidas[(usuario, rota, 'ampliada')]
+            )
+            if status_min != 200 or status_amp != 200:
+                print(f"ERRO  {usuario:<9} {url}: status {status_min}/{status_amp}")
+                falhas += 1
+                continue
+            if len(sql_min) == len(sql_amp) == esperado:
+                print(f"OK    {usuario:<9} {url} ({esperado} consultas)")
+            else:
+                falhas += 1
+                print(f"FALHA {usuario:<9} {url}: esperado {esperado}, "
+                      f"medido {len(sql_min)} com dados mínimos e {len(sql_amp)} com +{LINHAS_EXTRAS} linhas")
+            if args.verbose or len(sql_amp) != esperado:
+                for statement in sql_amp:
+                    print(f"      {' '.join(statement.split())[:200]}")
+
+    if falhas:
+        print(f"\n{falhas} rota(s) com número de consultas diferente do esperado.")
+        sys.exit(1)
+    print("\nNúmero de consultas dentro do esperado em todas as rotas.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+Verificação dos planos de consulta das rotas de listagem e relatórios.
+
+Chama cada rota de listagem/relatório, captura os SELECTs executados e roda
+EXPLAIN em cada um (EXPLAIN QUERY PLAN no SQLite, EXPLAIN no PostgreSQL).
+Sai com código 1 se alguma consulta fizer varredura completa de uma tabela
+fora das exceções listadas em FULL_SCANS_PERMITIDOS.
+
+Por padrão usa um banco SQLite temporário. Para checar no PostgreSQL, passe
+--database-url com um banco VAZIO e descartável (as tabelas são criadas nele).
+
+Uso: python check_query_plans.py [--database-url postgresql://...] [-v]
+"""
+import argparse
+import contextlib
+import io
+import os
+import re
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event
+
+from backend import create_app, db
+from backend.config import Config
+from backend.pagination import encode_cursor
+from backend.sync import NOMES_POSICAO
+from backend.models import (
+    ChecklistItem, Documentos, FinanceiroTransacoes, Imovel, InventarioItens,
+    ObraFuncionarios, Obras, Role, User
+)
+from backend.seed import seed_data
+
+# (usuário, rota). {obra} e {item} são trocados pelos ids da obra e do item de teste.
+ROTAS = [
+    ('admin', '/api/obras/'),
+    ('admin', '/api/obras/?limit=20'),
+    ('admin', '/api/obras/?status=Em%20Andamento&limit=20'),
+    ('admin', '/api/obras/?is_stock_default=false&limit=20'),
+    ('admin', '/api/obras/?nome=Obra&limit=20'),
+    ('prestador', '/api/obras/'),
+    ('admin', '/api/obras/{obra}/'),
+    ('admin', '/api/obras/{obra}/dashboard/'),
+    ('admin', '/api/obras/{obra}/funcionarios/'),
+    ('admin', '/api/obras/{obra}/audit_logs/?limit=20'),
+    ('admin', '/api/obras/{obra}/financeiro/'),
+    ('admin', '/api/obras/{obra}/inventario/'),
+    ('admin', '/api/obras/{obra}/inventario/movimentos/?limit=20'),
+    ('admin', '/api/inventario/{item}/movimentos/?limit=20'),
+    ('admin', '/api/inventario/localizar/?nome=Cimento'),
+    ('admin', '/api/obras/{obra}/checklist/'),
+    ('admin', '/api/obras/{obra}/documentos/'),
+    ('admin', '/api/reports/kpis/'),
+    ('admin', '/api/reports/cashflow/'),
+    ('admin', '/api/reports/cashflow/?obra_id={obra}'),
+    ('admin', '/api/reports/global-inventory/'),
+    ('admin', '/api/reports/global-inventory/?format=ndjson'),
+    ('admin', '/api/reports/inventory-valuation/'),
+    ('admin', '/api/reports/global-checklist/'),
+    ('prestador', '/api/reports/global-checklist/'),
+    ('prestador', '/api/reports/global-checklist/?format=csv'),
+    ('admin', '/api/reports/global-documents/'),
+    ('admin', '/api/reports/global-documents/?format=ndjson'),
+    ('admin', '/api/marketplace/'),
+    ('admin', '/api/marketplace/busca/?limit=20'),
+    ('admin', '/api/marketplace/busca/?status=%C3%80%20venda&limit=20'),
+    ('admin', '/api/marketplace/busca/?bairro=Centro&limit=20'),
+    ('admin', '/api/marketplace/busca/?cep=123&limit=20'),
+    ('admin', '/api/marketplace/busca/?metragem_min=50&metragem_max=200&limit=20'),
+    ('admin', '/api/marketplace/busca/?q=casa&limit=20'),
+    ('admin', '/api/sync/'),
+    ('admin', '/api/sync/?since={sync}'),
+    ('prestador', '/api/sync/?since={sync}'),
+    ('admin', '/api/users/'),
+    ('admin', '/api/users/roles/'),
+]
+
+# Tabelas pequenas/de configuração, que podem ser lidas inteiras em qualquer rota
+TABELAS_PEQUENAS = {'roles', 'data_versions'}
+
+# Rotas que, por definição, leem a tabela inteira (chave: rota sem ou com a query string)
+FULL_SCANS_PERMITIDOS = {
+    '/api/users/': {'users'},
+    # Administrador/Gestor sincronizam todas as obras: a lista de ids vem de obras inteira
+    '/api/sync/': {'obras'},
+    # LIKE '%termo%': no PostgreSQL usa o índice de trigramas, no SQLite varre imoveis
+    '/api/marketplace/busca/?q=casa&limit=20': {'imoveis'},
+}
+
+SQLITE_SCAN_RE = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+POSTGRES_SCAN_RE = re.compile(r'Seq Scan on (\w+)')
+
+
+def preparar_dados():
+    """Cria uma obra com um registro em cada tabela filha e um Prestador vinculado. Retorna (obra_id, item_id)."""
+    seed_data()
+    admin = User.query.filter_by(username='admin').first()
+    role = Role.query.filter_by(name='Prestador').first()
+    prestador = User(username='prestador_plano', nome='Prestador', email='prestador@plano.local', role_id=role.id)
+    prestador.set_password('prestador123')
+    obra = Obras(nome='Obra Plano', status='Em Andamento', criado_por=admin.id)
+    db.session.add_all([prestador, obra])
+    db.session.flush()
+    db.session.add_all([
+        ObraFuncionarios(obra_id=obra.id, user_id=prestador.id, cargo='Pedreiro'),
+        FinanceiroTransacoes(obra_id=obra.id, tipo='saida', valor=10, criado_por=admin.id),
+        ChecklistItem(obra_id=obra.id, titulo='Tarefa', responsavel_user_id=prestador.id, prazo=date.today()),
+        Documentos(obra_id=obra.id, filename='a.pdf', filepath='a.pdf', uploaded_by=admin.id),
+        Imovel(titulo='Imóvel', endereco='Rua A', bairro='Centro', cep='12345-678', metragem='120m²',
+               criado_por=admin.id, criado_em=datetime.now()),
+    ])
+    item = InventarioItens(obra_id=obra.id, nome='Cimento', quantidade=1)
+    db.session.add(item)
+    db.session.commit()
+    return obra.id, item.id
+
+
+def varreduras_completas(conn, dialect, statement, parameters):
+    if dialect == 'sqlite':
+        linhas = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+        detalhes = [linha[-1] for linha in linhas]
+        return {m.group(1) for d in detalhes for m in [SQLITE_SCAN_RE.match(d)] if m}, detalhes
+    conn.exec_driver_sql('SET enable_seqscan = off')
+    detalhes = [linha[0] for linha in conn.exec_driver_sql('EXPLAIN ' + statement, parameters).all()]
+    return {m.group(1) for d in detalhes for m in [POSTGRES_SCAN_RE.search(d)] if m}, detalhes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', help='banco vazio e descartável (padrão: SQLite temporário)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='mostra o plano de todas as consultas')
+    args = parser.parse_args()
+
+    class PlanConfig(Config):
+        SQLALCHEMY_DATABASE_URI = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'plano.db')
+        AUDIT_ASYNC = False
+
+    app = create_app(PlanConfig)
+    with app.app_context():
+        db.create_all()
+        with contextlib.redirect_stdout(io.StringIO()):
+            obra_id, item_id = preparar_dados()
+
+    client = app.test_client()
+    tokens = {}
+    for usuario, senha in (('admin', 'admin123'), ('prestador', 'prestador123')):
+        username = 'admin' if usuario == 'admin' else 'prestador_plano'
+        resp = client.post('/api/auth/login', json={'username': username, 'password': senha})
+        tokens[usuario] = {'Authorization': 'Bearer ' + resp.get_json()['access_token']}
+
+    # Cursor de sincronização de ontem, para a consulta incremental de cada recurso
+    ontem = (datetime.now() - timedelta(days=1)).isoformat()
+    cursor_sync = encode_cursor({nome: [ontem, 0] for nome in NOMES_POSICAO}, None)
+
+    capturadas = []
+
+    def capturar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            capturadas.append((statement, parameters))
+
+    falhas = 0
+    with app.app_context():
+        engine = db.engine
+        dialect = engine.dialect.name
+        for usuario, rota in ROTAS:
+            url = rota.format(obra=obra_id, item=item_id, sync=cursor_sync)
+            capturadas.clear()
+            event.listen(engine, 'before_cursor_execute', capturar)
+            try:
+                # buffered: rotas em streaming só consultam o banco enquanto o corpo é lido
+                resp = client.get(url, headers=tokens[usuario], buffered=True)
+            finally:
+                event.remove(engine, 'before_cursor_execute', capturar)
+            if resp.status_code != 200:
+                print(f"ERRO  {usuario:<9} {url}: status {resp.status_code}")
+                falhas += 1
+                continue
+
+            permitidas = (TABELAS_PEQUENAS | FULL_SCANS_PERMITIDOS.get(rota.split('?')[0], set())
+                          | FULL_SCANS_PERMITIDOS.get(rota, set()))
+            tabelas_do_modelo = set(db.metadata.tables)
+            problemas = []
+            with engine.connect() as conn:
+                for statement, parameters in capturadas:
+                    tabelas, detalhes = varreduras_completas(conn, dialect, statement, parameters)
+                    # aliases de subquery (anon_1...) e tabelas internas do banco não contam
+                    tabelas = (tabelas & tabelas_do_modelo) - permitidas
+                    if tabelas:
+                        problemas.append((tabelas, statement, detalhes))
+                    elif args.verbose:
+                        print(f"      {' | '.join(detalhes)}")
+                conn.rollback()
+
+            if problemas:
+                falhas += 1
+                print(f"FALHA {usuario:<9} {url}")
+                for tabelas, statement, detalhes in problemas:
+                    print(f"      varredura completa em {', '.join(sorted(tabelas))}")
+                    print(f"      SQL: {' '.join(statement.split())[:300]}")
+                    print(f"      plano: {' | '.join(detalhes)}")
+            else:
+                print(f"OK    {usuario:<9} {url} ({len(capturadas)} consultas)")
+
+    if falhas:
+        print(f"\n{falhas} rota(s) com varredura completa inesperada.")
+        sys.exit(1)
+    print("\nNenhuma varredura completa inesperada.")
+
+
+if __name__ == '__main__':
+    main()
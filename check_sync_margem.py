@@ -0,0 +1,95 @@
+"""
+Verificação da entrega "pelo menos uma vez" da sincronização (GET /api/sync/).
+
+Cria um banco SQLite temporário com mais de --limit lançamentos alterados dentro
+da janela de SYNC_MARGEM_SEGUNDOS e sincroniza página a página. Depois da primeira
+página grava um lançamento com atualizado_em anterior à última linha entregue,
+como uma transação que gravou o horário antes e fez commit depois da leitura.
+Sai com código 1 se esse lançamento não for entregue até o cursor alcançar o fim.
+
+Uso: python check_sync_margem.py [--limit 20]
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from backend import create_app, db
+from backend.config import Config
+from backend.models import FinanceiroTransacoes, Obras, Role, User
+
+MARGEM_SEGUNDOS = 60
+MAX_CHAMADAS = 20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--limit', type=int, default=20, help='linhas por página')
+    args = parser.parse_args()
+
+    class SyncConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'sync.db')
+        BCRYPT_LOG_ROUNDS = 4
+        AUDIT_ASYNC = False
+        SYNC_MARGEM_SEGUNDOS = MARGEM_SEGUNDOS
+
+    app = create_app(SyncConfig)
+    agora = datetime.now()
+    tabela = FinanceiroTransacoes.__table__
+
+    def lancamento(obra_id, momento, descricao):
+        return {'obra_id': obra_id, 'tipo': 'entrada', 'valor': Decimal('1.00'), 'descricao': descricao,
+                'criado_em': momento, 'atualizado_em': momento, 'status': 'ativo'}
+
+    with app.app_context():
+        db.create_all()
+        role = Role(name='Administrador')
+        db.session.add(role)
+        db.session.flush()
+        user = User(username='sync', nome='Sync', email='sync@local', role_id=role.id)
+        user.set_password('sync123')
+        obra = Obras(nome='Obra Sync')
+        db.session.add_all([user, obra])
+        db.session.flush()
+        obra_id = obra.id
+        # Todas as linhas dentro da margem: a primeira página termina depois da posição segura
+        total = args.limit * 3
+        db.session.execute(tabela.insert(), [
+            lancamento(obra_id, agora - timedelta(seconds=MARGEM_SEGUNDOS / 2) + timedelta(milliseconds=i), f'L{i}')
+            for i in range(total)
+        ])
+        db.session.commit()
+
+    client = app.test_client()
+    resp = client.post('/api/auth/login', json={'username': 'sync', 'password': 'sync123'})
+    headers = {'Authorization': 'Bearer ' + resp.get_json()['access_token']}
+
+    cursor, recebidos, atrasado_gravado, chamadas = None, set(), False, 0
+    while chamadas < MAX_CHAMADAS:
+        url = f'/api/sync/?limit={args.limit}' + (f'&since={cursor}' if cursor else '')
+        dados = client.get(url, headers=headers).get_json()
+        chamadas += 1
+        recebidos.update(t['descricao'] for t in dados['alteracoes']['financeiro'])
+        cursor = dados['next_cursor']
+        if not atrasado_gravado:
+            # Commit atrasado: horário anterior à última linha entregue, ainda dentro da margem
+            with app.app_context():
+                db.session.execute(tabela.insert(), [
+                    lancamento(obra_id, agora - timedelta(seconds=MARGEM_SEGUNDOS / 2) - timedelta(seconds=1), 'ATRASADO')
+                ])
+                db.session.commit()
+            atrasado_gravado = True
+        elif not dados['has_more'] and 'ATRASADO' in recebidos:
+            break
+
+    print(f"{chamadas} chamadas, {len(recebidos)} lançamentos distintos recebidos de {total + 1}")
+    if 'ATRASADO' not in recebidos or len(recebidos) != total + 1:
+        print("FALHA: lançamento com commit atrasado não foi entregue.")
+        sys.exit(1)
+    print("Lançamento com commit atrasado entregue.")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import logging
+import re
 from logging.config import fileConfig
 
 from flask import current_app
@@ -14,6 +15,8 @@ config = context.config
 fileConfig(config.config_file_name)
 logger = logging.getLogger('alembic.env')
 
+ARCHIVE_TABLE_RE = re.compile(r'^audit_logs_\d{6}$')
+
 
 def get_engine():
     try:
@@ -94,6 +97,16 @@ def run_migrations_online():
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
 
+    # tabelas mensais de arquivo da auditoria (audit_logs_AAAAMM) são criadas
+    # pelo comando `flask archive-audit`, fora das migrações
+    def include_name(name, type_, parent_names):
+        if type_ == 'table' and ARCHIVE_TABLE_RE.match(name or ''):
+            return False
+        return True
+
+    if conf_args.get("include_name") is None:
+        conf_args["include_name"] = include_name
+
     connectable = get_engine()
 
     with connectable.connect() as connection:
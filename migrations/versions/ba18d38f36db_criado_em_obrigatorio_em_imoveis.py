@@ -0,0 +1,40 @@
+"""Torna imoveis.criado_em obrigatório (chave da busca paginada do marketplace)
+
+Revision ID: ba18d38f36db
+Revises: de256f0fa378
+Create Date: 2026-10-17 11:52:31.264118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import datetime
+
+
+# revision identifiers, used by Alembic.
+revision = 'ba18d38f36db'
+down_revision = 'de256f0fa378'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Mesmo caso de obras.criado_em: a busca pagina por (criado_em, id) e uma
+    # linha com NULL some da listagem. Imóveis sem data recebem a de atualização.
+    agora = sa.literal(datetime.now(), sa.DateTime)
+    imoveis = sa.table('imoveis', sa.column('criado_em', sa.DateTime), sa.column('atualizado_em', sa.DateTime))
+    op.execute(
+        imoveis.update().where(imoveis.c.criado_em.is_(None))
+        .values(criado_em=sa.func.coalesce(imoveis.c.atualizado_em, agora))
+    )
+
+    with op.batch_alter_table('imoveis', schema=None) as batch_op:
+        batch_op.alter_column('criado_em',
+               existing_type=sa.DateTime(),
+               nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('imoveis', schema=None) as batch_op:
+        batch_op.alter_column('criado_em',
+               existing_type=sa.DateTime(),
+               nullable=True)
@@ -0,0 +1,41 @@
+"""Torna obras.criado_em obrigatório (chave da listagem paginada)
+
+Revision ID: de256f0fa378
+Revises: a16f306ac5a7
+Create Date: 2026-10-17 11:40:08.913205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import datetime
+
+
+# revision identifiers, used by Alembic.
+revision = 'de256f0fa378'
+down_revision = 'a16f306ac5a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # O cursor da listagem é (criado_em, id): com NULL a linha some da paginação
+    # (criado_em < :v nunca é verdadeiro) e o cursor dela não pode ser lido.
+    # Obras antigas sem data de criação recebem a de atualização.
+    agora = sa.literal(datetime.now(), sa.DateTime)
+    obras = sa.table('obras', sa.column('criado_em', sa.DateTime), sa.column('atualizado_em', sa.DateTime))
+    op.execute(
+        obras.update().where(obras.c.criado_em.is_(None))
+        .values(criado_em=sa.func.coalesce(obras.c.atualizado_em, agora))
+    )
+
+    with op.batch_alter_table('obras', schema=None) as batch_op:
+        batch_op.alter_column('criado_em',
+               existing_type=sa.DateTime(),
+               nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('obras', schema=None) as batch_op:
+        batch_op.alter_column('criado_em',
+               existing_type=sa.DateTime(),
+               nullable=True)